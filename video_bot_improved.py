@@ -22,19 +22,31 @@ import json
 import uuid
 import time
 import math
+import zlib
+import random
+import unicodedata
 import shutil
 import queue
+import gc
+import functools
 import atexit
 import errno
 import tempfile
 import logging
 import threading
+import signal
 import subprocess
+import http.client
 import multiprocessing
 from pathlib import Path
+from urllib.parse import urlsplit
+from collections import OrderedDict, deque
+from contextlib import contextmanager
 from typing import List, Tuple, Dict, Optional, Any, Union, Callable
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait as wait_futures
+from concurrent.futures.process import BrokenProcessPool
 import hashlib
+import hmac
 import psutil
 import bidi.algorithm as bidi  # For RTL support in Hebrew
 
@@ -66,7 +78,7 @@ def get_bot_token() -> Optional[str]:
     # 1. בדיקה אם הטוקן מוגדר כמשתנה סביבה
     token = os.getenv("BOT_TOKEN")
     if token and ":" in token:
-        return tokenא
+        return token
         
     # 2. בדיקה אם קיים קובץ קונפיגורציה
     if CONFIG_FILE.exists():
@@ -101,6 +113,28 @@ def get_bot_token() -> Optional[str]:
     print("הטוקן שהוזן אינו תקין. הפעל שוב את הבוט והזן טוקן תקין.")
     return None
 
+def _env_int(name: str, default: int) -> int:
+    """קריאת מספר שלם ממשתנה סביבה, עם ברירת מחדל אם חסר או לא תקין"""
+    raw = os.getenv(name)
+    if not raw:
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        LOG.warning(f"⚠️ ערך לא תקין ב-{name}={raw!r}, משתמש ב-{default}")
+        return default
+
+def _env_float(name: str, default: float) -> float:
+    """קריאת מספר עשרוני ממשתנה סביבה, עם ברירת מחדל אם חסר או לא תקין"""
+    raw = os.getenv(name)
+    if not raw:
+        return default
+    try:
+        return float(raw)
+    except ValueError:
+        LOG.warning(f"⚠️ ערך לא תקין ב-{name}={raw!r}, משתמש ב-{default}")
+        return default
+
 # הגדרות עיבוד מקבילי
 def get_optimal_workers():
     """קביעת מספר אופטימלי של תהליכים בהתאם למשאבי המערכת"""
@@ -275,6 +309,28 @@ UI_STRINGS: Dict[str, Dict[str, str]] = {
         "btn_subtitle_shadow": "👥 Shadow size",
         "btn_subtitle_style": "🎭 Text style",
         "btn_background_color": "🎨 Background color",
+        "btn_subtitle_back": "⬅️ Back",
+        "btn_subtitle_pos_bottom": "🔽 Bottom of screen (default)",
+        "btn_subtitle_pos_top": "🔼 Top of screen",
+        "btn_subtitle_pos_bottom_left": "↙️ Bottom-left corner",
+        "btn_subtitle_pos_bottom_right": "↘️ Bottom-right corner",
+        "btn_subtitle_pos_top_left": "↖️ Top-left corner",
+        "btn_subtitle_pos_top_right": "↗️ Top-right corner",
+        "btn_subtitle_pos_middle": "⭐ Center of screen",
+        "btn_subtitle_style_normal": "Normal",
+        "btn_subtitle_style_bold": "Bold",
+        "btn_subtitle_style_italic": "Italic",
+        "btn_subtitle_style_bold_italic": "Bold + italic",
+        "btn_subtitle_outline_0": "0 (no outline)",
+        "btn_subtitle_outline_1": "1 (default)",
+        "btn_subtitle_outline_2": "2 (thick)",
+        "btn_subtitle_outline_3": "3 (very thick)",
+        "btn_subtitle_shadow_0": "0 (no shadow)",
+        "btn_subtitle_shadow_1": "1 (default)",
+        "btn_subtitle_shadow_2": "2 (strong shadow)",
+        "btn_subtitle_shadow_3": "3 (very strong shadow)",
+        "btn_subs_logo_on": "🖼️ Logo on translated video: ON",
+        "btn_subs_logo_off": "🖼️ Logo on translated video: OFF",
 
         # Prompts
         "prompt_choose_ui_lang": "Choose interface language:",
@@ -290,14 +346,14 @@ UI_STRINGS: Dict[str, Dict[str, str]] = {
             "Hi! 👋\n"
             "I'm a bot for translating videos + burning subtitles + overlaying a logo.\n\n"
             "Recommended flow: choose target language → choose font size/color → upload a video.\n"
-            "Supported files: mp4/mov/mkv/avi/flv up to 20MB.\n"
+            "Supported files: mp4/mov/mkv/avi/flv up to {max_mb}MB.\n"
             "Logo: upload an image → choose position/size/opacity → upload a video for overlay."
         ),
         "help_message": (
             "ℹ️ Help:\n"
             "• '🎯 Target translation language' – choose the translation language.\n"
             "• '🔤 Font size' + '🎨 Color' – subtitle styling.\n"
-            "• '📥 Upload video' – send a video/document up to 20MB.\n"
+            "• '📥 Upload video' – send a video/document up to {max_mb}MB.\n"
             "• '🖼️ Overlay a logo' – upload logo → choose position/opacity → send a video."
         ),
 
@@ -315,7 +371,7 @@ UI_STRINGS: Dict[str, Dict[str, str]] = {
         "logo_opacity_set": "✅ Opacity set to {opacity}%. Now choose size:",
         "choose_from_menu": "Choose from the menu:",
         "upload_video_prompt": (
-            "📥 Send a video file (mp4/mov/mkv/avi/flv) up to 20MB to translate and burn subtitles.\n\n"
+            "📥 Send a video file (mp4/mov/mkv/avi/flv) up to {max_mb}MB to translate and burn subtitles.\n\n"
             "{settings_title}\n{lang_label}: {lang}\n{size_label}: {size}\n{color_label}: {color}"
         ),
         "back_main_done": "🎉 Done! What would you like to do next?",
@@ -323,6 +379,9 @@ UI_STRINGS: Dict[str, Dict[str, str]] = {
         # Changes confirmations
         "font_size_set": "✅ Font size set to {size}.",
         "font_color_set": "✅ Font color set to {color_name}.",
+        "subs_logo_enabled": "✅ The logo will be burned together with the subtitles (single encode).",
+        "subs_logo_disabled": "✅ Translated videos will be sent without a logo.",
+        "subs_logo_needs_logo": "No logo uploaded yet. Upload one via '🖼️ Overlay a logo' first.",
 
         # Generic flows
         "downloading_video": "⬇️ Downloading the video...",
@@ -334,7 +393,7 @@ UI_STRINGS: Dict[str, Dict[str, str]] = {
         "transcribing": "📝 Transcribing (auto language detection)...",
         "translating_to": "🌐 Translating to {lang}...",
         "burning_subtitles": "🎬 Burning subtitles to the video...",
-        "output_too_big": "⚠️ Output is too large for Telegram (>20MB). Try a shorter video or reduce resolution.",
+        "output_too_big": "⚠️ Output is too large for Telegram (>{max_upload_mb}MB). Try a shorter video or reduce resolution.",
         "translated_done_caption": (
             "✅ Video translated and burned successfully!\n\n"
             "Applied settings:\n{lang_label}: {lang}\n{size_label}: {size}\n{color_label}: {color}\n\nSource language: {src_lang}"
@@ -343,10 +402,18 @@ UI_STRINGS: Dict[str, Dict[str, str]] = {
         "error_logo": "❌ Logo processing failed: {error}",
         "doc_not_video": "The document is not a supported video file.",
         "no_suitable_file": "No suitable file detected.",
-        "file_too_large": "❌ File is too large (over 20MB). Please try a smaller file.",
+        "file_too_large": "❌ File is too large (over {max_mb}MB). Please try a smaller file.",
         "no_logo_found": "No logo file found. Start with '🖼️ Overlay a logo' and upload a logo.",
         "received_video_but_wrong_state": "Received a video, but not in 'Upload video for translation' mode. Click '📥 Upload video for translation & burn' first.",
 
+        # Job queue
+        "queue_position": "⏳ You are #{position} in the queue. Processing will start automatically.",
+        "queue_full": "🚦 The bot is at full capacity right now. Please try again in a few minutes.",
+        "queue_user_limit": "⏳ You already have {limit} videos in progress. Please wait for them to finish.",
+        "job_joined": "⏳ This video is already being processed with the same settings. You'll get the result as soon as it's ready.",
+        "job_interrupted": "⚠️ The bot restarted while your video was being processed. Please send it again.",
+        "models_warming": "🔥 The bot has just started and is loading the speech recognition models. Transcription of your video will start once they're ready, in about {eta} seconds.",
+
         # Logo flow
         "logo_processing_start": (
             "🎬 Starting logo overlay...\n\n"
@@ -358,7 +425,7 @@ UI_STRINGS: Dict[str, Dict[str, str]] = {
         ),
 
         # Error messages (new)
-        "error_file_too_large": "❌ הקובץ גדול מדי!\n\nהקובץ שהעלית גדול מ-20MB. אנא העלה קובץ קטן יותר.",
+        "error_file_too_large": "❌ הקובץ גדול מדי!\n\nהקובץ שהעלית גדול מ-{max_mb}MB. אנא העלה קובץ קטן יותר.",
         "error_unsupported_file_type": "❌ סוג קובץ לא נתמך!\n\nהקובץ שהעלית אינו מסוג נתמך. קבצים נתמכים: mp4, mov, mkv, avi, flv.",
         "error_image_too_large": "❌ תמונת הלוגו גדולה מדי!\n\nאנא העלה תמונה קטנה יותר (עד 5MB).",
         "error_unsupported_image": "❌ סוג תמונה לא נתמך!\n\nאנא העלה תמונה בפורמט JPEG או PNG.",
@@ -381,6 +448,34 @@ UI_STRINGS: Dict[str, Dict[str, str]] = {
         "btn_logo_size": "📏 גודל לוגו",
         "btn_help": "ℹ️ עזרה",
         "btn_back_main": "⬅️ חזרה לתפריט הראשי",
+        "btn_subs_logo_on": "🖼️ לוגו על סרטון מתורגם: פעיל",
+        "btn_subs_logo_off": "🖼️ לוגו על סרטון מתורגם: כבוי",
+        "btn_subtitle_position": "📍 מיקום כתוביות",
+        "btn_font_type": "🔠 סוג גופן",
+        "btn_subtitle_outline": "🖋️ עובי קו מתאר",
+        "btn_subtitle_shadow": "👥 גודל צל",
+        "btn_subtitle_style": "🎭 סגנון טקסט",
+        "btn_background_color": "🎨 צבע רקע",
+        "btn_subtitle_back": "⬅️ חזרה",
+        "btn_subtitle_pos_bottom": "🔽 תחתית מסך (ברירת מחדל)",
+        "btn_subtitle_pos_top": "🔼 ראש המסך",
+        "btn_subtitle_pos_bottom_left": "↙️ פינה שמאלית תחתונה",
+        "btn_subtitle_pos_bottom_right": "↘️ פינה ימנית תחתונה",
+        "btn_subtitle_pos_top_left": "↖️ פינה שמאלית עליונה",
+        "btn_subtitle_pos_top_right": "↗️ פינה ימנית עליונה",
+        "btn_subtitle_pos_middle": "⭐ מרכז המסך",
+        "btn_subtitle_style_normal": "רגיל",
+        "btn_subtitle_style_bold": "מודגש",
+        "btn_subtitle_style_italic": "נטוי",
+        "btn_subtitle_style_bold_italic": "מודגש + נטוי",
+        "btn_subtitle_outline_0": "0 (ללא מתאר)",
+        "btn_subtitle_outline_1": "1 (ברירת מחדל)",
+        "btn_subtitle_outline_2": "2 (עבה)",
+        "btn_subtitle_outline_3": "3 (עבה מאוד)",
+        "btn_subtitle_shadow_0": "0 (ללא צל)",
+        "btn_subtitle_shadow_1": "1 (ברירת מחדל)",
+        "btn_subtitle_shadow_2": "2 (צל בולט)",
+        "btn_subtitle_shadow_3": "3 (צל בולט מאוד)",
 
         # Prompts
         "prompt_choose_ui_lang": "בחרו שפת ממשק:",
@@ -396,14 +491,14 @@ UI_STRINGS: Dict[str, Dict[str, str]] = {
             "היי! 👋\n"
             "אני בוט לתרגום סרטונים + צורב כתוביות + הטמעת לוגו.\n\n"
             "זרימה מומלצת: בחרו שפת יעד → בחרו גודל/צבע → לחצו העלאת סרטון.\n"
-            "קבצים נתמכים: mp4/mov/mkv/avi/flv עד 20MB.\n"
+            "קבצים נתמכים: mp4/mov/mkv/avi/flv עד {max_mb}MB.\n"
             "לוגו: העלו תמונה → בחרו מיקום/גודל/שקיפות → העלו סרטון להטמעת הלוגו."
         ),
         "help_message": (
             "ℹ️ עזרה:\n"
             "• '🎯 בחירת שפת יעד' – בחרו את שפת התרגום.\n"
             "• '🔤 גודל גופן' + '🎨 צבע' – עיצוב הכתוביות.\n"
-            "• '📥 העלאת סרטון' – שלחו וידאו/מסמך וידאו עד 20MB.\n"
+            "• '📥 העלאת סרטון' – שלחו וידאו/מסמך וידאו עד {max_mb}MB.\n"
             "• '🖼️ הטמעת לוגו' – העלו לוגו → בחרו מיקום/שקיפות → שלחו וידאו."
         ),
 
@@ -421,7 +516,7 @@ UI_STRINGS: Dict[str, Dict[str, str]] = {
         "logo_opacity_set": "✅ שקיפות נקבעה ל-{opacity}%. כעת בחרו גודל:",
         "choose_from_menu": "בחרו מהתפריט:",
         "upload_video_prompt": (
-            "📥 שלחו קובץ וידאו (mp4/mov/mkv/avi/flv) עד 20MB לתרגום וצריבת כתוביות.\n\n"
+            "📥 שלחו קובץ וידאו (mp4/mov/mkv/avi/flv) עד {max_mb}MB לתרגום וצריבת כתוביות.\n\n"
             "{settings_title}\n{lang_label}: {lang}\n{size_label}: {size}\n{color_label}: {color}"
         ),
         "back_main_done": "🎉 בוצע בהצלחה! מה תרצו לעשות עכשיו?",
@@ -429,6 +524,9 @@ UI_STRINGS: Dict[str, Dict[str, str]] = {
         # Changes confirmations
         "font_size_set": "✅ גודל הגופן נקבע ל-{size}.",
         "font_color_set": "✅ צבע הגופן נקבע ל-{color_name}.",
+        "subs_logo_enabled": "✅ הלוגו ייצרב יחד עם הכתוביות (קידוד יחיד).",
+        "subs_logo_disabled": "✅ סרטונים מתורגמים יישלחו ללא לוגו.",
+        "subs_logo_needs_logo": "עדיין לא הועלה לוגו. העלו לוגו דרך '🖼️ הטמעת לוגו' תחילה.",
 
         # Generic flows
         "downloading_video": "⬇️ מוריד את הווידאו...",
@@ -440,7 +538,7 @@ UI_STRINGS: Dict[str, Dict[str, str]] = {
         "transcribing": "📝 מתמלל (זיהוי שפה אוטומטי)...",
         "translating_to": "🌐 מתרגם ל-{lang}...",
         "burning_subtitles": "🎬 צורב כתוביות על הווידאו...",
-        "output_too_big": "⚠️ הפלט גדול מדי לשליחה בטלגרם (>20MB). נסו וידאו קצר יותר או הקטנת רזולוציה.",
+        "output_too_big": "⚠️ הפלט גדול מדי לשליחה בטלגרם (>{max_upload_mb}MB). נסו וידאו קצר יותר או הקטנת רזולוציה.",
         "translated_done_caption": (
             "✅ הסרטון תורגם וצורב בהצלחה!\n\n"
             "הגדרות שהוחלו:\n{lang_label}: {lang}\n{size_label}: {size}\n{color_label}: {color}\n\nשפת מקור: {src_lang}"
@@ -449,10 +547,18 @@ UI_STRINGS: Dict[str, Dict[str, str]] = {
         "error_logo": "❌ כשל בהטמעת לוגו: {error}",
         "doc_not_video": "המסמך אינו קובץ וידאו נתמך.",
         "no_suitable_file": "לא זוהה קובץ מתאים.",
-        "file_too_large": "❌ הקובץ גדול מדי (מעל 20MB). נסו קובץ קטן יותר.",
+        "file_too_large": "❌ הקובץ גדול מדי (מעל {max_mb}MB). נסו קובץ קטן יותר.",
         "no_logo_found": "לא נמצא קובץ לוגו. התחילו ב-'🖼️ הטמעת לוגו' והעלו לוגו.",
         "received_video_but_wrong_state": "קיבלתי וידאו, אך איני במצב 'העלאת סרטון לתרגום'. לחצו '📥 העלאת סרטון לתרגום וצריבה' תחילה.",
 
+        # Job queue
+        "queue_position": "⏳ אתם במקום {position} בתור. העיבוד יתחיל אוטומטית.",
+        "queue_full": "🚦 הבוט בעומס מלא כרגע. נסו שוב בעוד כמה דקות.",
+        "queue_user_limit": "⏳ כבר יש לכם {limit} סרטונים בעיבוד. המתינו לסיומם.",
+        "job_joined": "⏳ הסרטון הזה כבר בעיבוד עם אותן הגדרות. התוצאה תישלח אליכם ברגע שתהיה מוכנה.",
+        "job_interrupted": "⚠️ הבוט הופעל מחדש בזמן שהסרטון שלכם היה בעיבוד. אנא שלחו אותו שוב.",
+        "models_warming": "🔥 הבוט עלה זה עתה וטוען את מודלי זיהוי הדיבור. תעתוק הסרטון יתחיל כשהם יהיו מוכנים, בעוד כ-{eta} שניות.",
+
         # Logo flow
         "logo_processing_start": (
             "🎬 מתחיל הטמעת לוגו...\n\n"
@@ -464,7 +570,7 @@ UI_STRINGS: Dict[str, Dict[str, str]] = {
         ),
 
         # Error messages (new)
-        "error_file_too_large": "❌ הקובץ גדול מדי!\n\nהקובץ שהעלית גדול מ-20MB. אנא העלה קובץ קטן יותר.",
+        "error_file_too_large": "❌ הקובץ גדול מדי!\n\nהקובץ שהעלית גדול מ-{max_mb}MB. אנא העלה קובץ קטן יותר.",
         "error_unsupported_file_type": "❌ סוג קובץ לא נתמך!\n\nהקובץ שהעלית אינו מסוג נתמך. קבצים נתמכים: mp4, mov, mkv, avi, flv.",
         "error_image_too_large": "❌ תמונת הלוגו גדולה מדי!\n\nאנא העלה תמונה קטנה יותר (עד 5MB).",
         "error_unsupported_image": "❌ סוג תמונה לא נתמך!\n\nאנא העלה תמונה בפורמט JPEG או PNG.",
@@ -484,8 +590,18 @@ def get_ui_lang(uid: int) -> str:
         return st["ui_lang"]
     return "en"
 
-UI_DYNAMIC_CACHE: Dict[str, Dict[str, str]] = {}
-UI_TXT_LOCK = threading.Lock()
+# -----------------------------
+# קטלוגי מחרוזות ממשק (מתורגמים מראש)
+# -----------------------------
+# t() נמצא בנתיב החם של כל מקלדת והודעה - אסור לו לפנות ל-API תרגום.
+# מפתחות שחסרים בטבלאות המובנות נטענים מקבצי קטלוג JSON (אחד לכל שפה)
+# שנבנים מראש עם --build-ui-catalogs. מפתח שעדיין חסר מוחזר מיד באנגלית
+# ומתורגם ברקע, ונשמר לקטלוג לשימוש הבא.
+UI_CATALOG_DIR = Path(os.getenv("UI_CATALOG_DIR") or Path(APP_DIR) / "ui_catalogs")
+_PLACEHOLDER_RE = re.compile(r"\{(\w+)\}")
+
+def _placeholders(text: str) -> List[str]:
+    return sorted(_PLACEHOLDER_RE.findall(text or ""))
 
 def _preserve_placeholders_before_translate(text: str) -> (str, Dict[str, str]):
     # מחליף placeholders כמו {name} בטוקנים זמניים כדי למנוע שינוי בתרגום
@@ -495,8 +611,7 @@ def _preserve_placeholders_before_translate(text: str) -> (str, Dict[str, str]):
         token = f"__PH_{len(tokens)}__"
         tokens[token] = name
         return token
-    import re as _re
-    protected = _re.sub(r"\{(\w+)\}", repl, text)
+    protected = _PLACEHOLDER_RE.sub(repl, text)
     return protected, tokens
 
 def _restore_placeholders_after_translate(text: str, tokens: Dict[str, str]) -> str:
@@ -504,64 +619,200 @@ def _restore_placeholders_after_translate(text: str, tokens: Dict[str, str]) ->
         text = text.replace(token, f"{{{name}}}")
     return text
 
-def _translate_ui_text(text: str, dest_lang: str) -> str:
-    if not text:
-        return text
-    if dest_lang in ("en", None, ""):
+def _translate_ui_text(text: str, dest_lang: str) -> Optional[str]:
+    """
+    תרגום מחרוזת ממשק אחת עם שמירת placeholders. מחזיר None בכישלון
+    או כשהתרגום השחית את ה-placeholders (כדי שלא ייכנס לקטלוג).
+    """
+    if not text or dest_lang in ("en", None, ""):
         return text
-    # מטמון
-    with UI_TXT_LOCK:
-        cached = UI_DYNAMIC_CACHE.get(dest_lang, {}).get(text)
-    if cached:
-        return cached
-
     protected, tokens = _preserve_placeholders_before_translate(text)
-    translated = None
+    try:
+        # מאגר הספקים (מוגדר בהמשך הקובץ) - לקוחות קבועים ומעבר בין DeepL ל-Google
+        translated = TRANSLATION_PROVIDERS.translate(protected, dest_lang)[0]
+    except Exception as e:
+        LOG.warning(f"⚠️ תרגום טקסט ממשק נכשל ({dest_lang}): {e}")
+        return None
+    out = _restore_placeholders_after_translate(translated or "", tokens)
+    if not out.strip() or _placeholders(out) != _placeholders(text):
+        LOG.warning(f"⚠️ תרגום ממשק ל-{dest_lang} נפסל (placeholders לא תואמים): {out[:60]!r}")
+        return None
+    return out
 
-    api_key = os.getenv("DEEPL_API_KEY")
-    if api_key:
-        try:
-            import deepl
-            translator = deepl.Translator(api_key)
-            for attempt in range(2):
-                try:
-                    tr = translator.translate_text(protected, target_lang=dest_lang.upper())
-                    translated = tr.text
-                    break
-                except Exception:
-                    time.sleep(0.5 * (attempt + 1))
-        except Exception:
-            translated = None
-    if translated is None:
+class UICatalogs:
+    """
+    קטלוגי מחרוזות ממשק לכל שפה, נטענים מהדיסק בהפעלה.
+    כל קובץ שומר גם את המקור האנגלי של כל מחרוזת, כך שמחרוזת שהמקור
+    שלה השתנה מאז הבנייה נזרקת בטעינה ומתורגמת מחדש. `version` עולה
+    בכל שינוי - מפתחות מטמון של מקלדות נשענים עליו.
+    """
+
+    def __init__(self, catalog_dir: Path):
+        self.dir = Path(catalog_dir)
+        self.strings: Dict[str, Dict[str, str]] = {}
+        self.version = 0
+        self._sources: Dict[str, Dict[str, str]] = {}
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _path(self, lang: str) -> Path:
+        return self.dir / f"{lang}.json"
+
+    def _valid(self, key: str, source: str, text: str) -> bool:
+        en = UI_STRINGS["en"].get(key)
+        return (en is not None and source == en and isinstance(text, str)
+                and bool(text.strip()) and _placeholders(text) == _placeholders(en))
+
+    def load(self) -> int:
+        """טעינת כל הקטלוגים מהתיקייה. מחזיר את מספר המחרוזות שנטענו."""
+        total = 0
+        if not self.dir.exists():
+            return 0
+        for path in sorted(self.dir.glob("*.json")):
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+                lang = data.get("lang") or path.stem
+                entries = data.get("strings", {})
+            except Exception as e:
+                LOG.warning(f"⚠️ קטלוג ממשק פגום {path.name}: {e}")
+                continue
+            strings, sources = {}, {}
+            for key, entry in entries.items():
+                if not isinstance(entry, dict):
+                    continue
+                if self._valid(key, entry.get("source"), entry.get("text")):
+                    strings[key] = entry["text"]
+                    sources[key] = entry["source"]
+            stale = len(entries) - len(strings)
+            with self._lock:
+                self.strings[lang] = strings
+                self._sources[lang] = sources
+                self.version += 1
+            total += len(strings)
+            LOG.info(f"🗂️ קטלוג ממשק {lang}: {len(strings)} מחרוזות" + (f" ({stale} ישנות נזרקו)" if stale else ""))
+        return total
+
+    def save(self, lang: str) -> None:
+        """כתיבה אטומית של קטלוג שפה (קובץ זמני + replace)."""
+        with self._lock:
+            strings = dict(self.strings.get(lang, {}))
+            sources = dict(self._sources.get(lang, {}))
+        data = {
+            "lang": lang,
+            "built_at": int(time.time()),
+            "strings": {k: {"source": sources[k], "text": v} for k, v in sorted(strings.items())},
+        }
+        self.dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(lang)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(data, ensure_ascii=False, indent=1), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def get(self, lang: str, key: str) -> Optional[str]:
+        return self.strings.get(lang, {}).get(key)
+
+    def languages(self) -> List[str]:
+        with self._lock:
+            return [lang for lang, strings in self.strings.items() if strings]
+
+    def _set(self, lang: str, key: str, text: str) -> None:
+        with self._lock:
+            self.strings.setdefault(lang, {})[key] = text
+            self._sources.setdefault(lang, {})[key] = UI_STRINGS["en"][key]
+            self.version += 1
+
+    def missing(self, lang: str) -> List[str]:
+        base = UI_STRINGS.get(lang, {})
+        have = self.strings.get(lang, {})
+        return [k for k in UI_STRINGS["en"] if k not in base and k not in have]
+
+    def request_fill(self, lang: str, key: str) -> None:
+        """תזמון תרגום ברקע למפתח חסר - לא חוסם, ללא כפילויות."""
+        if key not in UI_STRINGS["en"]:
+            return
+        with self._lock:
+            if (lang, key) in self._pending:
+                return
+            self._pending.add((lang, key))
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ui-catalog")
+        self._executor.submit(self._fill, lang, key)
+
+    def _fill(self, lang: str, key: str) -> None:
         try:
-            from googletrans import Translator as _GT
-            _tr = _GT()
-            for attempt in range(2):
-                try:
-                    tr = _tr.translate(protected, dest=dest_lang)
-                    translated = tr.text
-                    break
-                except Exception:
-                    time.sleep(0.5 * (attempt + 1))
-        except Exception:
-            translated = None
+            text = _translate_ui_text(UI_STRINGS["en"][key], lang)
+            if text:
+                self._set(lang, key, text)
+                self.save(lang)
+        except Exception as e:
+            LOG.warning(f"⚠️ השלמת קטלוג ממשק {lang}/{key} נכשלה: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard((lang, key))
+
+    def build(self, lang: str, workers: int = 4) -> Tuple[int, int]:
+        """תרגום כל המפתחות החסרים לשפה ושמירת הקטלוג. מחזיר (תורגמו, נכשלו)."""
+        keys = self.missing(lang)
+        done = failed = 0
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+            futures = {ex.submit(_translate_ui_text, UI_STRINGS["en"][k], lang): k for k in keys}
+            for fut in as_completed(futures):
+                text = fut.result()
+                if text:
+                    self._set(lang, futures[fut], text)
+                    done += 1
+                else:
+                    failed += 1
+        self.save(lang)
+        LOG.info(f"🗂️ קטלוג {lang}: תורגמו {done}, נכשלו {failed} -> {self._path(lang)}")
+        return done, failed
 
-    out = _restore_placeholders_after_translate(translated or text, tokens)
-    with UI_TXT_LOCK:
-        UI_DYNAMIC_CACHE.setdefault(dest_lang, {})[text] = out
-    return out
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+UI_CATALOGS = UICatalogs(UI_CATALOG_DIR)
+
+def load_ui_catalogs() -> None:
+    try:
+        UI_CATALOGS.load()
+    except Exception as e:
+        LOG.warning(f"⚠️ טעינת קטלוגי ממשק נכשלה: {e}")
+
+def build_ui_catalogs(langs: Optional[List[str]] = None) -> bool:
+    """
+    בניית קטלוגים מראש (לפני פריסה). מחזיר False אם נשארו מחרוזות חסרות.
+    langs=None - כל השפות המובנות וכל השפות שכבר יש להן קטלוג בתיקייה.
+    """
+    UI_CATALOGS.load()
+    if langs is None:
+        langs = sorted(set(UI_STRINGS) | set(UI_CATALOGS.languages()))
+    ok = True
+    for lang in langs:
+        if lang == "en":
+            continue
+        _, failed = UI_CATALOGS.build(lang)
+        ok = ok and failed == 0
+    return ok
+
+def _ui_format_defaults() -> Dict[str, Any]:
+    # ערכים שמחרוזות הממשק יכולות להציג בלי שהקורא יעביר אותם (מגבלות הפריסה)
+    return {"max_mb": MAX_FILE_SIZE // MB, "max_upload_mb": MAX_UPLOAD_SIZE // MB}
 
 def t(uid: int, key: str, **kwargs) -> str:
     lang = get_ui_lang(uid)
-    base = UI_STRINGS.get(lang, {})
-    if key in base:
-        text = base[key]
-    else:
-        # נשתמש בבסיס האנגלי ונבצע תרגום אוטומטי לשפת הממשק שנבחרה
-        text = _translate_ui_text(UI_STRINGS["en"].get(key, key), lang)
-    if kwargs:
+    text = UI_STRINGS.get(lang, {}).get(key)
+    if text is None:
+        text = UI_CATALOGS.get(lang, key)
+    if text is None:
+        # ללא רשת בנתיב החם: מחזירים אנגלית עכשיו ומשלימים את הקטלוג ברקע
+        text = UI_STRINGS["en"].get(key, key)
+        if lang != "en":
+            UI_CATALOGS.request_fill(lang, key)
+    if kwargs or "{" in text:
         try:
-            return text.format(**kwargs)
+            return text.format(**{**_ui_format_defaults(), **kwargs})
         except Exception:
             return text
     return text
@@ -589,7 +840,16 @@ LOGO_SIZE_CHOICES = [0, 5, 10, 15, 20, 25, 30, 35, 40]  # 9 דרגות בין 0%
 OPACITY_CHOICES = [0, 15, 30, 45, 60, 75, 90, 100]  # 8 דרגות בין 0% ל-100%
 
 ALLOWED_VIDEO_EXT = {".mp4", ".mov", ".mkv", ".avi", ".flv"}
-MAX_FILE_SIZE = 20 * 1024 * 1024  # 20MB
+# שרת Bot API מקומי (telegram-bot-api --local): כתובות API/קבצים מותאמות,
+# get_file מחזיר נתיב על הדיסק (קוראים ממנו ישירות, בלי הורדה) ומגבלות הגודל עולות.
+BOT_API_BASE_URL = os.getenv("BOT_API_BASE_URL") or None            # למשל http://127.0.0.1:8081/bot
+BOT_API_BASE_FILE_URL = os.getenv("BOT_API_BASE_FILE_URL") or None  # למשל http://127.0.0.1:8081/file/bot
+BOT_API_LOCAL = (os.getenv("BOT_API_LOCAL") or "").lower() in ("1", "true", "yes")
+
+MB = 1024 * 1024
+# ברירות מחדל: ענן - 20MB להורדה ו-50MB להעלאה; שרת מקומי - 2000MB לשניהם
+MAX_FILE_SIZE = _env_int("MAX_FILE_SIZE_MB", 2000 if BOT_API_LOCAL else 20) * MB
+MAX_UPLOAD_SIZE = _env_int("MAX_UPLOAD_SIZE_MB", 2000 if BOT_API_LOCAL else 50) * MB
 
 # -----------------------------
 # התקנות אוטומטיות
@@ -624,6 +884,9 @@ def ensure_dependencies():
     ok &= require("langdetect", "langdetect")
     ok &= require("PIL", "Pillow")
     ok &= require("imageio_ffmpeg", "imageio-ffmpeg")
+    # faster-whisper (CTranslate2) - מנוע ברירת המחדל; לא חובה, יש נפילה ל-openai-whisper
+    if not require("faster_whisper", "faster-whisper"):
+        LOG.warning("⚠️ faster-whisper לא זמין - התעתוק ירוץ עם openai-whisper.")
     # openai-whisper - המודל הגדול והארוך
     if not require("whisper", "openai-whisper"):
         LOG.error("❌ openai-whisper לא זמין. יש להתקין אותו.")
@@ -683,16 +946,20 @@ def ffmpeg_exec(args: List[str]) -> Tuple[int, str, str]:
     p = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
     return p.returncode, p.stdout.decode("utf-8", "ignore"), p.stderr.decode("utf-8", "ignore")
 
+def _ffprobe_bin() -> str:
+    """ffprobe לצד ה-ffmpeg שאותר, ואם אין - ffprobe מערכתית"""
+    ffprobe = FFMPEG_BIN.replace("ffmpeg", "ffprobe")
+    if not Path(ffprobe).exists():
+        ffprobe = "ffprobe"
+    return ffprobe
+
 def ffprobe_get_video_size(video_path: str) -> Tuple[Optional[int], Optional[int]]:
     """
     מחזיר (width, height) באמצעות ffprobe.
     """
     if not FFMPEG_BIN:
         return None, None
-    ffprobe = FFMPEG_BIN.replace("ffmpeg", "ffprobe")
-    # אם אין ffprobe לצד ffmpeg הנייד, ננסה "ffprobe" מערכתית
-    if not Path(ffprobe).exists():
-        ffprobe = "ffprobe"
+    ffprobe = _ffprobe_bin()
     try:
         p = subprocess.run(
             [ffprobe, "-v", "error", "-select_streams", "v:0",
@@ -707,6 +974,24 @@ def ffprobe_get_video_size(video_path: str) -> Tuple[Optional[int], Optional[int
         pass
     return None, None
 
+def ffprobe_get_duration(video_path: str) -> Optional[float]:
+    """
+    מחזיר את אורך הקובץ בשניות באמצעות ffprobe (None אם לא ידוע).
+    """
+    if not FFMPEG_BIN:
+        return None
+    try:
+        p = subprocess.run(
+            [_ffprobe_bin(), "-v", "error", "-show_entries", "format=duration",
+             "-of", "json", video_path],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False
+        )
+        data = json.loads(p.stdout.decode("utf-8", "ignore") or "{}")
+        duration = float((data.get("format") or {}).get("duration") or 0)
+        return duration if duration > 0 else None
+    except Exception:
+        return None
+
 # -----------------------------
 # עיבוד מדיה
 # -----------------------------
@@ -739,6 +1024,170 @@ def extract_audio_16k_mono(video_path: str, wav_out: str) -> None:
     if not os.path.exists(wav_out):
         raise RuntimeError("Audio extraction failed - output file not created")
 
+# -----------------------------
+# מטמון מודלים עם תקציב זיכרון
+# -----------------------------
+def _process_rss() -> int:
+    """זיכרון תושב (RSS) של התהליך הנוכחי בבייטים"""
+    try:
+        return psutil.Process().memory_info().rss
+    except Exception:
+        return 0
+
+class ModelCache:
+    """
+    מטמון מודלים עם תקציב בבייטים: פינוי LRU, פריקה אחרי זמן סרק וספירת הפניות.
+    מודל שמוחזק (checkout) לעולם לא נפרק - גם לא כשהתקציב חרוג - עד שהוא משוחרר.
+    טעינה נעשית לפי מפתח ומחוץ לנעילה, כך שטעינת מודל אחד לא חוסמת שימוש באחר.
+    """
+    def __init__(self, budget_bytes: int, idle_timeout: int):
+        self.budget_bytes = max(0, budget_bytes)
+        self.idle_timeout = max(0, idle_timeout)
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._loading = set()
+        self._cond = threading.Condition()
+        self._reaper: Optional[threading.Thread] = None
+
+    def _used_bytes_locked(self) -> int:
+        return sum(e["bytes"] for e in self._entries.values())
+
+    def _evict_locked(self, needed: int = 0, idle_only: bool = False) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        הוצאת מודלים שאינם בשימוש, מהישן לחדש, עד שיש מקום ל-needed בייטים.
+        idle_only - רק מודלים שעבר עליהם זמן הסרק. הפריקה עצמה מתבצעת מחוץ לנעילה.
+        """
+        evicted = []
+        now = time.time()
+        for key in list(self._entries):
+            entry = self._entries[key]
+            if entry["refs"] > 0:
+                continue
+            if idle_only:
+                if now - entry["last_used"] < self.idle_timeout:
+                    continue
+            elif self._used_bytes_locked() + needed <= self.budget_bytes:
+                break
+            evicted.append((key, self._entries.pop(key)))
+        return evicted
+
+    def _unload(self, evicted: List[Tuple[str, Dict[str, Any]]], reason: str) -> None:
+        for key, entry in evicted:
+            entry["model"] = None
+            LOG.info(f"🧹 פורק מודל {key} ({entry['bytes'] // (1024 * 1024)}MB, {reason})")
+        if not evicted:
+            return
+        gc.collect()
+        torch = sys.modules.get("torch")
+        try:
+            if torch is not None and torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except Exception:
+            pass
+
+    def _start_reaper(self) -> None:
+        if self.idle_timeout <= 0 or self._reaper is not None:
+            return
+        self._reaper = threading.Thread(target=self._reap_loop, name="model-cache-reaper", daemon=True)
+        self._reaper.start()
+
+    def _reap_loop(self) -> None:
+        interval = max(5, min(60, self.idle_timeout // 2))
+        while True:
+            time.sleep(interval)
+            with self._cond:
+                evicted = self._evict_locked(idle_only=True)
+            self._unload(evicted, "idle")
+
+    def checkout(self, key: str, loader: Callable[[], Any], estimate_bytes: int) -> Any:
+        """
+        מחזיר את המודל ומגדיל את מונה ההפניות שלו; טוען אם צריך.
+        כל checkout חייב להסתיים ב-release.
+        """
+        with self._cond:
+            self._start_reaper()
+            while True:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry["refs"] += 1
+                    entry["last_used"] = time.time()
+                    self._entries.move_to_end(key)
+                    return entry["model"]
+                if key not in self._loading:
+                    break
+                self._cond.wait()  # מישהו אחר כבר טוען את אותו מודל
+            self._loading.add(key)
+            evicted = self._evict_locked(needed=estimate_bytes)
+
+        try:
+            self._unload(evicted, "budget")
+            rss_before = _process_rss()
+            model = loader()
+            measured = _process_rss() - rss_before
+        except Exception:
+            with self._cond:
+                self._loading.discard(key)
+                self._cond.notify_all()
+            raise
+
+        # זיכרון שהתפנה קודם ומוחזר למודל לא נראה ב-RSS - אז ההערכה אמינה יותר
+        size = measured if measured > estimate_bytes // 4 else estimate_bytes
+        with self._cond:
+            self._loading.discard(key)
+            self._entries[key] = {
+                "model": model, "bytes": size, "refs": 1,
+                "loaded_at": time.time(), "last_used": time.time(),
+            }
+            used = self._used_bytes_locked()
+            self._cond.notify_all()
+        LOG.info(f"📦 מודל {key} נטען ({size // (1024 * 1024)}MB, במטמון {used // (1024 * 1024)}MB"
+                 f" מתוך {self.budget_bytes // (1024 * 1024)}MB)")
+        if used > self.budget_bytes:
+            LOG.warning("⚠️ מטמון המודלים חורג מהתקציב - מודלים אחרים בשימוש ולא ניתן לפנותם")
+        return model
+
+    def release(self, key: str) -> None:
+        """שחרור הפניה; אם המטמון חרוג מהתקציב מפנים מודלים שהתפנו"""
+        with self._cond:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry["refs"] = max(0, entry["refs"] - 1)
+            entry["last_used"] = time.time()
+            evicted = self._evict_locked() if self._used_bytes_locked() > self.budget_bytes else []
+        self._unload(evicted, "budget")
+
+    @contextmanager
+    def lease(self, key: str, loader: Callable[[], Any], estimate_bytes: int):
+        model = self.checkout(key, loader, estimate_bytes)
+        try:
+            yield model
+        finally:
+            self.release(key)
+
+    def clear(self) -> None:
+        """פריקת כל המודלים שאינם בשימוש"""
+        with self._cond:
+            evicted = [(k, self._entries.pop(k)) for k in list(self._entries) if self._entries[k]["refs"] == 0]
+        self._unload(evicted, "clear")
+
+    def footprint(self) -> Dict[str, Any]:
+        """תמונת מצב של המטמון: תקציב, שימוש ופירוט לכל מודל"""
+        now = time.time()
+        with self._cond:
+            models = {
+                key: {"bytes": e["bytes"], "refs": e["refs"], "idle_sec": int(now - e["last_used"])}
+                for key, e in self._entries.items()
+            }
+            used = self._used_bytes_locked()
+            loading = sorted(self._loading)
+        return {
+            "budget_bytes": self.budget_bytes,
+            "used_bytes": used,
+            "idle_timeout_sec": self.idle_timeout,
+            "models": models,
+            "loading": loading,
+        }
+
 # מערכת משופרת לתעתוק קול עם תמיכה במודלים מרובים
 class SpeechRecognitionSystem:
     """
@@ -750,20 +1199,36 @@ class SpeechRecognitionSystem:
     MODEL_FASTER_WHISPER = "faster-whisper"
     MODEL_WHISPER = "whisper"
     
-    # גדלי מודלים נתמכים - רק Whisper הרגיל
+    # גדלי מודלים נתמכים
     MODEL_SIZES = {
-        MODEL_WHISPER: ["tiny", "base", "small", "medium", "large"]
+        MODEL_WHISPER: ["tiny", "base", "small", "medium", "large"],
+        MODEL_FASTER_WHISPER: ["tiny", "base", "small", "medium", "large", "large-v2", "large-v3"],
     }
+
+    # סוגי חישוב של CTranslate2 (faster-whisper). int8 הוא המהיר ביותר על CPU
+    COMPUTE_TYPES_CPU = ("int8", "int8_float32", "float32")
+    COMPUTE_TYPES_CUDA = ("int8", "int8_float32", "float32", "float16", "int8_float16")
+
+    # הערכת זיכרון (GB) לכל גודל מודל בזמן ריצה על CPU
+    MODEL_RAM_GB = {"tiny": 0.5, "base": 0.7, "small": 1.2, "medium": 2.8, "large": 5.5}
     
     def __init__(self):
         # הגדרות מודלים
-        self.models = {}  # מטמון מודלים
-        self.lock = threading.Lock()
-        self.default_model_type = self.MODEL_WHISPER
-        self.default_model_size = "large"  # מודל ברירת המחדל - הגדול והארוך
-        
-        # הגדרת הגדלים המומלצים לפי זיכרון מערכת
+        self.default_model_type = self._get_default_model_type()
+        # הגדרת הגדלים המומלצים לפי זיכרון מערכת - זו גם התקרה של מדיניות ה-SLO
         self.recommended_size = self._get_recommended_model_size()
+        self.default_model_size = os.getenv("STT_MODEL_SIZE", "").strip() or self.recommended_size
+        self.device = self._detect_device()
+        self.compute_type = self._get_compute_type()
+        self.cpu_threads = 0  # 0 = ברירת המחדל של CTranslate2; תהליכי התעתוק מגדירים את חלקם
+        self.beam_size = _env_int("WHISPER_BEAM_SIZE", 1)  # חיפוש חמדני כמו ברירת המחדל של openai-whisper
+
+        # מטמון מודלים: תקציב ב-MB (ברירת מחדל - מודל ברירת המחדל ועוד חצי) ופריקה אחרי זמן סרק
+        default_budget_mb = int(self._estimate_model_bytes(self.default_model_type, self.default_model_size) * 1.5) // (1024 * 1024)
+        self.cache = ModelCache(
+            _env_int("STT_MODEL_CACHE_MB", default_budget_mb) * 1024 * 1024,
+            _env_int("STT_MODEL_IDLE_SEC", 1800)
+        )
         
     def _get_recommended_model_size(self) -> str:
         """קביעת גודל מודל מומלץ לפי זיכרון מערכת"""
@@ -783,20 +1248,50 @@ class SpeechRecognitionSystem:
         except Exception:
             return "large"  # ברירת מחדל - המודל הגדול והארוך
     
-    def _load_whisper_model(self, model_size: str = None) -> Any:
-        """טעינת מודל openai-whisper - המודל הגדול והארוך"""
-        if not model_size:
-            model_size = self.default_model_size
-            
+    def _get_default_model_type(self) -> str:
+        """
+        מנוע ברירת מחדל: STT_BACKEND אם הוגדר, אחרת faster-whisper כשהוא מותקן
+        (מהיר פי כמה על CPU לאותו גודל מודל), ואחרת openai-whisper.
+        """
+        backend = os.getenv("STT_BACKEND", "").strip().lower()
+        if backend in (self.MODEL_WHISPER, self.MODEL_FASTER_WHISPER):
+            return backend
         try:
-            import whisper
-            LOG.info(f"טוען מודל whisper {model_size} (המודל הגדול והארוך)...")
-            model = whisper.load_model(model_size)
-            return model
-        except Exception as e:
-            LOG.error(f"שגיאה בטעינת מודל whisper: {e}")
-            raise
-    
+            import faster_whisper  # noqa: F401
+            return self.MODEL_FASTER_WHISPER
+        except Exception:
+            return self.MODEL_WHISPER
+
+    def _detect_device(self) -> str:
+        """cuda אם CTranslate2 רואה כרטיס מסך, אחרת cpu"""
+        try:
+            import ctranslate2
+            if ctranslate2.get_cuda_device_count() > 0:
+                return "cuda"
+        except Exception:
+            pass
+        return "cpu"
+
+    def _get_compute_type(self) -> str:
+        """סוג החישוב מ-WHISPER_COMPUTE_TYPE (ברירת מחדל int8), עם בדיקת תקינות למכשיר"""
+        compute_type = os.getenv("WHISPER_COMPUTE_TYPE", "int8").strip().lower()
+        allowed = self.COMPUTE_TYPES_CUDA if self.device == "cuda" else self.COMPUTE_TYPES_CPU
+        if compute_type not in allowed:
+            LOG.warning(f"⚠️ WHISPER_COMPUTE_TYPE={compute_type} לא נתמך על {self.device}, משתמש ב-int8")
+            return "int8"
+        return compute_type
+
+    def _load_faster_whisper_model(self, model_size: str) -> Any:
+        """טעינת מודל faster-whisper (CTranslate2)"""
+        from faster_whisper import WhisperModel
+        LOG.info(f"טוען מודל faster-whisper {model_size} ({self.device}/{self.compute_type})...")
+        return WhisperModel(
+            model_size,
+            device=self.device,
+            compute_type=self.compute_type,
+            cpu_threads=self.cpu_threads
+        )
+
     def _load_whisper_model(self, model_size: str = None) -> Any:
         """טעינת מודל openai-whisper"""
         if not model_size:
@@ -811,44 +1306,80 @@ class SpeechRecognitionSystem:
             LOG.error(f"שגיאה בטעינת מודל whisper: {e}")
             raise
             
+    def _estimate_model_bytes(self, model_type: str, model_size: str) -> int:
+        """הערכת זיכרון למודל - משמשת כשמדידת RSS בטעינה אינה אמינה"""
+        gb = self.MODEL_RAM_GB.get(model_size.split("-")[0], 4.0)
+        if model_type == self.MODEL_FASTER_WHISPER and self.compute_type.startswith("int8"):
+            gb *= 0.4  # משקולות int8 תופסות כשליש-חצי מ-float32
+        return int(gb * 1024 ** 3)
+
+    def _checkout_model(self, model_type: Optional[str], model_size: Optional[str]) -> Tuple[Any, str, str]:
+        """תפיסת מודל מהמטמון (טעינה אם צריך), עם נפילה מ-faster-whisper ל-openai-whisper"""
+        model_type = model_type or self.default_model_type
+        model_size = model_size or self.default_model_size
+
+        if model_type == self.MODEL_FASTER_WHISPER:
+            try:
+                model = self.cache.checkout(
+                    f"{model_type}_{model_size}",
+                    lambda: self._load_faster_whisper_model(model_size),
+                    self._estimate_model_bytes(model_type, model_size)
+                )
+                return model, model_type, model_size
+            except Exception as e:
+                # נפילה חזרה ל-openai-whisper באותו גודל
+                LOG.warning(f"⚠️ טעינת faster-whisper נכשלה ({e}), עובר ל-openai-whisper")
+                model_type = self.MODEL_WHISPER
+
+        model = self.cache.checkout(
+            f"{model_type}_{model_size}",
+            lambda: self._load_whisper_model(model_size),
+            self._estimate_model_bytes(model_type, model_size)
+        )
+        return model, model_type, model_size
+
+    @contextmanager
+    def use_model(self, model_type: str = None, model_size: str = None):
+        """
+        מחזיק מודל לאורך הבלוק: (מודל, סוג_מודל, גודל_מודל).
+        המטמון לא יפרוק את המודל כל עוד הבלוק רץ.
+        """
+        model, model_type, model_size = self._checkout_model(model_type, model_size)
+        try:
+            yield model, model_type, model_size
+        finally:
+            self.cache.release(f"{model_type}_{model_size}")
+
     def get_model(self, model_type: str = None, model_size: str = None) -> Tuple[Any, str, str]:
         """
-        קבלת מודל לתעתוק. אם קיים במטמון - מחזיר אותו, אחרת טוען מודל חדש.
-        מחזיר: (מודל, סוג_מודל, גודל_מודל)
+        טעינה מוקדמת של מודל למטמון בלי להחזיק אותו.
+        מחזיר: (מודל, סוג_מודל, גודל_מודל). לתעתוק יש להשתמש ב-use_model.
         """
-        model_type = model_type or self.default_model_type
-        
-        # קביעת ברירת מחדל לגודל המודל
-        if not model_size:
-            model_size = self.default_model_size
-                
-        # מפתח ייחודי למודל
-        model_key = f"{model_type}_{model_size}"
-        
-        # בדיקה האם המודל כבר במטמון
-        with self.lock:
-            if model_key in self.models:
-                return self.models[model_key], model_type, model_size
-                
-            # טעינת מודל חדש - רק Whisper הרגיל
-            model = self._load_whisper_model(model_size)
-            self.models[model_key] = model
-            return model, model_type, model_size
+        with self.use_model(model_type, model_size) as result:
+            return result
+
+    def memory_footprint(self) -> Dict[str, Any]:
+        """צריכת הזיכרון של מטמון המודלים ושל התהליך"""
+        footprint = self.cache.footprint()
+        footprint["pid"] = os.getpid()
+        footprint["rss_bytes"] = _process_rss()
+        return footprint
     
     def transcribe(self, wav_path: str, preferred_model_type: str = None, preferred_model_size: str = None) -> Tuple[List[Dict], Optional[str]]:
         """
-        תעתוק קובץ אודיו לטקסט עם Whisper הרגיל (הגדול והארוך).
-        מחזיר: (רשימת מקטעים, שפה מזוהה)
+        תעתוק קובץ אודיו לטקסט עם faster-whisper או openai-whisper.
+        מחזיר: (רשימת מקטעים, שפה מזוהה) - אותו פורמט לשני המנועים.
         """
         if not os.path.exists(wav_path):
             LOG.error(f"קובץ אודיו לא נמצא: {wav_path}")
             return [], None
             
-        # תעתוק עם Whisper הרגיל
         try:
-            model, model_type, model_size = self.get_model(preferred_model_type, preferred_model_size)
-            return self._transcribe_with_whisper(model, wav_path)
-                
+            with self.use_model(preferred_model_type, preferred_model_size) as (model, model_type, model_size):
+                if model_type == self.MODEL_FASTER_WHISPER:
+                    return self._transcribe_with_faster_whisper(model, wav_path)
+                return self._transcribe_with_whisper(model, wav_path)
+
         except Exception as e:
             LOG.error(f"שגיאה בתעתוק עם Whisper: {e}")
             return [], None
@@ -864,187 +1395,1336 @@ class SpeechRecognitionSystem:
             out.append({"start": float(s["start"]), "end": float(s["end"]), "text": s["text"].strip()})
         return out, lang
 
+    def _transcribe_with_faster_whisper(self, model, wav_path: str) -> Tuple[List[Dict], Optional[str]]:
+        """תעתוק בעזרת faster-whisper (CTranslate2). הדילוג על שקט (VAD) חוסך פענוח מיותר"""
+        segments, info = model.transcribe(wav_path, beam_size=self.beam_size, vad_filter=True)
+
+        # segments הוא גנרטור - הפענוח מתבצע בזמן המעבר עליו
+        out = []
+        for s in segments:
+            out.append({"start": float(s.start), "end": float(s.end), "text": s.text.strip()})
+        return out, info.language
+
 # יצירת המערכת לתעתוק
 SPEECH_SYSTEM = SpeechRecognitionSystem()
 
-def stt_whisper(wav_path: str) -> Tuple[List[Dict], Optional[str]]:
+# -----------------------------
+# מאגר תהליכי תעתוק - כל תהליך טוען מודל פעם אחת ומחזיק אותו
+# -----------------------------
+def _stt_worker_init(model_type: str, model_size: str, torch_threads: int,
+                     warm_models: Tuple[Tuple[str, str], ...] = (), ready_queue=None) -> None:
+    """
+    אתחול תהליך תעתוק: הגבלת חוטי torch וטעינת המודל מראש, וגם מודלי החימום.
+    בסיום מדווח את מזהה התהליך ל-ready_queue - פעם אחת בדיוק לכל תהליך.
+    """
+    try:
+        import torch
+        torch.set_num_threads(max(1, torch_threads))
+    except Exception:
+        pass
+    SPEECH_SYSTEM.cpu_threads = max(1, torch_threads)
+    SPEECH_SYSTEM.get_model(model_type, model_size)
+    for warm_type, warm_size in warm_models:
+        SPEECH_SYSTEM.get_model(warm_type, warm_size)
+    LOG.info(f"🎙️ תהליך תעתוק {os.getpid()} מוכן ({model_type}/{model_size}, {torch_threads} חוטים)")
+    if ready_queue is not None:
+        ready_queue.put(os.getpid())
+
+def _stt_worker_ping() -> int:
+    return os.getpid()
+
+def _stt_worker_transcribe(wav_path: str, model_type: Optional[str], model_size: Optional[str]) -> Tuple[List[Dict], Optional[str]]:
+    """רץ בתוך תהליך התעתוק - משתמש במודל שכבר טעון בתהליך"""
+    return SPEECH_SYSTEM.transcribe(wav_path, model_type, model_size)
+
+class STTWorkerPool:
     """
-    זיהוי דיבור עם Whisper הרגיל (הגדול והארוך)
+    מאגר תהליכים לתעתוק. כל תהליך טוען את המודל בעת ההשקה ומחזיק אותו,
+    העבודות נשלחות ב-IPC והמקטעים חוזרים - כך תעתוקים רצים במקביל על ליבות שונות
+    במקום להתחרות על מודל אחד בתוך אותו interpreter (GIL / נעילות PyTorch).
+    workers=0 - תעתוק בתוך התהליך הראשי (ההתנהגות הקודמת).
     """
-    return SPEECH_SYSTEM.transcribe(wav_path, preferred_model_type=SpeechRecognitionSystem.MODEL_WHISPER)
+    def __init__(self, workers: int, model_type: str, model_size: str):
+        self.workers = max(0, workers)
+        self.model_type = model_type
+        self.model_size = model_size
+        self.warm_models: List[Tuple[str, str]] = []  # נטענים באתחול של כל תהליך
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._ready_queue = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                torch_threads = max(1, multiprocessing.cpu_count() // self.workers)
+                mp_context = multiprocessing.get_context("spawn")
+                self._ready_queue = mp_context.Queue()
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=mp_context,
+                    initializer=_stt_worker_init,
+                    initargs=(self.model_type, self.model_size, torch_threads,
+                              tuple(self.warm_models), self._ready_queue)
+                )
+                LOG.info(f"🎙️ מאגר תעתוק: {self.workers} תהליכים, {torch_threads} חוטי torch לכל אחד")
+            return self._executor
+
+    def _reset(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def transcribe(self, wav_path: str, model_type: Optional[str] = None,
+                   model_size: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        if self.workers == 0:
+            return SPEECH_SYSTEM.transcribe(wav_path, model_type, model_size)
+        for attempt in range(2):
+            try:
+                future = self._get_executor().submit(_stt_worker_transcribe, wav_path, model_type, model_size)
+                return future.result()
+            except BrokenProcessPool as e:
+                # תהליך קרס (למשל חוסר זיכרון) - מקימים מאגר חדש ומנסים שוב פעם אחת
+                LOG.error(f"❌ מאגר התעתוק קרס: {e}")
+                self._reset()
+                if attempt == 1:
+                    raise RuntimeError("Speech recognition worker pool crashed")
+        return [], None
+
+    def warmup(self, models: List[Tuple[str, str]], timeout: float = 1800) -> None:
+        """
+        טעינת המודלים בכל תהליכי המאגר מראש. המודלים נטענים באתחול של כל תהליך
+        (_stt_worker_init), וכל תהליך מדווח פעם אחת כשסיים - ממתינים לדיווח מכולם.
+        """
+        models = list(models)
+        if self.workers == 0:
+            for model_type, model_size in models:
+                SPEECH_SYSTEM.get_model(model_type, model_size)
+            return
+        with self._lock:
+            restart = self._executor is not None and models != self.warm_models
+            self.warm_models = models
+        if restart:
+            # תהליכים שכבר עלו בלי מודלי החימום - מקימים מחדש כדי שייטענו באתחול
+            self._reset()
+        executor = self._get_executor()
+        ready_queue = self._ready_queue
+        # משימה ריקה לכל תהליך: המאגר מקים תהליכים לפי דרישה, כך שכולם עולים
+        for _ in range(self.workers):
+            executor.submit(_stt_worker_ping)
+        deadline = time.time() + timeout
+        seen = set()
+        while len(seen) < self.workers:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise TimeoutError(f"only {len(seen)}/{self.workers} STT workers warmed up")
+            try:
+                seen.add(ready_queue.get(timeout=min(remaining, 5)))
+            except queue.Empty:
+                continue
 
-# מטמון גלובלי לתרגומים עם TTL ושמירה לדיסק
-translation_cache: Dict[str, Dict] = {}
-CACHE_TTL = 7 * 24 * 3600  # 7 ימים
-cache_lock = threading.Lock()
-CACHE_FILE = Path(APP_DIR) / "translations_cache.json"
+    def memory_footprint(self) -> Dict[str, Any]:
+        """
+        צריכת הזיכרון של התעתוק: RSS של כל תהליך עובד ותקציב המטמון שלו,
+        או מצב המטמון בתהליך הראשי כש-workers=0.
+        """
+        if self.workers == 0:
+            return {"workers": [], "in_process": SPEECH_SYSTEM.memory_footprint()}
+        with self._lock:
+            processes = dict(getattr(self._executor, "_processes", None) or {})
+        workers = []
+        for pid in processes:
+            try:
+                workers.append({"pid": pid, "rss_bytes": psutil.Process(pid).memory_info().rss})
+            except Exception:
+                continue
+        return {
+            "workers": workers,
+            "total_rss_bytes": sum(w["rss_bytes"] for w in workers),
+            "budget_bytes_per_worker": SPEECH_SYSTEM.cache.budget_bytes,
+        }
 
-def load_translation_cache():
-    """טעינת מטמון התרגומים מקובץ"""
-    global translation_cache
+    def shutdown(self) -> None:
+        self._reset()
+
+def _default_stt_workers() -> int:
+    """מספר תהליכי תעתוק: רבע מהליבות, מוגבל לזיכרון הפנוי לפי גודל המודל"""
     try:
-        if CACHE_FILE.exists():
-            with open(CACHE_FILE, 'r', encoding='utf-8') as f:
-                loaded_cache = json.load(f)
-                # סינון ערכים שפג תוקפם לפני טעינה
-                current_time = time.time()
-                translation_cache = {
-                    k: v for k, v in loaded_cache.items() 
-                    if current_time - v.get('timestamp', 0) < CACHE_TTL
-                }
-                LOG.info(f"✅ נטענו {len(translation_cache)} תרגומים מהמטמון")
-    except Exception as e:
-        LOG.warning(f"⚠️ שגיאה בטעינת מטמון התרגומים: {e}")
-        translation_cache = {}
+        model_gb = SpeechRecognitionSystem.MODEL_RAM_GB.get(SPEECH_SYSTEM.default_model_size, 4.0)
+        available_gb = psutil.virtual_memory().available / (1024 ** 3)
+        return max(1, min(multiprocessing.cpu_count() // 4, int(available_gb // model_gb)))
+    except Exception:
+        return 1
 
-def save_translation_cache():
-    """שמירת מטמון התרגומים לקובץ"""
+STT_POOL = STTWorkerPool(
+    _env_int("STT_WORKERS", _default_stt_workers()),
+    SPEECH_SYSTEM.default_model_type,
+    SPEECH_SYSTEM.default_model_size
+)
+
+@atexit.register
+def shutdown_stt_pool():
+    """סגירת תהליכי התעתוק בעת יציאה"""
     try:
-        # ניקוי המטמון לפני שמירה
-        cleanup_expired_cache()
-        with cache_lock:
-            with open(CACHE_FILE, 'w', encoding='utf-8') as f:
-                json.dump(translation_cache, f, ensure_ascii=False)
-        LOG.info(f"✅ נשמרו {len(translation_cache)} תרגומים במטמון")
+        STT_POOL.shutdown()
     except Exception as e:
-        LOG.warning(f"⚠️ שגיאה בשמירת מטמון התרגומים: {e}")
+        LOG.error(f"שגיאה בסגירת מאגר התעתוק: {e}")
+
+def stt_whisper(wav_path: str, model_size: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+    """
+    זיהוי דיבור עם מנוע ברירת המחדל (faster-whisper אם זמין) - דרך מאגר תהליכי התעתוק.
+    model_size - גודל שנבחר לעבודה (מדיניות SLO); ברירת מחדל - גודל ברירת המחדל.
+    """
+    return STT_POOL.transcribe(wav_path, model_size=model_size)
+
+# -----------------------------
+# חימום מודלים ברקע בזמן שהבוט עולה
+# -----------------------------
+class ModelWarmup:
+    """
+    טוען את המודלים המוגדרים בחוט רקע כדי שהמשתמש הראשון לא ישלם על הטעינה.
+    מצב המוכנות (cold/warming/ready/failed) וזמן משוער לסיום זמינים לשאר הבוט.
+    כשל בחימום אינו חוסם - המודל ייטען בעבודה הראשונה כמו קודם.
+    """
+    STATE_COLD = "cold"
+    STATE_WARMING = "warming"
+    STATE_READY = "ready"
+    STATE_FAILED = "failed"
+
+    # הערכת זמן טעינה (שניות) לכל גודל מודל, כולל הורדה מהמטמון המקומי
+    LOAD_ESTIMATE_SEC = {"tiny": 5, "base": 8, "small": 15, "medium": 45, "large": 100}
+    TIMEOUT_SEC = 1800
+
+    def __init__(self, models: List[Tuple[str, str]]):
+        self.models = models
+        self.state = self.STATE_COLD if models else self.STATE_READY
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._started = 0.0
+        self._thread: Optional[threading.Thread] = None
+        if not models:
+            self._ready.set()
+
+    @staticmethod
+    def from_env() -> "ModelWarmup":
+        """
+        STT_WARMUP_MODELS: רשימה מופרדת בפסיקים של "גודל" או "מנוע:גודל".
+        ריק - מודל ברירת המחדל; none - ללא חימום (טעינה בעבודה הראשונה).
+        """
+        raw = os.getenv("STT_WARMUP_MODELS", "").strip()
+        if raw.lower() in ("none", "0", "off"):
+            return ModelWarmup([])
+        models = []
+        for item in filter(None, (x.strip() for x in raw.split(","))):
+            model_type, _, model_size = item.rpartition(":")
+            models.append((model_type or SPEECH_SYSTEM.default_model_type, model_size))
+        return ModelWarmup(models or [(SPEECH_SYSTEM.default_model_type, SPEECH_SYSTEM.default_model_size)])
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None or not self.models:
+                return
+            self.state = self.STATE_WARMING
+            self._thread = threading.Thread(target=self._run, name="model-warmup", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        started = time.time()
+        try:
+            with self._lock:
+                self._started = started
+            names = ", ".join(f"{t}/{s}" for t, s in self.models)
+            LOG.info(f"🔥 מחמם מודלים {names} (משוער {self.eta_seconds()} שניות)...")
+            # כל תהליך תעתוק טוען את כל המודלים באתחול שלו
+            STT_POOL.warmup(self.models, timeout=self.TIMEOUT_SEC)
+            with self._lock:
+                self.state = self.STATE_READY
+            LOG.info(f"✅ המודלים מוכנים לאחר {time.time() - started:.1f} שניות")
+        except Exception as e:
+            with self._lock:
+                self.state = self.STATE_FAILED
+            LOG.error(f"❌ חימום המודלים נכשל ({e}) - המודל ייטען בעבודה הראשונה")
+        finally:
+            self._ready.set()
+
+    def is_ready(self) -> bool:
+        return self._ready.is_set()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def eta_seconds(self) -> int:
+        """זמן משוער עד שכל המודלים טעונים"""
+        if self._ready.is_set():
+            return 0
+        # כל תהליך טוען את המודלים אחד אחרי השני - הזמן המשוער הוא הסכום
+        remaining = sum(self.LOAD_ESTIMATE_SEC.get(model_size.split("-")[0], 60) for _, model_size in self.models)
+        if self.state == self.STATE_WARMING:
+            remaining -= time.time() - self._started
+        return max(5, int(remaining))
+
+    def status(self) -> Dict[str, Any]:
+        return {"state": self.state, "eta_sec": self.eta_seconds(),
+                "models": [f"{t}/{s}" for t, s in self.models]}
+
+MODEL_WARMUP = ModelWarmup.from_env()
+
+# -----------------------------
+# מדיניות SLO - בחירת גודל מודל והגדרות קידוד לכל עבודה
+# -----------------------------
+class SLOPolicy:
+    """
+    בוחרת לכל עבודה גודל Whisper ו-preset/CRF של x264 כך שזמן העיבוד המשוער
+    יעמוד ביעד (SLO_TARGET_SEC). ההערכה: אורך הקליפ × מקדם זמן-אמת (RTF) של כל שלב,
+    כפול העומס בתור. מתחת לעומס יורדים בהדרגה (קודם preset, אחר כך גודל מודל)
+    וכשהתור מתרוקן חוזרים לאיכות המלאה. המקדמים מתעדכנים (EWMA) ממדידות בפועל.
+    """
+    # גדלים מהגדול לקטן - התקרה היא הגודל המומלץ לפי זיכרון
+    SIZE_LADDER = ["large", "medium", "small", "base", "tiny"]
+    # presets מהאיטי לזריז, ותוספת CRF לכל צעד מתחת לברירת המחדל
+    PRESET_LADDER = ["medium", "faster", "veryfast", "superfast"]
+    CRF_STEP = 1
+
+    # זמן עיבוד לשנייה של אודיו/וידאו - הערכות התחלתיות על CPU
+    STT_RTF = {"large": 1.0, "medium": 0.5, "small": 0.2, "base": 0.08, "tiny": 0.05}
+    ENCODE_RTF = {"medium": 0.5, "faster": 0.3, "veryfast": 0.2, "superfast": 0.12}
+    FIXED_OVERHEAD_SEC = 15  # הורדה, חילוץ אודיו, תרגום והעלאה
+
+    def __init__(self, target_sec: int, alpha: float = 0.3):
+        self.target_sec = max(1, target_sec)
+        self.alpha = alpha
+        self.stt_rtf = dict(self.STT_RTF)
+        self.encode_rtf = dict(self.ENCODE_RTF)
+        # מנוע openai-whisper איטי פי כמה מ-faster-whisper באותו גודל
+        if SPEECH_SYSTEM.default_model_type == SpeechRecognitionSystem.MODEL_WHISPER:
+            self.stt_rtf = {k: v * 3 for k, v in self.stt_rtf.items()}
+        self._lock = threading.Lock()
+
+    def _sizes(self) -> List[str]:
+        cap = SPEECH_SYSTEM.recommended_size.split("-")[0]
+        ladder = self.SIZE_LADDER
+        return ladder[ladder.index(cap):] if cap in ladder else ladder
+
+    def _stt_parallelism(self) -> int:
+        return max(1, STT_POOL.workers)
+
+    def plan(self, duration_sec: Optional[float], queue_depth: int, is_hd: bool,
+             with_stt: bool = True) -> Dict[str, Any]:
+        """
+        החלטה לעבודה: {"model_size", "encode_profile", "estimate_sec", "degraded"}.
+        queue_depth - עבודות אחרות בתור/בריצה שמתחרות על אותם משאבים.
+        degraded - נבחרה איכות נמוכה מהמלאה (מודל קטן יותר או preset מהיר יותר) בגלל עומס.
+        """
+        base = _x264_profile(is_hd)
+        presets = self.PRESET_LADDER[self.PRESET_LADDER.index(base["preset"]):]
+        sizes = self._sizes() if with_stt else [None]
+        duration = duration_sec or 60.0  # בלי ffprobe - הנחה שמרנית של דקה
+        load = 1 + queue_depth / self._stt_parallelism()
+
+        choice = None
+        with self._lock:
+            for size in sizes:
+                for step, preset in enumerate(presets):
+                    stt = self.stt_rtf[size] * duration * load if size else 0.0
+                    encode = self.encode_rtf[preset] * duration * load
+                    estimate = stt + encode + self.FIXED_OVERHEAD_SEC
+                    choice = (size, preset, step, estimate)
+                    if estimate <= self.target_sec:
+                        break
+                else:
+                    continue
+                break
+
+        size, preset, step, estimate = choice
+        profile = {"preset": preset, "crf": str(int(base["crf"]) + step * self.CRF_STEP)}
+        decision = {"model_size": size, "encode_profile": profile, "estimate_sec": int(estimate),
+                    "degraded": step > 0 or size != sizes[0]}
+        LOG.info(
+            f"🎯 SLO: קליפ {duration:.0f}s, עומס {queue_depth} → "
+            f"{('whisper ' + size + ', ') if size else ''}x264 {preset}/crf {profile['crf']} "
+            f"(משוער {estimate:.0f}s, יעד {self.target_sec}s)"
+        )
+        return decision
+
+    def _observe(self, table: Dict[str, float], key: Optional[str], media_sec: Optional[float], elapsed: float) -> None:
+        if not key or key not in table or not media_sec or media_sec < 5:
+            return
+        with self._lock:
+            table[key] = (1 - self.alpha) * table[key] + self.alpha * (elapsed / media_sec)
+
+    def observe_stt(self, model_size: Optional[str], media_sec: Optional[float], elapsed: float) -> None:
+        """עדכון מקדם התעתוק לגודל המודל לפי זמן שנמדד בפועל"""
+        self._observe(self.stt_rtf, (model_size or "").split("-")[0], media_sec, elapsed)
+
+    def observe_encode(self, preset: Optional[str], media_sec: Optional[float], elapsed: float) -> None:
+        """עדכון מקדם הקידוד ל-preset לפי זמן שנמדד בפועל"""
+        self._observe(self.encode_rtf, preset, media_sec, elapsed)
+
+SLO_POLICY = SLOPolicy(_env_int("SLO_TARGET_SEC", 300))
+
+# -----------------------------
+# מטמון תרגומים - SQLite (WAL) עם LRU בזיכרון ואינדקס תפוגה
+# -----------------------------
+CACHE_TTL = 7 * 24 * 3600  # 7 ימים
+CACHE_FILE = Path(APP_DIR) / "translations_cache.json"  # פורמט ישן - מיובא פעם אחת ל-SQLite
+# מספר מופעים של הבוט על אותו מחשב יכולים להצביע על אותו קובץ ולחלוק את המטמון
+TRANSLATION_DB = Path(os.getenv("TRANSLATION_DB_PATH") or Path(APP_DIR) / "translations.db")
 
 def get_cache_key(text: str, dest_lang: str) -> str:
     """יצירת מפתח cache ייחודי לכל תרגום"""
     content = f"{text}:{dest_lang}"
     return hashlib.md5(content.encode()).hexdigest()
 
-def get_cached_translation(text: str, dest_lang: str) -> Optional[str]:
-    """קבלת תרגום ממטמון אם קיים ולא פג תוקף"""
-    with cache_lock:
-        cache_key = get_cache_key(text, dest_lang)
-        cached = translation_cache.get(cache_key)
-        if cached and time.time() - cached['timestamp'] < CACHE_TTL:
-            return cached['translation']
-        return None
+def _sqlite_connect(db_path: Path, busy_timeout_ms: int):
+    """חיבור SQLite משותף-בין-תהליכים: WAL, busy_timeout ו-autocommit (טרנזקציות ידניות)"""
+    import sqlite3
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(
+        str(db_path), check_same_thread=False, isolation_level=None,
+        timeout=busy_timeout_ms / 1000.0
+    )
+    conn.execute(f"PRAGMA busy_timeout={busy_timeout_ms}")
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+def _sqlite_write(db, sql: str, rows: List[Tuple], retries: int = 5) -> None:
+    """
+    כתיבה בטרנזקציה אחת. BEGIN IMMEDIATE תופס את נעילת הכתיבה מראש, כך שמופעים
+    אחרים ממתינים (busy_timeout) במקום להיכשל באמצע; ואם עדיין נעול - ניסיון חוזר.
+    """
+    import sqlite3
+    for attempt in range(retries):
+        try:
+            db.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError as e:
+            if ("locked" not in str(e) and "busy" not in str(e)) or attempt == retries - 1:
+                raise
+            time.sleep(0.05 * (2 ** attempt))
+            continue
+        try:
+            db.executemany(sql, rows)
+            db.execute("COMMIT")
+            return
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
 
-def cache_translation(text: str, dest_lang: str, translation: str):
-    """שמירת תרגום במטמון"""
-    with cache_lock:
-        cache_key = get_cache_key(text, dest_lang)
-        translation_cache[cache_key] = {
-            'translation': translation,
-            'timestamp': time.time()
-        }
-    
-    # שמירה לדיסק כל 50 תרגומים חדשים
-    if len(translation_cache) % 50 == 0:
-        save_translation_cache()
+class TranslationStore:
+    """
+    מטמון תרגומים על דיסק: כל תרגום נכתב מיד כשורה (בלי שמירה מחדש של כל המטמון),
+    LRU חסום בזיכרון לפני SQLite, ותפוגה לפי אינדקס על expires_at - הניקוי לא סורק הכל.
+    החיבור נפתח בשימוש הראשון, כך שתהליכי עזר שמייבאים את המודול לא נוגעים בקובץ.
+    הקובץ ניתן לשיתוף בין כמה תהליכי בוט על אותו מחשב: WAL לקריאה במקביל לכתיבה,
+    busy_timeout וכתיבה ב-BEGIN IMMEDIATE עם ניסיונות חוזרים כשקובץ נעול.
+    כל מה שמופע אחד כותב נראה מיד לאחרים (ה-LRU שומר רק פגיעות, החטאות נבדקות בקובץ).
+    """
+    CLEANUP_INTERVAL = 3600  # ניקוי רשומות שפג תוקפן לכל היותר פעם בשעה
+    SQL_CHUNK = 500  # מגבלת פרמטרים בשאילתת IN
+    WRITE_RETRIES = 5
+
+    def __init__(self, db_path: Path, ttl: int, lru_size: int, busy_timeout_ms: int = 5000):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.lru_size = max(0, lru_size)
+        self.busy_timeout_ms = max(0, busy_timeout_ms)
+        self._lru: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()  # key -> (תרגום, expires_at)
+        self._conn = None
+        self._lock = threading.Lock()
+        self._last_cleanup = 0.0
+
+    def _db(self):
+        """חיבור ל-SQLite (נפתח פעם אחת); נקרא תחת self._lock"""
+        if self._conn is None:
+            self._conn = _sqlite_connect(self.db_path, self.busy_timeout_ms)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                " key TEXT PRIMARY KEY,"
+                " lang TEXT,"
+                " source TEXT,"
+                " translation TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " expires_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_translations_expires ON translations(expires_at)")
+        return self._conn
 
-def cleanup_expired_cache():
-    """ניקוי תרגומים שפג תוקפם"""
-    with cache_lock:
-        current_time = time.time()
-        expired_keys = [
-            key for key, value in translation_cache.items()
-            if current_time - value['timestamp'] >= CACHE_TTL
-        ]
-        for key in expired_keys:
-            del translation_cache[key]
-        return len(expired_keys)
+    def _write_locked(self, sql: str, rows: List[Tuple]) -> None:
+        _sqlite_write(self._db(), sql, rows, self.WRITE_RETRIES)
+
+    def _remember_locked(self, key: str, translation: str, expires_at: float) -> None:
+        if not self.lru_size:
+            return
+        self._lru[key] = (translation, expires_at)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def get_many(self, texts: List[str], dest_lang: str) -> Dict[str, str]:
+        """תרגומים שנמצאו במטמון: {טקסט: תרגום}. קודם LRU, והשאר בשאילתה אחת לכל מקטע"""
+        now = time.time()
+        found: Dict[str, str] = {}
+        missing: Dict[str, str] = {}  # key -> text
+        with self._lock:
+            for text in texts:
+                key = get_cache_key(text, dest_lang)
+                hit = self._lru.get(key)
+                if hit and hit[1] > now:
+                    self._lru.move_to_end(key)
+                    found[text] = hit[0]
+                else:
+                    missing[key] = text
+            keys = list(missing)
+            for i in range(0, len(keys), self.SQL_CHUNK):
+                chunk = keys[i:i + self.SQL_CHUNK]
+                rows = self._db().execute(
+                    f"SELECT key, translation, expires_at FROM translations "
+                    f"WHERE key IN ({','.join('?' * len(chunk))}) AND expires_at > ?",
+                    (*chunk, now)
+                ).fetchall()
+                for key, translation, expires_at in rows:
+                    found[missing[key]] = translation
+                    self._remember_locked(key, translation, expires_at)
+        return found
+
+    def get(self, text: str, dest_lang: str) -> Optional[str]:
+        return self.get_many([text], dest_lang).get(text)
+
+    def put_many(self, items: List[Tuple[str, str]], dest_lang: str) -> None:
+        """שמירת [(טקסט, תרגום)] בטרנזקציה אחת"""
+        if not items:
+            return
+        now = time.time()
+        expires_at = now + self.ttl
+        rows = [(get_cache_key(text, dest_lang), dest_lang, text, translation, now, expires_at)
+                for text, translation in items]
+        with self._lock:
+            self._write_locked(
+                "INSERT OR REPLACE INTO translations (key, lang, source, translation, created_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+            for key, _, _, translation, _, exp in rows:
+                self._remember_locked(key, translation, exp)
+        if now - self._last_cleanup > self.CLEANUP_INTERVAL:
+            self.cleanup_expired()
+
+    def put(self, text: str, dest_lang: str, translation: str) -> None:
+        self.put_many([(text, translation)], dest_lang)
+
+    def cleanup_expired(self) -> int:
+        """מחיקת רשומות שפג תוקפן דרך האינדקס; מחזיר כמה נמחקו"""
+        now = time.time()
+        with self._lock:
+            self._last_cleanup = now
+            deleted = self._db().execute("DELETE FROM translations WHERE expires_at <= ?", (now,)).rowcount
+            for key in [k for k, (_, exp) in self._lru.items() if exp <= now]:
+                del self._lru[key]
+        if deleted:
+            LOG.info(f"🧹 נמחקו {deleted} תרגומים שפג תוקפם")
+        return deleted
+
+    def migrate_json(self, json_path: Path) -> int:
+        """ייבוא חד-פעמי של קובץ ה-JSON הישן; הקובץ משנה שם כדי שלא ייובא שוב"""
+        if not json_path.exists():
+            return 0
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                legacy = json.load(f)
+            now = time.time()
+            # במבנה הישן נשמרו רק מפתח (md5), תרגום וזמן - בלי טקסט המקור והשפה
+            rows = [
+                (key, None, None, v["translation"], v.get("timestamp", now), v.get("timestamp", now) + self.ttl)
+                for key, v in legacy.items()
+                if isinstance(v, dict) and v.get("translation") and now - v.get("timestamp", 0) < self.ttl
+            ]
+            with self._lock:
+                self._write_locked("INSERT OR IGNORE INTO translations VALUES (?, ?, ?, ?, ?, ?)", rows)
+            json_path.rename(json_path.with_name(json_path.name + ".migrated"))
+            LOG.info(f"✅ יובאו {len(rows)} תרגומים מ-{json_path.name} למטמון SQLite")
+            return len(rows)
+        except Exception as e:
+            LOG.warning(f"⚠️ ייבוא מטמון התרגומים הישן נכשל: {e}")
+            return 0
+
+    def max_rowid(self) -> int:
+        with self._lock:
+            return self._db().execute("SELECT COALESCE(MAX(rowid), 0) FROM translations").fetchone()[0]
+
+    def rows_since(self, rowid: int, limit: int = 5000) -> List[Tuple[int, str, str, str]]:
+        """[(rowid, שפה, מקור, תרגום)] שנכתבו אחרי rowid - גם על ידי מופעים אחרים"""
+        with self._lock:
+            return self._db().execute(
+                "SELECT rowid, lang, source, translation FROM translations "
+                "WHERE rowid > ? AND source IS NOT NULL ORDER BY rowid LIMIT ?",
+                (rowid, limit)
+            ).fetchall()
+
+    def recent_sources(self, limit: int) -> List[Tuple[str, str, str]]:
+        """[(שפה, מקור, תרגום)] לרשומות החדשות ביותר שיש להן טקסט מקור"""
+        with self._lock:
+            return self._db().execute(
+                "SELECT lang, source, translation FROM translations "
+                "WHERE source IS NOT NULL AND expires_at > ? ORDER BY created_at DESC LIMIT ?",
+                (time.time(), limit)
+            ).fetchall()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db().execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+TRANSLATION_STORE = TranslationStore(
+    TRANSLATION_DB, CACHE_TTL,
+    _env_int("TRANSLATION_CACHE_LRU", 20000),
+    _env_int("TRANSLATION_DB_BUSY_TIMEOUT_MS", 5000)
+)
 
-# שיפור פונקציית התרגום הראשית
-def translate_text(segments: List[Dict], dest_lang: str) -> List[Dict]:
+# -----------------------------
+# זיכרון תרגום - שימוש חוזר בתרגומים לשורות כמעט זהות
+# -----------------------------
+class TranslationMemory:
     """
-    תרגום משופר עם Google Translate ומטמון חכם
-    כולל טיפול שגיאות אחיד, מנגנון ניסיונות חוזרים, ומטמון פרסיסטנטי
+    שכבת חיפוש מעל מטמון התרגומים לשורות שחוזרות עם הבדלי פיסוק/רישיות קטנים
+    (פתיחים, פרסומות, פזמונים). שני שלבים לכל שפת יעד:
+    • התאמה מדויקת אחרי נרמול (רישיות, פיסוק, רווחים).
+    • התאמה עמומה: MinHash על n-gram של תווים עם אינדקס LSH, ואימות דמיון Jaccard
+      מדויק מול הסף. רק לשורות באורך min_chars ומעלה, ורק אם המספרים בשורה זהים.
     """
-    if not segments:
-        LOG.warning("No segments to translate")
-        return []
-    
-    # טעינת מטמון בהפעלה ראשונה אם לא נטען עדיין
-    if not translation_cache and CACHE_FILE.exists():
-        load_translation_cache()
-    
-    out = []
-    num_cache_hits = 0
-    num_new_translations = 0
-    
-    # הכנת Google Translator
-    try:
-        from googletrans import Translator
-        translator = Translator(service_urls=[
-            'translate.google.com',
-            'translate.google.co.il',
-        ])
-    except Exception as e:
-        LOG.error(f"Failed to initialize Google Translate: {e}")
-        return segments
+    NGRAM = 3
+    NUM_PERM = 64
+    BANDS = 16  # 16 רצועות × 4 שורות: מועמד כמעט בוודאות מעל דמיון 0.8
+    _PRIME = (1 << 61) - 1
+    _DIGITS_RE = re.compile(r"\d+")
+    _PUNCT_RE = re.compile(r"[^\w\s]")
+    _APOSTROPHE_RE = re.compile(r"['’`´]")  # don't / dont - בלי לפצל את המילה
+
+    def __init__(self, threshold: float, min_chars: int, max_entries: int):
+        self.threshold = threshold
+        self.min_chars = min_chars
+        self.max_entries = max(1, max_entries)
+        rnd = random.Random(1337)  # פרמוטציות קבועות בין הפעלות
+        self._perms = [(rnd.randrange(1, self._PRIME), rnd.randrange(0, self._PRIME)) for _ in range(self.NUM_PERM)]
+        self._rows = self.NUM_PERM // self.BANDS
+        self._langs: Dict[str, Dict[str, Any]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = {"exact": 0, "fuzzy": 0}
 
-    # טיפול באצווה - חלוקה לקבוצות של 10 תרגומים מקסימום
-    batch_size = 10
-    segments_batch = []
-    
-    for i, seg in enumerate(segments):
-        text = seg["text"]
-        if not text.strip():
-            out.append(seg)
-            continue
-            
-        # בדיקה במטמון קודם
-        cached_translation = get_cached_translation(text, dest_lang)
-        if cached_translation:
-            out.append({**seg, "text": cached_translation})
-            num_cache_hits += 1
-            continue
-        
-        # מוסיפים לאצווה לתרגום
-        segments_batch.append(seg)
-        
-        # מתרגמים כשהאצווה מלאה או בסיום
-        if len(segments_batch) >= batch_size or i == len(segments) - 1:
-            if segments_batch:
-                # תרגום אצווה עם ניסיונות חוזרים
-                for retry in range(3):
-                    try:
-                        batch_texts = [s["text"] for s in segments_batch]
-                        if len(batch_texts) == 1:
-                            # תרגום בודד
-                            result = translator.translate(batch_texts[0], dest=dest_lang)
-                            translations = [result.text] if result and hasattr(result, 'text') else [""]
-                        else:
-                            # תרגום אצווה - הערה: זו יכולה להיות פונקציה שלא נתמכת בגרסאות מסוימות
-                            results = translator.translate(batch_texts, dest=dest_lang)
-                            translations = [r.text for r in results] if results else [""] * len(batch_texts)
-                        
-                        # שומרים את התרגומים במטמון ומוסיפים לפלט
-                        for j, s in enumerate(segments_batch):
-                            if j < len(translations) and translations[j]:
-                                translated_text = translations[j]
-                                if dest_lang.lower() == 'he':
-                                    translated_text = bidi.get_display(translated_text)
-                                cache_translation(s["text"], dest_lang, translated_text)
-                                out.append({**s, "text": translated_text})
-                                num_new_translations += 1
-                            else:
-                                out.append(s)  # במקרה של כישלון - משאירים את הטקסט המקורי
-                        
-                        # ניקוי האצווה אחרי עיבוד
-                        segments_batch = []
-                        break  # יציאה מלולאת הניסיונות אם הצליח
-                        
-                    except Exception as e:
-                        LOG.warning(f"Batch translation attempt {retry + 1} failed: {e}")
-                        if retry < 2:
-                            time.sleep(1 * (retry + 1))  # המתנה ארוכה יותר בין ניסיונות
-                        else:
-                            # כשל סופי - החזרת הטקסטים המקוריים
-                            LOG.error(f"Failed to translate batch after 3 attempts")
-                            for s in segments_batch:
-                                out.append(s)
-                            segments_batch = []
-    
-    # שמירת המטמון בסיום
-    if num_new_translations > 0:
-        save_translation_cache()
-    
-    LOG.info(f"Translation complete: {num_cache_hits} cache hits, {num_new_translations} new translations")
+    @classmethod
+    def normalize(cls, text: str) -> str:
+        text = cls._APOSTROPHE_RE.sub("", unicodedata.normalize("NFKC", text).casefold())
+        return " ".join(cls._PUNCT_RE.sub(" ", text).split())
+
+    def _shingles(self, norm: str) -> frozenset:
+        padded = f" {norm} "
+        return frozenset(padded[i:i + self.NGRAM] for i in range(max(1, len(padded) - self.NGRAM + 1)))
+
+    def _signature(self, shingles: frozenset) -> Tuple[int, ...]:
+        hashes = [zlib.crc32(sh.encode("utf-8")) for sh in shingles]
+        return tuple(min((a * h + b) % self._PRIME for h in hashes) for a, b in self._perms)
+
+    def _bands(self, signature: Tuple[int, ...]) -> List[Tuple[int, ...]]:
+        return [signature[i * self._rows:(i + 1) * self._rows] for i in range(self.BANDS)]
+
+    def _index(self, lang: str) -> Dict[str, Any]:
+        index = self._langs.get(lang)
+        if index is None:
+            index = {"entries": OrderedDict(), "exact": {}, "buckets": [{} for _ in range(self.BANDS)]}
+            self._langs[lang] = index
+        return index
+
+    def _evict_locked(self, index: Dict[str, Any]) -> None:
+        while len(index["entries"]) > self.max_entries:
+            entry_id, (norm, _, _, bands) = index["entries"].popitem(last=False)
+            if index["exact"].get(norm) == entry_id:
+                del index["exact"][norm]
+            for bucket, band in zip(index["buckets"], bands):
+                ids = bucket.get(band)
+                if ids:
+                    ids.discard(entry_id)
+                    if not ids:
+                        del bucket[band]
+
+    def add_many(self, items: List[Tuple[str, str]], dest_lang: str) -> None:
+        """הוספת [(מקור, תרגום)] לזיכרון"""
+        prepared = []
+        for source, translation in items:
+            norm = self.normalize(source or "")
+            if not norm or not translation:
+                continue
+            if len(norm) >= self.min_chars:
+                shingles = self._shingles(norm)
+                bands = self._bands(self._signature(shingles))
+            else:
+                shingles, bands = frozenset(), []
+            prepared.append((norm, shingles, translation, bands))
+        if not prepared:
+            return
+        with self._lock:
+            index = self._index(dest_lang)
+            for norm, shingles, translation, bands in prepared:
+                existing = index["exact"].get(norm)
+                if existing is not None and index["entries"][existing][2] == translation:
+                    continue  # כבר בזיכרון (למשל כתיבה שלנו שחזרה במעקב אחרי הקובץ)
+                entry_id = self._next_id
+                self._next_id += 1
+                index["entries"][entry_id] = (norm, shingles, translation, bands)
+                index["exact"][norm] = entry_id
+                for bucket, band in zip(index["buckets"], bands):
+                    bucket.setdefault(band, set()).add(entry_id)
+            self._evict_locked(index)
+
+    def lookup(self, text: str, dest_lang: str) -> Optional[Tuple[str, float]]:
+        """(תרגום, דמיון) לשורה הדומה ביותר מעל הסף, או None"""
+        norm = self.normalize(text)
+        if not norm:
+            return None
+        with self._lock:
+            index = self._langs.get(dest_lang)
+            if not index:
+                return None
+            entry_id = index["exact"].get(norm)
+            if entry_id is not None:
+                self.hits["exact"] += 1
+                return index["entries"][entry_id][2], 1.0
+        if len(norm) < self.min_chars:
+            return None
+
+        shingles = self._shingles(norm)
+        bands = self._bands(self._signature(shingles))
+        digits = self._DIGITS_RE.findall(norm)
+        best: Optional[Tuple[str, float]] = None
+        with self._lock:
+            candidates = set()
+            for bucket, band in zip(index["buckets"], bands):
+                candidates |= bucket.get(band, set())
+            for entry_id in candidates:
+                cand_norm, cand_shingles, translation, _ = index["entries"][entry_id]
+                # "פרק 3" ו"פרק 4" דומים מאוד בתווים - אבל התרגום שונה
+                if self._DIGITS_RE.findall(cand_norm) != digits:
+                    continue
+                similarity = len(shingles & cand_shingles) / len(shingles | cand_shingles)
+                if similarity >= self.threshold and (best is None or similarity > best[1]):
+                    best = (translation, similarity)
+            if best:
+                self.hits["fuzzy"] += 1
+        return best
+
+    def _add_rows(self, rows: List[Tuple[str, str, str]]) -> int:
+        by_lang: Dict[str, List[Tuple[str, str]]] = {}
+        for lang, source, translation in rows:
+            by_lang.setdefault(lang, []).append((source, translation))
+        for lang, items in by_lang.items():
+            self.add_many(items, lang)
+        return len(rows)
+
+    WARM_CHUNK = 200
+
+    def warm_from(self, store: "TranslationStore", limit: int, tail_interval: float = 0) -> None:
+        """
+        טעינת התרגומים האחרונים מהמטמון לזיכרון, בחוט רקע.
+        MinHash בפייתון טהור מחזיק את ה-GIL (בערך מילישנייה לשורה), ולכן limit נשמר
+        קטן בהרבה מ-max_entries, והטעינה נעשית במנות קטנות עם הפסקה ביניהן כדי
+        שה-handlers לא ימתינו לה. שאר הזיכרון מתמלא מתרגומים חדשים בזמן ריצה.
+        tail_interval > 0 - המשך מעקב אחרי שורות חדשות בקובץ (rowid), כך שתרגומים
+        שמופעי בוט אחרים כתבו לקובץ המשותף נכנסים גם לזיכרון של המופע הזה.
+        """
+        def run():
+            try:
+                last_rowid = store.max_rowid()
+                # מהישן לחדש - החדשים אחרונים לפינוי
+                rows = store.recent_sources(min(limit, self.max_entries))[::-1]
+                loaded = 0
+                for i in range(0, len(rows), self.WARM_CHUNK):
+                    loaded += self._add_rows(rows[i:i + self.WARM_CHUNK])
+                    time.sleep(0.05)
+                LOG.info(f"🧠 זיכרון התרגום נטען: {loaded} שורות")
+            except Exception as e:
+                LOG.warning(f"⚠️ טעינת זיכרון התרגום נכשלה: {e}")
+                return
+            while tail_interval > 0:
+                time.sleep(tail_interval)
+                try:
+                    rows = store.rows_since(last_rowid)
+                    if rows:
+                        last_rowid = rows[-1][0]
+                        self._add_rows([row[1:] for row in rows])
+                except Exception as e:
+                    LOG.warning(f"⚠️ מעקב זיכרון התרגום נכשל: {e}")
+        threading.Thread(target=run, name="tm-warmup", daemon=True).start()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": {lang: len(ix["entries"]) for lang, ix in self._langs.items()}, "hits": dict(self.hits)}
+
+TRANSLATION_MEMORY = TranslationMemory(
+    _env_float("TM_SIMILARITY", 0.9),
+    _env_int("TM_MIN_CHARS", 12),
+    _env_int("TM_MAX_ENTRIES", 100000)
+)
+
+def load_translation_cache():
+    """פתיחת מטמון התרגומים, ייבוא הקובץ הישן אם קיים וניקוי רשומות שפג תוקפן"""
+    try:
+        TRANSLATION_STORE.migrate_json(CACHE_FILE)
+        TRANSLATION_STORE.cleanup_expired()
+        LOG.info(f"✅ מטמון התרגומים מכיל {TRANSLATION_STORE.count()} תרגומים")
+        TRANSLATION_MEMORY.warm_from(TRANSLATION_STORE, _env_int("TM_WARM_ENTRIES", 5000),
+                                     _env_float("TM_TAIL_SEC", 5.0))
+    except Exception as e:
+        LOG.warning(f"⚠️ שגיאה בטעינת מטמון התרגומים: {e}")
+
+def save_translation_cache():
+    """סגירת מטמון התרגומים (כל תרגום כבר נכתב לדיסק בזמן השמירה)"""
+    try:
+        TRANSLATION_STORE.close()
+    except Exception as e:
+        LOG.warning(f"⚠️ שגיאה בסגירת מטמון התרגומים: {e}")
+
+def get_cached_translation(text: str, dest_lang: str) -> Optional[str]:
+    """קבלת תרגום ממטמון אם קיים ולא פג תוקף"""
+    return TRANSLATION_STORE.get(text, dest_lang)
+
+def cache_translation(text: str, dest_lang: str, translation: str):
+    """שמירת תרגום במטמון"""
+    TRANSLATION_STORE.put(text, dest_lang, translation)
+
+def cleanup_expired_cache():
+    """ניקוי תרגומים שפג תוקפם"""
+    return TRANSLATION_STORE.cleanup_expired()
+
+# -----------------------------
+# ספקי תרגום - לקוחות קבועים, מדדי בריאות ומפסק זרם
+# -----------------------------
+class CircuitBreaker:
+    """
+    מפסק זרם: אחרי failure_threshold כשלונות רצופים נפתח ל-reset_timeout שניות,
+    ואז מאפשר בקשת ניסיון אחת (half-open) - הצלחה סוגרת, כשל פותח מחדש.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        """האם בקשה עשויה לעבור (בלי לתפוס את בקשת הניסיון)"""
+        with self._lock:
+            if self.state == self.OPEN:
+                return time.time() - self.opened_at >= self.reset_timeout
+            return not (self.state == self.HALF_OPEN and self._probing)
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.time() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self) -> bool:
+        """רישום כשל; מחזיר True אם המפסק נפתח עכשיו"""
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                opened = self.state != self.OPEN
+                self.state = self.OPEN
+                self.opened_at = time.time()
+                self._probing = False
+                return opened
+            return False
+
+class TokenBucket:
+    """
+    מגביל קצב (דלי אסימונים) משותף לכל החוטים בתהליך: rate בקשות לשנייה עם פרץ של burst.
+    כל בקשה שומרת אסימון תחת נעילה ומחכה לתורה - כך הממתינים משתחררים לפי סדר הגעה (FIFO)
+    ולא מסתערים יחד. rate=0 מבטל את ההגבלה. זמני ההמתנה נאספים למדדים.
+    """
+    def __init__(self, rate: float, burst: int):
+        self.rate = max(0.0, rate)
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.requests = 0
+        self.waited = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._recent_waits: "deque[float]" = deque(maxlen=500)
+        self._lock = threading.Lock()
+
+    def _refill_locked(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def expected_wait(self) -> float:
+        """כמה תחכה בקשה שתגיע עכשיו (לצורך ניתוב בין ספקים)"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            self._refill_locked()
+            return max(0.0, (1 - self.tokens) / self.rate)
+
+    def acquire(self) -> float:
+        """לקיחת אסימון, בהמתנה אם צריך; מחזיר את זמן ההמתנה בשניות"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            self._refill_locked()
+            self.tokens -= 1  # שמירת מקום בתור - יתרה שלילית היא תור ההמתנה
+            delay = max(0.0, -self.tokens / self.rate)
+            self.requests += 1
+            if delay > 0:
+                self.waited += 1
+                self.total_wait += delay
+                self.max_wait = max(self.max_wait, delay)
+            self._recent_waits.append(delay)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refill_locked()
+            recent = sorted(self._recent_waits)
+            p95 = recent[int(len(recent) * 0.95)] if recent else 0.0
+            return {
+                "rate": self.rate,
+                "burst": self.burst,
+                "requests": self.requests,
+                "waited": self.waited,
+                "avg_wait_sec": round(self.total_wait / self.requests, 3) if self.requests else 0.0,
+                "p95_wait_sec": round(p95, 3),
+                "max_wait_sec": round(self.max_wait, 3),
+                "queued": max(0, int(-self.tokens)),
+            }
+
+class TranslationProvider:
+    """
+    בסיס לספק תרגום: לקוח אחד לאורך חיי התהליך, השהיה ושיעור שגיאות ממוצעים (EWMA)
+    ומפסק זרם. מחלקות יורשות מממשות _create_client ו-_translate.
+    """
+    name = "base"
+    DEFAULT_LATENCY = 1.0  # הערכה לספק שעוד לא נמדד
+    ERROR_HALF_LIFE = 60.0  # עונש השגיאות דועך כדי שספק שהתאושש יחזור לקבל תנועה
+
+    def __init__(self, breaker: CircuitBreaker, limiter: Optional[TokenBucket] = None, alpha: float = 0.2):
+        self.breaker = breaker
+        self.limiter = limiter
+        self.alpha = alpha
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.last_error_at = 0.0
+        self._client = None
+        self._lock = threading.Lock()
+
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                self._client = self._create_client()
+            return self._client
+
+    def _create_client(self):
+        raise NotImplementedError
+
+    def _translate(self, text: str, dest_lang: str) -> str:
+        raise NotImplementedError
+
+    def supports(self, dest_lang: str) -> bool:
+        return True
+
+    def score(self) -> float:
+        """נמוך = בריא יותר: השהיה ממוצעת, מוכפלת בעונש על שגיאות"""
+        decay = 0.5 ** ((time.time() - self.last_error_at) / self.ERROR_HALF_LIFE)
+        queue_wait = self.limiter.expected_wait() if self.limiter else 0.0
+        return (self.latency or self.DEFAULT_LATENCY) * (1 + 5 * self.error_rate * decay) + queue_wait
+
+    def translate(self, text: str, dest_lang: str) -> str:
+        if not self.breaker.allow():
+            raise RuntimeError(f"{self.name} circuit breaker is open")
+        if self.limiter:
+            self.limiter.acquire()
+        started = time.time()
+        try:
+            result = self._translate(text, dest_lang)
+            if not result:
+                raise RuntimeError("empty translation result")
+        except Exception:
+            self._record(time.time() - started, ok=False)
+            raise
+        self._record(time.time() - started, ok=True)
+        return result
+
+    def _record(self, elapsed: float, ok: bool) -> None:
+        with self._lock:
+            self.requests += 1
+            self.errors += not ok
+            if not ok:
+                self.last_error_at = time.time()
+            self.error_rate = (1 - self.alpha) * self.error_rate + self.alpha * (0.0 if ok else 1.0)
+            if ok:
+                self.latency = elapsed if self.latency is None else (1 - self.alpha) * self.latency + self.alpha * elapsed
+        if ok:
+            self.breaker.record_success()
+        elif self.breaker.record_failure():
+            LOG.warning(f"⚡ ספק התרגום {self.name} הושבת זמנית ל-{self.breaker.reset_timeout:.0f} שניות")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "latency_sec": round(self.latency, 3) if self.latency is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "requests": self.requests,
+            "errors": self.errors,
+            "breaker": self.breaker.state,
+            "rate_limit": self.limiter.stats() if self.limiter else None,
+        }
+
+class GoogleProvider(TranslationProvider):
+    """googletrans - Translator אחד (לקוח httpx עם מאגר חיבורים) לכל התהליך"""
+    name = "google"
+    SERVICE_URLS = ["translate.google.com", "translate.google.co.il"]
+
+    def __init__(self, breaker: CircuitBreaker, limiter: Optional[TokenBucket] = None, timeout: float = 10.0):
+        super().__init__(breaker, limiter)
+        self.timeout = timeout
+
+    def _create_client(self):
+        from googletrans import Translator
+        # raise_exception - חסימה (429) נספרת ככשל במקום תוצאה ריקה
+        return Translator(service_urls=self.SERVICE_URLS, timeout=self.timeout, raise_exception=True)
+
+    def _translate(self, text: str, dest_lang: str) -> str:
+        result = self.client().translate(text, dest=dest_lang)
+        return getattr(result, "text", None)
+
+class DeepLProvider(TranslationProvider):
+    """DeepL - deepl.Translator אחד לכל התהליך; רק לשפות יעד ש-DeepL תומך בהן"""
+    name = "deepl"
+    # קודי יעד ש-DeepL דורש בגרסה אזורית
+    TARGET_CODES = {"en": "EN-US", "pt": "PT-BR", "zh-cn": "ZH", "zh-tw": "ZH"}
+
+    def __init__(self, breaker: CircuitBreaker, api_key: str, limiter: Optional[TokenBucket] = None):
+        super().__init__(breaker, limiter)
+        self.api_key = api_key
+        self._targets: Optional[set] = None
+
+    def _create_client(self):
+        import deepl
+        return deepl.Translator(self.api_key)
+
+    def _target_code(self, dest_lang: str) -> str:
+        return self.TARGET_CODES.get(dest_lang.lower(), dest_lang.upper())
+
+    def supports(self, dest_lang: str) -> bool:
+        if self._targets is None:
+            try:
+                self._targets = {lang.code.upper() for lang in self.client().get_target_languages()}
+            except Exception:
+                return True  # לא ידוע - ננסה, וכשל ייספר במדדים
+        code = self._target_code(dest_lang)
+        return code in self._targets or code.split("-")[0] in self._targets
+
+    def _translate(self, text: str, dest_lang: str) -> str:
+        result = self.client().translate_text(text, target_lang=self._target_code(dest_lang))
+        return getattr(result, "text", None)
+
+class ProviderRegistry:
+    """
+    מאגר ספקי התרגום: מנתב כל בקשה לספק הבריא ביותר (מפסק סגור, ציון נמוך),
+    עובר לספק הבא בכשל, ואם hedge_after מוגדר - שולח בקשה מגדרת לספק שני
+    כשהראשון מתעכב, ומחזיר את הראשונה שהצליחה.
+    """
+    def __init__(self, providers: List[TranslationProvider], hedge_after: float = 0.0):
+        self.providers = providers
+        self.hedge_after = hedge_after
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def candidates(self, dest_lang: str) -> List[TranslationProvider]:
+        """ספקים זמינים לשפה, מהבריא ביותר; כל ספק במפסק פתוח מדולג"""
+        ranked = sorted(
+            (p for p in self.providers if p.breaker.available()),
+            key=lambda p: p.score()
+        )
+        return [p for p in ranked if p.supports(dest_lang)]
+
+    def primary(self, dest_lang: str) -> str:
+        candidates = self.candidates(dest_lang)
+        return candidates[0].name if candidates else self.providers[0].name
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="translate-hedge")
+            return self._executor
+
+    def _hedged(self, first: TranslationProvider, second: TranslationProvider,
+                text: str, dest_lang: str, tried: List[TranslationProvider]) -> Tuple[str, str]:
+        """
+        בקשה לראשון, ואם הוא מתעכב מעל hedge_after - גם לשני.
+        tried מקבל רק ספקים שבאמת נקראו: אם הראשון נכשל מהר, השני לא נשלח
+        ונשאר לניסיון הרגיל ב-translate.
+        """
+        pool = self._pool()
+        futures = {pool.submit(first.translate, text, dest_lang): first}
+        tried.append(first)
+        done, _ = wait_futures(futures, timeout=self.hedge_after)
+        if not done:
+            LOG.info(f"🏁 {first.name} מתעכב מעל {self.hedge_after} שניות - שולח גם ל-{second.name}")
+            futures[pool.submit(second.translate, text, dest_lang)] = second
+            tried.append(second)
+        last_error: Optional[Exception] = None
+        for future in as_completed(futures):
+            try:
+                return future.result(), futures[future].name
+            except Exception as e:
+                last_error = e
+        raise last_error or RuntimeError("hedged translation failed")
+
+    def translate(self, text: str, dest_lang: str) -> Tuple[str, str]:
+        """תרגום עם מעבר בין ספקים; מחזיר (תרגום, שם_ספק) או זורק אם כולם נכשלו"""
+        candidates = self.candidates(dest_lang)
+        if not candidates:
+            raise RuntimeError("no healthy translation provider")
+        last_error: Optional[Exception] = None
+        if self.hedge_after > 0 and len(candidates) >= 2:
+            tried: List[TranslationProvider] = []
+            try:
+                return self._hedged(candidates[0], candidates[1], text, dest_lang, tried)
+            except Exception as e:
+                last_error = e
+                LOG.warning(f"⚠️ ספקי התרגום {', '.join(p.name for p in tried)} נכשלו: {e}")
+                candidates = [p for p in candidates if p not in tried]
+        for provider in candidates:
+            try:
+                return provider.translate(text, dest_lang), provider.name
+            except Exception as e:
+                last_error = e
+                LOG.warning(f"⚠️ ספק התרגום {provider.name} נכשל: {e}")
+        raise last_error or RuntimeError("translation failed")
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {p.name: p.stats() for p in self.providers}
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+def _build_provider_registry() -> ProviderRegistry:
+    """
+    Google תמיד; DeepL כש-DEEPL_API_KEY מוגדר.
+    קצב לכל ספק: TRANSLATE_RATE_<ספק> (בקשות לשנייה, 0 = ללא הגבלה) ו-TRANSLATE_BURST_<ספק>.
+    """
+    def breaker() -> CircuitBreaker:
+        return CircuitBreaker(_env_int("TRANSLATE_BREAKER_FAILURES", 5), _env_int("TRANSLATE_BREAKER_RESET_SEC", 30))
+
+    def limiter(name: str, rate: float, burst: int) -> TokenBucket:
+        return TokenBucket(_env_float(f"TRANSLATE_RATE_{name}", rate), _env_int(f"TRANSLATE_BURST_{name}", burst))
+
+    providers: List[TranslationProvider] = [GoogleProvider(breaker(), limiter("GOOGLE", 5.0, 10))]
+    api_key = os.getenv("DEEPL_API_KEY")
+    if api_key:
+        providers.append(DeepLProvider(breaker(), api_key, limiter("DEEPL", 10.0, 20)))
+    hedge_after = _env_float("TRANSLATE_HEDGE_AFTER_SEC", 0.0)
+    return ProviderRegistry(providers, hedge_after=hedge_after)
+
+TRANSLATION_PROVIDERS = _build_provider_registry()
+
+# -----------------------------
+# אריזת שורות - הרבה שורות כתוביות בבקשת תרגום אחת
+# -----------------------------
+class SegmentPacker:
+    """
+    מחבר שורות עוקבות עם מפריד שורד-תרגום (שורה חדשה) עד תקציב תווים, ומפצל את התוצאה חזרה.
+    התקציב מסתגל לכל ספק (AIMD): גדל בהדרגה אחרי הצלחה ונחצה אחרי שגיאה או פיצול שלא תאם.
+    """
+    DELIMITER = "\n"
+
+    def __init__(self, max_chars: int, min_chars: int = 200, step: int = 200):
+        self.max_chars = max(min_chars, max_chars)
+        self.min_chars = min_chars
+        self.step = step
+        self._budgets: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def budget(self, provider: str) -> int:
+        with self._lock:
+            return self._budgets.get(provider, self.max_chars)
+
+    def record(self, provider: str, ok: bool) -> None:
+        """עדכון התקציב לפי תוצאת בקשה ארוזה"""
+        with self._lock:
+            current = self._budgets.get(provider, self.max_chars)
+            if ok:
+                self._budgets[provider] = min(self.max_chars, current + self.step)
+            else:
+                self._budgets[provider] = max(self.min_chars, current // 2)
+                LOG.info(f"📦 תקציב אריזה ל-{provider} ירד ל-{self._budgets[provider]} תווים")
+
+    def pack(self, texts: List[str], provider: str) -> List[List[int]]:
+        """חלוקת אינדקסים של שורות לחבילות עוקבות שלא עוברות את התקציב"""
+        budget = self.budget(provider)
+        packs, current, size = [], [], 0
+        for i, text in enumerate(texts):
+            cost = len(text) + len(self.DELIMITER)
+            if current and size + cost > budget:
+                packs.append(current)
+                current, size = [], 0
+            current.append(i)
+            size += cost
+        if current:
+            packs.append(current)
+        return packs
+
+    def join(self, texts: List[str]) -> str:
+        # שורה חדשה בתוך שורה הייתה נספרת כגבול מקטע
+        return self.DELIMITER.join(" ".join(text.splitlines()) for text in texts)
+
+    def split(self, translated: Optional[str], expected: int) -> Optional[List[str]]:
+        """פיצול תוצאה לשורות; None אם מספר השורות לא תואם"""
+        if not translated:
+            return None
+        parts = [part.strip() for part in translated.split(self.DELIMITER) if part.strip()]
+        return parts if len(parts) == expected else None
+
+# -----------------------------
+# מנוע תרגום - לקוח HTTP אחד משותף ובקשות מקביליות
+# -----------------------------
+class TranslationEngine:
+    """
+    מריץ עד concurrency בקשות תרגום במקביל במאגר חוטים קבוע, דרך מאגר הספקים
+    (לקוחות קבועים, ניתוב לספק הבריא ומעבר בין ספקים בכשל - בלי שינה בין ניסיונות).
+    translate_many מחזיר תוצאות באותו סדר; פריט שנכשל מחזיר None בלי להפיל את השאר.
+    """
+    def __init__(self, registry: ProviderRegistry, concurrency: int,
+                 packer: Optional[SegmentPacker] = None):
+        self.registry = registry
+        self.concurrency = max(1, concurrency)
+        self.packer = packer
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="translate")
+            return self._executor
+
+    def translate_one(self, text: str, dest_lang: str) -> str:
+        """תרגום טקסט בודד; זורק חריגה אם כל הספקים נכשלו"""
+        return self.registry.translate(text, dest_lang)[0]
+
+    def _translate_item(self, text: str, dest_lang: str) -> Tuple[Optional[str], Optional[str]]:
+        try:
+            return self.registry.translate(text, dest_lang)
+        except Exception as e:
+            LOG.warning(f"⚠️ לא ניתן לתרגם: {text[:50]}... ({e})")
+            return None, None
+
+    def _map(self, texts: List[str], dest_lang: str) -> List[Tuple[Optional[str], Optional[str]]]:
+        """(תרגום, ספק) לכל טקסט, בסדר הקלט"""
+        if len(texts) == 1:
+            return [self._translate_item(texts[0], dest_lang)]
+        futures = [self._pool().submit(self._translate_item, text, dest_lang) for text in texts]
+        return [f.result() for f in futures]
+
+    def translate_many(self, texts: List[str], dest_lang: str) -> List[Optional[str]]:
+        """תרגום רשימה במקביל; התוצאות בסדר הקלט, None לפריט שנכשל"""
+        if not texts:
+            return []
+        return [translated for translated, _ in self._map(texts, dest_lang)]
+
+    def translate_packed(self, texts: List[str], dest_lang: str) -> List[Optional[str]]:
+        """
+        כמו translate_many, אבל שורות עוקבות נשלחות יחד בבקשה אחת (SegmentPacker).
+        חבילה שנכשלה או שהפיצול שלה לא תאם מתורגמת שוב שורה-שורה.
+        """
+        if not self.packer or len(texts) < 2:
+            return self.translate_many(texts, dest_lang)
+
+        # גודל החבילות לפי הספק שצפוי לקבל אותן; העדכון לפי הספק שענה בפועל
+        primary = self.registry.primary(dest_lang)
+        packs = self.packer.pack(texts, primary)
+        joined = [self.packer.join([texts[i] for i in pack]) for pack in packs]
+        results: List[Optional[str]] = [None] * len(texts)
+        fallback: List[int] = []
+        for pack, (translated, provider) in zip(packs, self._map(joined, dest_lang)):
+            parts = self.packer.split(translated, len(pack)) if len(pack) > 1 else ([translated] if translated else None)
+            if len(pack) > 1:
+                self.packer.record(provider or primary, parts is not None)
+            if parts is None:
+                fallback.extend(pack)
+                continue
+            for i, part in zip(pack, parts):
+                results[i] = part
+
+        if fallback:
+            LOG.info(f"📦 {len(fallback)} שורות מתורגמות בנפרד (חבילה לא תאמה)")
+            for i, translated in zip(fallback, self.translate_many([texts[i] for i in fallback], dest_lang)):
+                results[i] = translated
+        LOG.info(f"📦 {len(texts)} שורות נשלחו ב-{len(packs) + len(fallback)} בקשות")
+        return results
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+TRANSLATION_ENGINE = TranslationEngine(
+    TRANSLATION_PROVIDERS,
+    _env_int("TRANSLATE_CONCURRENCY", 8),
+    packer=SegmentPacker(_env_int("TRANSLATE_PACK_CHARS", 1500))
+)
+
+@atexit.register
+def shutdown_translation_engine():
+    """סגירת מאגרי חוטי התרגום בעת יציאה"""
+    TRANSLATION_ENGINE.shutdown()
+    TRANSLATION_PROVIDERS.shutdown()
+    UI_CATALOGS.shutdown()
+
+def translate_segments(segments: List[Dict], dest_lang: str) -> List[Dict]:
+    """
+    תרגום מקטעי תעתוק (start/end/text) עם מטמון, דרך מנוע התרגום.
+    מקטע שהתרגום שלו נכשל נשאר בטקסט המקורי.
+    """
+    if not segments:
+        LOG.warning("No segments to translate")
+        return []
+
+    translated = parallel_translate_batch([seg["text"] for seg in segments], dest_lang)
+    out = []
+    for seg, text in zip(segments, translated):
+        if text and dest_lang.lower() == 'he':
+            text = bidi.get_display(text)
+        out.append({**seg, "text": text or seg["text"]})
     return out
 
 def srt_timestamp(t: float) -> str:
@@ -1069,11 +2749,27 @@ def write_srt(segments: List[Dict], srt_path: str) -> None:
     except Exception as e:
         raise RuntimeError(f"Failed to write SRT file: {e}")
 
+def _x264_profile(is_hd: bool, overrides: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """
+    הגדרות libx264 לפי רזולוציה: HD - איכות גבוהה יותר, אחרת דחיסה חזקה ומהירה.
+    overrides (למשל preset/crf ממדיניות ה-SLO) גוברים על ברירת המחדל.
+    """
+    if is_hd:
+        profile = {"crf": "23", "preset": "medium", "tune": "film", "maxrate": "2M"}
+    else:
+        profile = {"crf": "26", "preset": "faster", "tune": "fastdecode", "maxrate": "1M"}
+    profile.update(overrides or {})
+    return profile
+
+# סגנון ברירת מחדל לכתוביות כשלא סופק SubtitleConfig
+DEFAULT_ASS_STYLE = "FontSize=16,PrimaryColour=&H00FFFFFF,OutlineColour=&H00000000,BorderStyle=1,Outline=1,Shadow=1,Alignment=2"
+
 def burn_subs_from_srt(
     input_video: str,
     srt_path: str,
     output_video: str,
-    subtitle_config: Optional[SubtitleConfig] = None
+    subtitle_config: Optional[SubtitleConfig] = None,
+    encode_profile: Optional[Dict[str, str]] = None
 ) -> None:
     """
     צריבת כתוביות ישירות מקובץ SRT בצורה עמידה ל-Windows:
@@ -1081,6 +2777,7 @@ def burn_subs_from_srt(
     • מריץ ffmpeg מתוך התיקייה עם נתיבים יחסיים כדי למנוע פירוש שגוי של 'C:'.
     • אופטימיזציה משופרת לקידוד יעיל בגודל קובץ טוב יותר ואיכות גבוהה יותר.
     • תומך בהגדרות מתקדמות לסגנון כתוביות דרך אובייקט SubtitleConfig.
+    • encode_profile - דריסת preset/crf (מדיניות SLO).
     """
     # בדיקות קלט
     if not os.path.exists(input_video):
@@ -1110,22 +2807,12 @@ def burn_subs_from_srt(
         style = subtitle_config.get_ass_style()
     else:
         # הגדרות ברירת מחדל למקרה שלא סופק אובייקט הגדרות
-        style = "FontSize=16,PrimaryColour=&H00FFFFFF,OutlineColour=&H00000000,BorderStyle=1,Outline=1,Shadow=1,Alignment=2"
-    
+        style = DEFAULT_ASS_STYLE
+
     vf = f"subtitles=filename='{srt_name}':force_style='{style}'"
 
-    # פרמטרים מיטביים לקידוד יעיל
-    # אם הסרטון HD - נשתמש בהגדרות איכות טובות יותר
-    if is_hd:
-        crf = "23"  # איכות טובה יותר
-        preset = "medium"  # איזון בין מהירות לאיכות
-        tune = "film"  # אופטימיזציה לסרטונים
-        maxrate = "2M"  # מגבלת bitrate
-    else:
-        crf = "26"  # דחיסה חזקה יותר
-        preset = "faster"  # מהיר יותר
-        tune = "fastdecode"  # פענוח מהיר יותר
-        maxrate = "1M"  # מגבלת bitrate נמוכה יותר
+    # פרמטרים מיטביים לקידוד יעיל - HD מקבל הגדרות איכות טובות יותר
+    profile = _x264_profile(is_hd, encode_profile)
 
     cwd = os.getcwd()
     try:
@@ -1137,10 +2824,10 @@ def burn_subs_from_srt(
             "-i", v_name,            # קובץ כניסה
             "-vf", vf,               # פילטר לכתוביות
             "-c:v", "libx264",       # קידוד וידאו H.264
-            "-preset", preset,       # מהירות קידוד vs איכות
-            "-tune", tune,           # אופטימיזציה ספציפית
-            "-crf", crf,             # איכות קבועה
-            "-maxrate", maxrate,     # מגבלת bitrate
+            "-preset", profile["preset"],   # מהירות קידוד vs איכות
+            "-tune", profile["tune"],       # אופטימיזציה ספציפית
+            "-crf", profile["crf"],         # איכות קבועה
+            "-maxrate", profile["maxrate"], # מגבלת bitrate
             "-bufsize", "2M",        # גודל buffer
             "-profile:v", "main",    # פרופיל תואם
             "-level", "4.0",         # רמת תאימות
@@ -1209,17 +2896,72 @@ def burn_subs(
     if code != 0:
         raise RuntimeError(f"ffmpeg burn_subs failed: {err[-500:]}")
 
+# מיקום overlay - כולל המיקום החדש MC (מרכז). משותף ל-overlay_logo ול-burn_subs_and_logo
+LOGO_OVERLAY_XY = {
+    "TL": "10:10",
+    "TC": "(main_w-overlay_w)/2:10",
+    "TR": "main_w-overlay_w-10:10",
+    "ML": "10:(main_h-overlay_h)/2",
+    "MR": "main_w-overlay_w-10:(main_h-overlay_h)/2",
+    "BL": "10:main_h-overlay_h-10",
+    "BC": "(main_w-overlay_w)/2:main_h-overlay_h-10",
+    "BR": "main_w-overlay_w-10:main_h-overlay_h-10",
+    "MC": "(main_w-overlay_w)/2:(main_h-overlay_h)/2",  # מרכז הסרטון
+}
+
+def _prepare_logo_overlay(
+    logo_png: str,
+    video_w: Optional[int],
+    video_h: int,
+    opacity_percent: int,
+    scale_ratio: float
+) -> str:
+    """
+    מייצר עותק זמני של הלוגו בגודל יחסי לגובה הווידאו ועם השקיפות כבר מוחלת.
+    מחזיר נתיב ל-PNG זמני בתיקיית העבודה (באחריות הקורא למחוק).
+    """
+    from PIL import Image
+
+    target_h = max(16, int(video_h * float(scale_ratio)))
+
+    # מייצר לוגו מתאים לגובה הווידאו (שמירה על יחסי רוחב-גובה)
+    with Image.open(logo_png) as im:
+        ratio = target_h / float(im.height)
+        target_w = max(16, int(im.width * ratio))
+
+        # מיטוב: אם הלוגו גדול מדי, נקטין אותו למידות סבירות
+        if video_w and target_w > video_w * 0.5:
+            ratio = (video_w * 0.5) / float(im.width)
+            target_w = max(16, int(im.width * ratio))
+            target_h = max(16, int(im.height * ratio))
+
+        im = im.convert("RGBA").resize((target_w, target_h), Image.LANCZOS)
+
+        # אופטימיזציה של תמונת הלוגו - טיפול בשקיפות אם יש
+        if opacity_percent < 100:
+            # ניישם את השקיפות ישירות על תמונת הלוגו לפני ההטמעה
+            if im.mode == 'RGBA':
+                alpha = im.getchannel('A')
+                alpha = Image.eval(alpha, lambda a: int(a * opacity_percent / 100))
+                im.putalpha(alpha)
+
+        tmp_logo = str(APP_DIR / f"logo_resized_{uuid.uuid4().hex}.png")
+        im.save(tmp_logo, "PNG", optimize=True)
+    return tmp_logo
+
 def overlay_logo(
     input_video: str,
     logo_png: str,
     output_video: str,
     position: str = "TR",
     opacity_percent: int = 70,
-    scale_ratio: float = 0.2
+    scale_ratio: float = 0.2,
+    encode_profile: Optional[Dict[str, str]] = None
 ) -> None:
     """
     הטמעת לוגו עם שקיפות ומיקום. ה-logo יוקטן לגובה יחסי (ברירת מחדל 20%).
     מיטוב קידוד הווידאו עבור תוצאה איכותית ובגודל קובץ אופטימלי.
+    encode_profile - דריסת preset/crf (מדיניות SLO).
     """
     # בדיקות קלט
     if not os.path.exists(input_video):
@@ -1229,66 +2971,21 @@ def overlay_logo(
     if not os.path.exists(APP_DIR):
         raise RuntimeError(f"App directory not found: {APP_DIR}")
         
-    from PIL import Image
-
     # קובע גודל וידאו
     w, h = ffprobe_get_video_size(input_video)
     if not h:
         h = 720  # ברירת מחדל
-    
+
     # בדיקה אם HD ליצירת הגדרות קידוד אופטימליות
     is_hd = w is not None and w >= 1280
-    
-    target_h = max(16, int(h * float(scale_ratio)))
 
-    # מייצר לוגו מתאים לגובה הווידאו (שמירה על יחסי רוחב-גובה)
-    with Image.open(logo_png) as im:
-        ratio = target_h / float(im.height)
-        target_w = max(16, int(im.width * ratio))
-        
-        # מיטוב: אם הלוגו גדול מדי, נקטין אותו למידות סבירות
-        if target_w > w * 0.5:
-            ratio = (w * 0.5) / float(im.width)
-            target_w = max(16, int(im.width * ratio))
-            target_h = max(16, int(im.height * ratio))
-            
-        im = im.convert("RGBA").resize((target_w, target_h), Image.LANCZOS)
-        
-        # אופטימיזציה של תמונת הלוגו - טיפול בשקיפות אם יש
-        if opacity_percent < 100:
-            # ניישם את השקיפות ישירות על תמונת הלוגו לפני ההטמעה
-            if im.mode == 'RGBA':
-                alpha = im.getchannel('A')
-                alpha = Image.eval(alpha, lambda a: int(a * opacity_percent / 100))
-                im.putalpha(alpha)
-                
-        tmp_logo = str(APP_DIR / f"logo_resized_{uuid.uuid4().hex}.png")
-        im.save(tmp_logo, "PNG", optimize=True)
+    tmp_logo = _prepare_logo_overlay(logo_png, w, h, opacity_percent, scale_ratio)
 
-    # מיקום overlay - כולל המיקום החדש MC (מרכז)
-    positions = {
-        "TL": "10:10",
-        "TC": "(main_w-overlay_w)/2:10",
-        "TR": "main_w-overlay_w-10:10",
-        "ML": "10:(main_h-overlay_h)/2",
-        "MR": "main_w-overlay_w-10:(main_h-overlay_h)/2",
-        "BL": "10:main_h-overlay_h-10",
-        "BC": "(main_w-overlay_w)/2:main_h-overlay_h-10",
-        "BR": "main_w-overlay_w-10:main_h-overlay_h-10",
-        "MC": "(main_w-overlay_w)/2:(main_h-overlay_h)/2",  # מרכז הסרטון
-    }
-    xy = positions.get(position, "main_w-overlay_w-10:10")
+    xy = LOGO_OVERLAY_XY.get(position, LOGO_OVERLAY_XY["TR"])
     opacity = 1.0  # כבר טיפלנו בשקיפות בתמונה עצמה
 
     # הגדרות איכות לפי סוג הווידאו
-    if is_hd:
-        preset = "medium"  # איזון בין מהירות לאיכות
-        crf = "23"  # איכות טובה
-        maxrate = "2M"
-    else:
-        preset = "faster"
-        crf = "26"  # דחיסה חזקה יותר
-        maxrate = "1M"
+    profile = _x264_profile(is_hd, encode_profile)
 
     # פילטר מורכב להטמעת לוגו
     filter_complex = f"[1:v]format=rgba[logo];[0:v][logo]overlay={xy}"
@@ -1299,9 +2996,9 @@ def overlay_logo(
         "-i", input_video,         # קובץ וידאו מקור
         "-i", tmp_logo,            # תמונת לוגו
         "-filter_complex", filter_complex,  # פילטר הטמעה
-        "-preset", preset,         # הגדרת איזון מהירות/איכות
-        "-crf", crf,               # איכות קבועה
-        "-maxrate", maxrate,       # מגבלת bitrate
+        "-preset", profile["preset"],    # הגדרת איזון מהירות/איכות
+        "-crf", profile["crf"],          # איכות קבועה
+        "-maxrate", profile["maxrate"],  # מגבלת bitrate
         "-bufsize", "2M",          # גודל buffer
         "-profile:v", "main",      # פרופיל תואמות
         "-level", "4.0",           # רמת תאימות
@@ -1347,6 +3044,123 @@ def overlay_logo(
     if not os.path.exists(output_video) or os.path.getsize(output_video) < 10 * 1024:
         raise RuntimeError("Logo overlay failed - output file not created or too small")
 
+def burn_subs_and_logo(
+    input_video: str,
+    srt_path: str,
+    logo_png: str,
+    output_video: str,
+    subtitle_config: Optional[SubtitleConfig] = None,
+    position: str = "TR",
+    opacity_percent: int = 70,
+    scale_ratio: float = 0.2,
+    encode_profile: Optional[Dict[str, str]] = None
+) -> None:
+    """
+    צריבת כתוביות + הטמעת לוגו במעבר קידוד יחיד.
+    גרף פילטרים אחד: subtitles= ואחריו overlay= (אותה טבלת מיקומים של overlay_logo),
+    כך שהווידאו מפוענח ומקודד ב-libx264 פעם אחת בלבד במקום פעמיים.
+    כמו burn_subs_from_srt - רץ מתוך תיקיית העבודה עם שמות יחסיים (עמיד ל-Windows).
+    """
+    # בדיקות קלט
+    if not os.path.exists(input_video):
+        raise RuntimeError(f"Input video not found: {input_video}")
+    if not os.path.exists(srt_path):
+        raise RuntimeError(f"SRT file not found: {srt_path}")
+    if not os.path.exists(logo_png):
+        raise RuntimeError(f"Logo file not found: {logo_png}")
+    if not os.path.exists(APP_DIR):
+        raise RuntimeError(f"App directory not found: {APP_DIR}")
+
+    width, height = ffprobe_get_video_size(input_video)
+    is_hd = width is not None and width >= 1280
+
+    # קבצים זמניים עם שמות פשוטים
+    simple_id = uuid.uuid4().hex[:8]
+    work_dir = APP_DIR
+    v_name = f"in_{simple_id}.mp4"
+    srt_name = f"subs_{simple_id}.srt"
+    out_name = f"out_{simple_id}.mp4"
+
+    shutil.copyfile(input_video, str(work_dir / v_name))
+    shutil.copyfile(srt_path, str(work_dir / srt_name))
+    # הלוגו המוקטן נוצר ישירות בתיקיית העבודה - מספיק שם הקובץ
+    tmp_logo = _prepare_logo_overlay(logo_png, width, height or 720, opacity_percent, scale_ratio)
+    logo_name = Path(tmp_logo).name
+
+    style = subtitle_config.get_ass_style() if subtitle_config else DEFAULT_ASS_STYLE
+    xy = LOGO_OVERLAY_XY.get(position, LOGO_OVERLAY_XY["TR"])
+
+    # כתוביות קודם ואז לוגו - הלוגו נשאר מעל הכתוביות אם הם חופפים
+    filter_complex = (
+        f"[0:v]subtitles=filename='{srt_name}':force_style='{style}'[subs];"
+        f"[1:v]format=rgba[logo];"
+        f"[subs][logo]overlay={xy}[v]"
+    )
+
+    profile = _x264_profile(is_hd, encode_profile)
+
+    cwd = os.getcwd()
+    try:
+        os.chdir(str(work_dir))
+
+        args = [
+            "-y",
+            "-i", v_name,
+            "-i", logo_name,
+            "-filter_complex", filter_complex,
+            "-map", "[v]",             # פלט הגרף
+            "-map", "0:a?",            # אודיו מהמקור (אם קיים)
+            "-c:v", "libx264",
+            "-preset", profile["preset"],
+            "-tune", profile["tune"],
+            "-crf", profile["crf"],
+            "-maxrate", profile["maxrate"],
+            "-bufsize", "2M",
+            "-profile:v", "main",
+            "-level", "4.0",
+            "-pix_fmt", "yuv420p",
+            "-movflags", "+faststart",
+            "-c:a", "aac",
+            "-b:a", "128k",
+            "-ac", "2",
+            "-threads", str(min(4, max(2, multiprocessing.cpu_count() // 2))),
+            out_name
+        ]
+
+        code, _, err = ffmpeg_exec(args)
+
+        if code != 0:
+            LOG.warning("Combined subtitles+logo encoding failed, trying simpler parameters")
+            code2, _, err2 = ffmpeg_exec([
+                "-y", "-i", v_name, "-i", logo_name,
+                "-filter_complex", (
+                    f"[0:v]subtitles=filename='{srt_name}'[subs];"
+                    f"[subs][1:v]overlay={xy}[v]"
+                ),
+                "-map", "[v]", "-map", "0:a?",
+                "-preset", "veryfast",
+                "-c:v", "libx264",
+                "-c:a", "copy",
+                out_name
+            ])
+            if code2 != 0 or not (work_dir / out_name).exists():
+                raise RuntimeError(f"ffmpeg burn_subs_and_logo failed: {(err2 or err)[-500:]}")
+
+        if not os.path.exists(str(work_dir / out_name)):
+            raise RuntimeError("Output file was not created")
+
+        out_size = os.path.getsize(str(work_dir / out_name))
+        if out_size < 10 * 1024:  # פחות מ-10KB
+            raise RuntimeError("Output file is too small, encoding probably failed")
+
+        shutil.copyfile(str(work_dir / out_name), output_video)
+    finally:
+        os.chdir(cwd)
+        cleanup_paths([
+            str(work_dir / v_name), str(work_dir / srt_name),
+            str(work_dir / out_name), tmp_logo
+        ])
+
 # מנהל קבצים זמניים עם שיפור ניהול זיכרון
 class TempFileManager:
     """
@@ -1477,10 +3291,671 @@ def cleanup_paths(paths: List[str]):
     """
     return TEMP_MANAGER.cleanup_files(paths)
 
+# -----------------------------
+# מטמון תוצרי ביניים (לפי תוכן הקלט)
+# -----------------------------
+class ArtifactCache:
+    """
+    תוצרי ביניים של עבודות תרגום לפי מזהה תוכן הקלט + הפרמטרים של כל שלב:
+    wav (חילוץ אודיו), stt (מקטעי Whisper + שפה שזוהתה), tr (מקטעים מתורגמים).
+    שליחה חוזרת של אותו סרטון עם שפה או עיצוב אחרים מדלגת על השלבים שלא תלויים בהם.
+    קבצים בתיקייה אחת, תקציב בבתים ופינוי LRU לפי זמן השימוש האחרון (mtime).
+    """
+    def __init__(self, base_dir: Path, max_bytes: int):
+        self.base_dir = Path(base_dir)
+        self.max_bytes = max_bytes
+        self._index: Optional["OrderedDict[str, int]"] = None  # שם קובץ -> גודל, מהישן לחדש
+        self._total = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def key(kind: str, **parts) -> str:
+        """מפתח תוצר: סוג השלב + כל מה שמשפיע על התוצר שלו"""
+        digest = hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+        return f"{kind}-{digest[:40]}"
+
+    def _load_index(self) -> "OrderedDict[str, int]":
+        """סריקת התיקייה בשימוש הראשון (לא בייבוא - תהליכי עזר מייבאים את הקובץ מחדש); נקרא תחת self._lock"""
+        if self._index is None:
+            self.base_dir.mkdir(parents=True, exist_ok=True)
+            entries = []
+            for p in self.base_dir.iterdir():
+                if p.is_file() and not p.name.startswith("."):
+                    stat = p.stat()
+                    entries.append((stat.st_mtime, p.name, stat.st_size))
+            entries.sort()
+            self._index = OrderedDict((name, size) for _, name, size in entries)
+            self._total = sum(self._index.values())
+        return self._index
+
+    def _lookup(self, name: str) -> Optional[Path]:
+        if not self.enabled:
+            return None
+        path = self.base_dir / name
+        with self._lock:
+            index = self._load_index()
+            if name not in index or not path.exists():
+                if name in index:
+                    self._total -= index.pop(name)
+                self.misses += 1
+                return None
+            index.move_to_end(name)
+            self.hits += 1
+        try:
+            os.utime(path)  # ה-LRU שורד הפעלה מחדש
+        except OSError:
+            pass
+        return path
+
+    def _commit(self, tmp: Path, name: str) -> None:
+        """העברה אטומית של קובץ זמני למקומו, עדכון האינדקס ופינוי מעבר לתקציב"""
+        path = self.base_dir / name
+        size = tmp.stat().st_size
+        if size > self.max_bytes:
+            tmp.unlink()
+            return
+        os.replace(tmp, path)
+        with self._lock:
+            index = self._load_index()
+            self._total += size - index.pop(name, 0)
+            index[name] = size
+            evicted = 0
+            while self._total > self.max_bytes and index:
+                old, old_size = index.popitem(last=False)
+                self._total -= old_size
+                try:
+                    (self.base_dir / old).unlink()
+                except FileNotFoundError:
+                    pass
+                evicted += 1
+        if evicted:
+            LOG.info(f"🧹 מטמון תוצרי ביניים: פונו {evicted} קבצים (תקציב {self.max_bytes // MB}MB)")
+
+    def _tmp_path(self, name: str) -> Path:
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        return self.base_dir / f".{name}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+
+    def get_json(self, key: str) -> Optional[Any]:
+        path = self._lookup(key + ".json")
+        if path is None:
+            return None
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            LOG.warning(f"⚠️ תוצר ביניים פגום {path.name}: {e}")
+            return None
+
+    def put_json(self, key: str, value: Any) -> None:
+        if not self.enabled:
+            return
+        tmp = self._tmp_path(key + ".json")
+        tmp.write_text(json.dumps(value, ensure_ascii=False), encoding="utf-8")
+        self._commit(tmp, key + ".json")
+
+    def fetch_file(self, key: str, suffix: str, dest: str) -> bool:
+        """
+        העתקת תוצר-קובץ ל-dest (קישור קשיח אם אפשר). לעבודה יש עותק משלה,
+        כך שפינוי מהמטמון באמצע העבודה לא מוחק לה את הקובץ.
+        """
+        path = self._lookup(key + suffix)
+        if path is None:
+            return False
+        try:
+            _link_or_copy(path, dest)
+            return True
+        except OSError as e:
+            LOG.warning(f"⚠️ קריאת תוצר ביניים {path.name} נכשלה: {e}")
+            return False
+
+    def put_file(self, key: str, suffix: str, src: str) -> None:
+        if not self.enabled:
+            return
+        tmp = self._tmp_path(key + suffix)
+        _link_or_copy(src, str(tmp))
+        self._commit(tmp, key + suffix)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries = len(self._index) if self._index is not None else 0
+            return {"entries": entries, "mb": self._total // MB, "hits": self.hits, "misses": self.misses}
+
+def _link_or_copy(src, dest) -> None:
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
+
+ARTIFACT_CACHE = ArtifactCache(
+    Path(os.getenv("ARTIFACT_CACHE_DIR") or APP_DIR / "artifacts"),
+    _env_int("ARTIFACT_CACHE_MAX_MB", 2048) * MB
+)
+
+# -----------------------------
+# איחוד קריאות זהות שרצות במקביל (single-flight)
+# -----------------------------
+class _Flight:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+class SingleFlight:
+    """
+    קריאה ראשונה למפתח מבצעת את העבודה; קריאות נוספות לאותו מפתח בזמן שהיא רצה
+    ממתינות ומקבלות את אותה תוצאה (או את אותה שגיאה). אין כאן מטמון - כשהקריאה
+    מסתיימת המפתח משתחרר, ומה ששורד אחר כך הוא באחריות ARTIFACT_CACHE.
+    הממתינים הם תמיד אחרי מבצע שכבר רץ, כך שאין המתנה לעבודה שעוד בתור.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._flights: Dict[Any, _Flight] = {}
+        self.coalesced = 0
+
+    def do(self, key: Any, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                flight.waiters += 1
+                self.coalesced += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            if flight.waiters:
+                LOG.info(f"🔗 {self.name}: {flight.waiters} בקשות זהות קיבלו את אותה תוצאה")
+            flight.done.set()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"in_flight": len(self._flights), "coalesced": self.coalesced}
+
+# שלב לכל מאגר - מפתחות התוצרים הם אותם מפתחות של ARTIFACT_CACHE
+STAGE_FLIGHTS = {name: SingleFlight(name) for name in ("extract", "stt", "translate")}
+
+# -----------------------------
+# צינור עיבוד מדורג (download → extract → stt → translate → encode → upload)
+# -----------------------------
+class PipelineJob:
+    """
+    עבודה אחת שעוברת בין שלבי הצינור.
+    steps - רשימת (שם_שלב, פונקציה) לפי הסדר. כל פונקציה מקבלת את העבודה
+    ושומרת את התוצרים שלה ב-job.ctx עבור השלבים הבאים.
+    """
+    def __init__(
+        self,
+        name: str,
+        steps: List[Tuple[str, Callable[["PipelineJob"], None]]],
+        ctx: Optional[Dict] = None,
+        on_error: Optional[Callable[["PipelineJob", Exception], None]] = None,
+        on_finally: Optional[Callable[["PipelineJob"], None]] = None
+    ):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.steps = list(steps)
+        self.ctx: Dict[str, Any] = ctx if ctx is not None else {}
+        self.on_error = on_error
+        self.on_finally = on_finally
+        self.step_index = 0
+        self.created_at = time.time()
+        self.enqueued_at = self.created_at
+        self.timings: Dict[str, float] = {}  # משך ריצת כל שלב (שניות)
+        self.waits: Dict[str, float] = {}    # זמן המתנה בתור של כל שלב (שניות)
+        self.error: Optional[Exception] = None
+        self.skipped: List[str] = []         # שלבים שדולגו (התוצרים שלהם הגיעו ממטמון)
+        self._skip_to: Optional[int] = None
+
+    @property
+    def current_stage(self) -> Optional[str]:
+        if self.step_index < len(self.steps):
+            return self.steps[self.step_index][0]
+        return None
+
+    def skip_to(self, stage_name: str) -> None:
+        """
+        נקרא מתוך שלב שכבר מילא ב-ctx את התוצרים של השלבים שאחריו:
+        בסיום השלב הנוכחי העבודה עוברת ישר ל-stage_name.
+        """
+        names = [name for name, _ in self.steps]
+        if stage_name not in names[self.step_index + 1:]:
+            raise ValueError(f"Cannot skip to {stage_name} from {self.current_stage}")
+        self._skip_to = names.index(stage_name, self.step_index + 1)
+
+    def advance(self) -> None:
+        """מעבר לשלב הבא (או לשלב שנקבע ב-skip_to)"""
+        target = self.step_index + 1
+        if self._skip_to is not None:
+            target, self._skip_to = self._skip_to, None
+            self.skipped.extend(name for name, _ in self.steps[self.step_index + 1:target])
+        self.step_index = target
+
+class PipelineStage:
+    """
+    שלב בצינור: תור חסום משלו + מאגר חוטים ייעודי.
+    תור מלא חוסם את השלב הקודם (backpressure) במקום לצבור עבודה ללא גבול.
+    """
+    def __init__(self, name: str, workers: int, max_queue: int, runner: Callable[["PipelineStage", PipelineJob], None]):
+        self.name = name
+        self.workers = max(1, workers)
+        self.queue: "queue.Queue[Optional[PipelineJob]]" = queue.Queue(maxsize=max(1, max_queue))
+        self._runner = runner
+        self._lock = threading.Lock()
+        self.busy = 0
+        self.processed = 0
+        self._threads = []
+
+    def start(self) -> None:
+        for i in range(self.workers):
+            th = threading.Thread(target=self._loop, name=f"stage-{self.name}-{i}", daemon=True)
+            th.start()
+            self._threads.append(th)
+
+    def put(self, job: PipelineJob) -> None:
+        job.enqueued_at = time.time()
+        self.queue.put(job)
+
+    def _loop(self) -> None:
+        while True:
+            job = self.queue.get()
+            if job is None:
+                self.queue.task_done()
+                return
+            with self._lock:
+                self.busy += 1
+            try:
+                self._runner(self, job)
+            except Exception:
+                LOG.exception(f"Unexpected error in pipeline stage {self.name}")
+            finally:
+                with self._lock:
+                    self.busy -= 1
+                    self.processed += 1
+                self.queue.task_done()
+
+    def stop(self) -> None:
+        for _ in self._threads:
+            try:
+                self.queue.put_nowait(None)
+            except queue.Full:
+                break
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "busy": self.busy,
+                "queued": self.queue.qsize(),
+                "processed": self.processed,
+            }
+
+class StagedPipeline:
+    """
+    צינור עיבוד מדורג. שלבים חסומי-CPU (ffmpeg, Whisper) ושלבי רשת
+    (תרגום, העלאה לטלגרם) מקבלים כל אחד מאגר ותור משלו, ועבודות עוברות
+    ביניהם - כך שהמתנה לרשת של עבודה אחת חופפת לעבודת CPU של אחרות.
+    """
+    CPU_STAGES = ("extract", "stt", "encode")
+    NET_STAGES = ("download", "translate", "upload")
+
+    def __init__(self, stage_workers: Dict[str, int], max_queue: int):
+        self.stages: Dict[str, PipelineStage] = {
+            name: PipelineStage(name, workers, max_queue, self._run_step)
+            for name, workers in stage_workers.items()
+        }
+
+    def start(self) -> None:
+        """הפעלת חוטי השלבים (מ-main בלבד - לא בתהליכי עזר)"""
+        for stage in self.stages.values():
+            stage.start()
+        LOG.info("🏭 צינור עיבוד: " + ", ".join(f"{n}={s.workers}" for n, s in self.stages.items()))
+
+    def submit(self, job: PipelineJob) -> None:
+        """הכנסת עבודה לשלב הראשון שלה"""
+        self._dispatch(job)
+
+    def _dispatch(self, job: PipelineJob) -> None:
+        stage_name = job.current_stage
+        if stage_name is None:
+            self._finish(job)
+            return
+        stage = self.stages.get(stage_name)
+        if stage is None:
+            self._fail(job, RuntimeError(f"Unknown pipeline stage: {stage_name}"))
+            return
+        stage.put(job)
+
+    def _run_step(self, stage: PipelineStage, job: PipelineJob) -> None:
+        stage_name, fn = job.steps[job.step_index]
+        job.waits[stage_name] = time.time() - job.enqueued_at
+        t0 = time.time()
+        try:
+            fn(job)
+        except Exception as e:
+            job.timings[stage_name] = time.time() - t0
+            LOG.error(f"❌ עבודה {job.name}/{job.id} נכשלה בשלב {stage_name}: {e}")
+            self._fail(job, e)
+            return
+        job.timings[stage_name] = time.time() - t0
+        job.advance()
+
+        # אם גם השלב הבא שייך לאותו מאגר - ממשיכים כאן, כדי לא להיחסם על התור של עצמנו
+        if job.current_stage == stage_name:
+            job.enqueued_at = time.time()
+            self._run_step(stage, job)
+            return
+        self._dispatch(job)
+
+    def abort(self, job: PipelineJob, exc: Exception) -> None:
+        """עבודה שלא נכנסה לצינור: on_error ו-on_finally כמו בכשל של שלב"""
+        LOG.error(f"❌ עבודה {job.name}/{job.id} לא נכנסה לצינור: {exc}")
+        self._fail(job, exc)
+
+    def _fail(self, job: PipelineJob, exc: Exception) -> None:
+        job.error = exc
+        try:
+            if job.on_error:
+                job.on_error(job, exc)
+        except Exception as e:
+            LOG.error(f"Error in on_error of job {job.id}: {e}")
+        self._finalize(job)
+
+    def _finish(self, job: PipelineJob) -> None:
+        total = time.time() - job.created_at
+        steps = ", ".join(
+            f"{name}=skip" if name in job.skipped else
+            f"{name}={job.timings.get(name, 0):.1f}s(+{job.waits.get(name, 0):.1f}s)"
+            for name, _ in job.steps
+        )
+        LOG.info(f"✅ עבודה {job.name}/{job.id} הושלמה ב-{total:.1f}s [{steps}]")
+        self._finalize(job)
+
+    def _finalize(self, job: PipelineJob) -> None:
+        try:
+            if job.on_finally:
+                job.on_finally(job)
+        except Exception as e:
+            LOG.error(f"Error in on_finally of job {job.id}: {e}")
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {name: stage.stats() for name, stage in self.stages.items()}
+
+    def shutdown(self) -> None:
+        for stage in self.stages.values():
+            stage.stop()
+
+# ברירות מחדל: שלבי CPU חולקים את הליבות, שלבי רשת רחבים יותר.
+# שלב התעתוק רחב כמספר תהליכי התעתוק - כל חוט ממתין לתהליך אחד.
+PIPELINE = StagedPipeline(
+    {
+        "download": _env_int("PIPELINE_DOWNLOAD_WORKERS", 4),
+        "extract": _env_int("PIPELINE_EXTRACT_WORKERS", max(1, MAX_WORKERS // 2)),
+        "stt": _env_int("PIPELINE_STT_WORKERS", max(1, STT_POOL.workers)),
+        "translate": _env_int("PIPELINE_TRANSLATE_WORKERS", MAX_WORKERS * 2),
+        "encode": _env_int("PIPELINE_ENCODE_WORKERS", max(1, MAX_WORKERS // 2)),
+        "upload": _env_int("PIPELINE_UPLOAD_WORKERS", 4),
+    },
+    max_queue=_env_int("PIPELINE_QUEUE_SIZE", MAX_WORKERS * 4)
+)
+
+@atexit.register
+def shutdown_pipeline():
+    """עצירת חוטי הצינור בעת יציאה"""
+    try:
+        PIPELINE.shutdown()
+    except Exception as e:
+        LOG.error(f"שגיאה בעצירת צינור העיבוד: {e}")
+
+# -----------------------------
+# תור עבודות עמיד עם בקרת קבלה
+# -----------------------------
+class JobQueue:
+    """
+    תור עבודות עמיד (SQLite) עם עדיפויות, מגבלת עומק גלובלית ומכסה הוגנת לכל משתמש.
+    הקבלה לתור נעשית לפני הורדת הקובץ - במצב עומס דוחים מיד ולא מבזבזים רוחב פס ודיסק.
+    עבודה נכנסת לצינור רק אחרי שצורף לה runner (כלומר אחרי שהקובץ ירד),
+    ורק כשיש מקום פנוי (max_running). סדר השליפה: עדיפות, ואז המשתמש עם הכי
+    מעט עבודות רצות, ואז סבב בין משתמשים, ואז סדר הגעה.
+    """
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CANCELLED = "cancelled"
+    STATUS_INTERRUPTED = "interrupted"
+
+    REJECT_SYSTEM_BUSY = "system_busy"
+    REJECT_USER_LIMIT = "user_limit"
+
+    # סדר השליפה המשותף לבחירת העבודה הבאה ולחישוב מיקום בתור:
+    # עדיפות, מספר עבודות רצות של המשתמש, מתי המשתמש קיבל שירות לאחרונה (סבב), סדר הגעה
+    _ORDER_SQL = (
+        "SELECT id FROM jobs AS j WHERE status = 'queued' ORDER BY priority, "
+        "(SELECT COUNT(*) FROM jobs AS r WHERE r.uid = j.uid AND r.status = 'running'), "
+        "COALESCE((SELECT MAX(started_at) FROM jobs AS r WHERE r.uid = j.uid), 0), id"
+    )
+
+    def __init__(self, db_path: Path, max_depth: int, per_user_limit: int, max_running: int):
+        self.db_path = db_path
+        self.max_depth = max(1, max_depth)
+        self.per_user_limit = max(1, per_user_limit)
+        self.max_running = max(1, max_running)
+        self._cond = threading.Condition()
+        self._runners: Dict[int, Callable[[], None]] = {}
+        self._on_fail: Dict[int, Callable[[Exception], None]] = {}
+        self._active: Dict[Tuple[int, str], int] = {}  # (uid, kind) -> עבודות בתור/בריצה
+        self._running = 0
+        self._conn = None
+        self.interrupted: List[Dict] = []
+
+    def start(self) -> None:
+        """
+        פתיחת מסד הנתונים, שחזור מצב מהפעלה קודמת והפעלת חוט השליפה.
+        נקרא מ-main בלבד - תהליכי עזר שמייבאים את המודול מחדש לא נוגעים בתור.
+        """
+        import sqlite3
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " uid INTEGER NOT NULL,"
+            " chat_id INTEGER,"
+            " kind TEXT NOT NULL,"
+            " priority INTEGER NOT NULL DEFAULT 1,"
+            " status TEXT NOT NULL,"
+            " payload TEXT,"
+            " created_at REAL NOT NULL,"
+            " started_at REAL,"
+            " finished_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, priority, id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_uid ON jobs(uid, status)")
+        self.interrupted = self._recover()
+
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="job-queue-dispatcher", daemon=True)
+        self._dispatcher.start()
+
+    def _recover(self) -> List[Dict]:
+        """
+        עבודות שנשארו בתור/בריצה מתהליך קודם לא ניתנות להמשך (הקבצים וההקשר אבדו).
+        מסמנים אותן כ-interrupted ומחזירים אותן כדי שנוכל להודיע למשתמשים.
+        """
+        rows = self._conn.execute(
+            "SELECT id, uid, chat_id, kind, payload FROM jobs WHERE status IN ('queued', 'running')"
+        ).fetchall()
+        now = time.time()
+        self._conn.execute(
+            "UPDATE jobs SET status = ?, finished_at = ? WHERE status IN ('queued', 'running')",
+            (self.STATUS_INTERRUPTED, now)
+        )
+        # ניקוי היסטוריה ישנה (שבוע)
+        self._conn.execute("DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (now - 7 * 24 * 3600,))
+        if rows:
+            LOG.warning(f"⚠️ {len(rows)} עבודות נקטעו בהפעלה הקודמת")
+        return [
+            {"id": r[0], "uid": r[1], "chat_id": r[2], "kind": r[3], "payload": json.loads(r[4] or "{}")}
+            for r in rows
+        ]
+
+    def admit(self, uid: int, chat_id: int, kind: str, priority: int = 1,
+              payload: Optional[Dict] = None) -> Tuple[Optional[int], int, str]:
+        """
+        בקשת קבלה לתור. מחזיר (מזהה עבודה, מיקום בהמתנה, סיבת דחייה).
+        מיקום 0 = תתחיל מיד. מזהה None = נדחתה (הסיבה בשדה השלישי).
+        """
+        with self._cond:
+            depth = self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')"
+            ).fetchone()[0]
+            if depth >= self.max_depth:
+                LOG.warning(f"🚦 תור מלא ({depth}/{self.max_depth}) - דוחה עבודה של {uid}")
+                return None, 0, self.REJECT_SYSTEM_BUSY
+            user_active = self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE uid = ? AND status IN ('queued', 'running')", (uid,)
+            ).fetchone()[0]
+            if user_active >= self.per_user_limit:
+                return None, 0, self.REJECT_USER_LIMIT
+
+            cur = self._conn.execute(
+                "INSERT INTO jobs (uid, chat_id, kind, priority, status, payload, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (uid, chat_id, kind, priority, self.STATUS_QUEUED, json.dumps(payload or {}, ensure_ascii=False), time.time())
+            )
+            job_id = cur.lastrowid
+            self._active[(uid, kind)] = self._active.get((uid, kind), 0) + 1
+            position = self._position_locked(job_id)
+        LOG.info(f"📥 עבודה {job_id} ({kind}) של {uid} התקבלה לתור, מיקום {position}")
+        return job_id, position, ""
+
+    def attach(self, job_id: int, runner: Callable[[], None],
+               on_fail: Optional[Callable[[Exception], None]] = None) -> None:
+        """
+        צירוף הפעולה שמריצה את העבודה - מעכשיו ניתן לשלוף אותה.
+        on_fail - ניקוי העבודה אם ה-runner נכשל (אחרת רק מסמנים אותה כנכשלה).
+        """
+        with self._cond:
+            self._runners[job_id] = runner
+            if on_fail:
+                self._on_fail[job_id] = on_fail
+            self._cond.notify_all()
+
+    def cancel(self, job_id: int) -> None:
+        """ביטול עבודה שעוד לא רצה (למשל כשל בהורדה)"""
+        self._close(job_id, self.STATUS_CANCELLED)
+
+    def finish(self, job_id: int, ok: bool = True) -> None:
+        """סימון סיום עבודה ושחרור מקום בתור"""
+        self._close(job_id, self.STATUS_DONE if ok else self.STATUS_FAILED)
+
+    def _close(self, job_id: int, status: str) -> None:
+        with self._cond:
+            row = self._conn.execute("SELECT uid, kind, status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if not row or row[2] not in (self.STATUS_QUEUED, self.STATUS_RUNNING):
+                return
+            uid, kind, prev = row
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ?", (status, time.time(), job_id)
+            )
+            self._runners.pop(job_id, None)
+            self._on_fail.pop(job_id, None)
+            self._active[(uid, kind)] = max(0, self._active.get((uid, kind), 0) - 1)
+            if prev == self.STATUS_RUNNING:
+                self._running = max(0, self._running - 1)
+            self._cond.notify_all()
+
+    def _position_locked(self, job_id: int) -> int:
+        ids = [r[0] for r in self._conn.execute(self._ORDER_SQL).fetchall()]
+        if job_id not in ids:
+            return 0
+        ahead = ids.index(job_id)
+        free = self.max_running - self._running
+        return max(0, ahead + 1 - free)
+
+    def position(self, job_id: int) -> int:
+        with self._cond:
+            return self._position_locked(job_id)
+
+    def active_count(self, uid: int, kind: Optional[str] = None) -> int:
+        """מספר העבודות של המשתמש בתור או בריצה (מהזיכרון - זול לקריאה מתפריטים)"""
+        with self._cond:
+            if kind:
+                return self._active.get((uid, kind), 0)
+            return sum(n for (u, _), n in self._active.items() if u == uid)
+
+    def depth(self) -> int:
+        with self._cond:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')"
+            ).fetchone()[0]
+
+    def _dispatch_loop(self) -> None:
+        while True:
+            with self._cond:
+                job_id = None
+                while job_id is None:
+                    if self._running < self.max_running and self._runners:
+                        for (candidate,) in self._conn.execute(self._ORDER_SQL).fetchall():
+                            if candidate in self._runners:
+                                job_id = candidate
+                                break
+                    if job_id is None:
+                        self._cond.wait()
+                runner = self._runners.pop(job_id)
+                on_fail = self._on_fail.pop(job_id, None)
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, started_at = ? WHERE id = ?",
+                    (self.STATUS_RUNNING, time.time(), job_id)
+                )
+                self._running += 1
+            # ה-runner רק מכניס לצינור; עלול להיחסם על תור מלא - לכן מחוץ לנעילה
+            try:
+                runner()
+            except Exception as e:
+                LOG.error(f"❌ כשל בהפעלת עבודה {job_id}: {e}")
+                if on_fail:
+                    try:
+                        on_fail(e)
+                    except Exception as fail_error:
+                        LOG.error(f"Error in on_fail of queued job {job_id}: {fail_error}")
+                self.finish(job_id, ok=False)
+
+# עדיפות נמוכה = נשלפת קודם. הטמעת לוגו היא קידוד יחיד וקצר.
+JOB_PRIORITIES = {"logo": 0, "translate": 1}
+
+JOB_QUEUE = JobQueue(
+    APP_DIR / "jobs.db",
+    max_depth=_env_int("JOB_QUEUE_MAX_DEPTH", MAX_WORKERS * 8),
+    per_user_limit=_env_int("JOB_QUEUE_PER_USER", 2),
+    max_running=_env_int("JOB_QUEUE_MAX_RUNNING", MAX_WORKERS * 2)
+)
+
 # -----------------------------
 # Telegram Bot (python-telegram-bot==13.7)
 # -----------------------------
-if not ensure_dependencies():
+# תהליכי עזר (spawn) מייבאים את הקובץ מחדש - ההתקנות רצות רק בתהליך הראשי
+if multiprocessing.parent_process() is None and not ensure_dependencies():
     raise SystemExit(1)
 
 from telegram import (
@@ -1489,11 +3964,10 @@ from telegram import (
 from telegram.ext import (
     Updater, CommandHandler, MessageHandler, Filters, CallbackContext, CallbackQueryHandler
 )
-from telegram.error import Unauthorized, BadRequest
+from telegram.error import Unauthorized, BadRequest, RetryAfter, TimedOut, NetworkError
 
 # ------------- מצבים ונתוני משתמש -------------
 USER_STATE: Dict[int, Dict] = {}
-ACTIVE_JOBS: Dict[int, int] = {}  # מספר עבודות במקביל לכל משתמש (מוגבל ל-2)
 
 def get_user_state(uid: int) -> Dict:
     st = USER_STATE.get(uid)
@@ -1522,6 +3996,7 @@ def get_user_state(uid: int) -> Dict:
             "logo_opacity": 70,
             "logo_size_percent": 20,
             "expecting_video_for_logo": False,
+            "subs_with_logo": False,        # צריבת הלוגו יחד עם הכתוביות בקידוד אחד
             
             # הגדרות מתקדמות נוספות
             "advanced_subtitle_mode": False,  # האם במצב הגדרות מתקדמות לכתוביות
@@ -1540,7 +4015,7 @@ def is_process_active(uid: int) -> bool:
     return (st.get("expecting_video_for_subs") or 
             st.get("expecting_logo_image") or 
             st.get("expecting_video_for_logo") or
-            ACTIVE_JOBS.get(uid, 0) > 0)
+            JOB_QUEUE.active_count(uid) > 0)
 
 def is_logo_process_active(uid: int) -> bool:
     """
@@ -1555,25 +4030,14 @@ def is_translation_process_active(uid: int) -> bool:
     בדיקה אם יש תהליך תרגום פעיל
     """
     st = get_user_state(uid)
-    return st.get("expecting_video_for_subs") or ACTIVE_JOBS.get(uid, 0) > 0
-
-def inc_jobs(uid: int) -> bool:
-    n = ACTIVE_JOBS.get(uid, 0)
-    if n >= 2:
-        return False
-    ACTIVE_JOBS[uid] = n + 1
-    return True
-
-def dec_jobs(uid: int):
-    n = ACTIVE_JOBS.get(uid, 0)
-    ACTIVE_JOBS[uid] = max(0, n - 1)
+    return st.get("expecting_video_for_subs") or JOB_QUEUE.active_count(uid, "translate") > 0
 
 # ------------- UI -------------
 
 def safe_edit(query, text: str, reply_markup=None):
     """
     מבצע edit_message_text בבטחה: בולע רק את 'Message is not modified'.
-    לא קורא ל-query.answer כאן (נעשה בתחילת cb_handler).
+    לא קורא ל-query.answer כאן - הנתב עונה לכל קולבק פעם אחת בדיוק.
     """
     try:
         query.edit_message_text(text, reply_markup=reply_markup)
@@ -1583,406 +4047,588 @@ def safe_edit(query, text: str, reply_markup=None):
         else:
             raise
 
-    # עונה לקולבק כדי למנוע 'spinner' אינסופי
-    try:
-        query.answer(cache_time=0)
-    except Exception:
-        pass
+# -----------------------------
+# מדידת זמני טיפול ב-handlers
+# -----------------------------
+class LatencyStats:
+    """זמני טיפול לפי שם (handler או נתיב קולבק): קריאות, שגיאות, ממוצע נע ומקסימום"""
+
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self._items: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, ms: float, ok: bool = True) -> None:
+        with self._lock:
+            item = self._items.get(name)
+            if item is None:
+                item = self._items[name] = {"calls": 0, "errors": 0, "avg_ms": ms, "max_ms": 0.0}
+            item["calls"] += 1
+            item["errors"] += int(not ok)
+            item["avg_ms"] += self.alpha * (ms - item["avg_ms"])
+            item["max_ms"] = max(item["max_ms"], ms)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {name: {"calls": int(i["calls"]), "errors": int(i["errors"]),
+                           "avg_ms": round(i["avg_ms"], 1), "max_ms": round(i["max_ms"], 1)}
+                    for name, i in self._items.items()}
+
+HANDLER_LATENCY = LatencyStats()
+HANDLER_SLOW_MS = _env_int("HANDLER_SLOW_MS", 500)
+
+def timed_handler(fn: Callable) -> Callable:
+    """עוטף handler של טלגרם: רושם זמן טיפול ומתריע על handler איטי"""
+    @functools.wraps(fn)
+    def wrapper(update: Update, context: CallbackContext):
+        started = time.monotonic()
+        ok = False
+        try:
+            result = fn(update, context)
+            ok = True
+            return result
+        finally:
+            ms = (time.monotonic() - started) * 1000.0
+            HANDLER_LATENCY.record(fn.__name__, ms, ok)
+            if ms > HANDLER_SLOW_MS:
+                LOG.warning(f"🐢 handler {fn.__name__} לקח {ms:.0f}ms")
+    return wrapper
 
+# -----------------------------
+# נתב קולבקים וקידוד callback_data
+# -----------------------------
+CALLBACK_DATA_LIMIT = 64  # מגבלת Telegram על callback_data (בבתים)
+
+class CallbackRoute:
+    """נתיב קולבק אחד: שם מלא, קוד קצר, טיפוסי הארגומנטים והפונקציה שמטפלת בו."""
+    __slots__ = ("name", "code", "arg_types", "handler")
 
+    def __init__(self, name: str, code: str, arg_types: Tuple[type, ...], handler: Callable):
+        self.name = name
+        self.code = code
+        self.arg_types = arg_types
+        self.handler = handler
+
+class CallbackRouter:
     """
-    מגן על edit_message_text מפני השגיאה 'Message is not modified' ע"י בליעה שקטה.
+    ניתוב קולבקים לפי טבלה במקום שרשרת if/elif.
+    callback_data מקודד כ-"<קוד>:<ארג>:<ארג>" עם קוד קצר לכל נתיב
+    (למשל "L:he:0" במקום "set_lang:he:0"); הארגומנטים מומרים לפי
+    הטיפוסים שהנתיב הצהיר עליהם. גם השמות המלאים הישנים מתקבלים, כדי
+    שמקלדות שכבר נשלחו בצ'אטים ימשיכו לעבוד. הנתב עונה לכל query פעם
+    אחת בדיוק ורושם זמן טיפול לכל נתיב.
     """
-    try:
-        safe_edit(query, text, reply_markup=reply_markup)
-    except BadRequest as e:
-        if "Message is not modified" in str(e):
+
+    SEP = ":"
+
+    def __init__(self):
+        self._routes: Dict[str, CallbackRoute] = {}  # קוד קצר ושם מלא -> נתיב
+        self._by_name: Dict[str, CallbackRoute] = {}
+        self._lock = threading.Lock()
+        self.latency = LatencyStats()
+        self.unknown = 0
+
+    def route(self, name: str, code: str, *arg_types: type) -> Callable:
+        """דקורטור לרישום handler(query, uid, st, *args) תחת שם וקוד קצר."""
+        def register(handler: Callable) -> Callable:
+            for key in (name, code):
+                if key in self._routes:
+                    raise ValueError(f"callback route '{key}' already registered")
+            r = CallbackRoute(name, code, arg_types, handler)
+            self._routes[name] = self._routes[code] = self._by_name[name] = r
+            return handler
+        return register
+
+    def encode(self, name: str, *args) -> str:
+        r = self._by_name[name]
+        if len(args) != len(r.arg_types):
+            raise ValueError(f"callback '{name}' expects {len(r.arg_types)} args, got {len(args)}")
+        parts = [r.code]
+        for arg, typ in zip(args, r.arg_types):
+            value = str(typ(arg))
+            if self.SEP in value:
+                raise ValueError(f"callback '{name}' arg contains '{self.SEP}': {value!r}")
+            parts.append(value)
+        data = self.SEP.join(parts)
+        if len(data.encode("utf-8")) > CALLBACK_DATA_LIMIT:
+            raise ValueError(f"callback_data over {CALLBACK_DATA_LIMIT} bytes: {data!r}")
+        return data
+
+    def decode(self, data: str) -> Optional[Tuple[CallbackRoute, list]]:
+        parts = (data or "").split(self.SEP)
+        r = self._routes.get(parts[0])
+        if r is None or len(parts) - 1 != len(r.arg_types):
+            return None
+        try:
+            return r, [typ(v) for typ, v in zip(r.arg_types, parts[1:])]
+        except ValueError:
+            return None
+
+    def dispatch(self, update: Update, context: CallbackContext) -> None:
+        query = update.callback_query
+        # עונים מיד ופעם אחת בלבד - סוגר את ה-spinner עוד לפני העבודה עצמה
+        try:
+            query.answer(cache_time=0)
+        except Exception:
+            pass
+
+        decoded = self.decode(query.data)
+        if decoded is None:
+            with self._lock:
+                self.unknown += 1
+            LOG.warning(f"⚠️ callback לא מוכר: {query.data!r}")
+            return
+        r, args = decoded
+        uid = query.from_user.id
+        st = get_user_state(uid)
+        LOG.debug(f"Callback {r.name} {args}")
+
+        started = time.monotonic()
+        failed = False
+        try:
+            r.handler(query, uid, st, *args)
+        except Unauthorized:
+            failed = True
             try:
-                # לא לשנות את ההודעה שוב – רק לענות בשקט כדי לסגור את ה-Spinner.
-                query.answer("אין שינוי", show_alert=False, cache_time=0)
+                safe_edit(query, "❌ שגיאת הרשאות בבוט (Unauthorized). בדקו את ה-Token.")
             except Exception:
                 pass
-        else:
-            raise
+        except Exception as e:
+            failed = True
+            LOG.exception(f"Callback error ({r.name})")
+            try:
+                safe_edit(query, f"ארעה שגיאה: {e}")
+            except Exception:
+                try:
+                    query.message.reply_text(f"ארעה שגיאה: {e}")
+                except Exception:
+                    pass
+        finally:
+            self.latency.record(r.name, (time.monotonic() - started) * 1000.0, not failed)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return self.latency.stats()
+
+CALLBACKS = CallbackRouter()
+
+def cb(name: str, *args) -> str:
+    """callback_data מקודד לנתיב - לשימוש בבניית מקלדות"""
+    return CALLBACKS.encode(name, *args)
+
+class KeyboardCache:
+    """
+    מטמון מקלדות inline מוכנות, לפי (תפריט, שפת ממשק, עמוד, מצב רלוונטי).
+    המקלדות זהות לכל המשתמשים עם אותו מפתח, ולכן נבנות פעם אחת ונשמרות
+    כטאפלים (לא ניתנות לשינוי) - בניית תפריט הופכת לחיפוש במילון.
+    כל שינוי בקטלוגי הממשק (UI_CATALOGS.version) מרוקן את המטמון.
+    """
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max(1, max_entries)
+        self._items: "OrderedDict[tuple, InlineKeyboardMarkup]" = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple, build: Callable[[], List[List[InlineKeyboardButton]]]) -> InlineKeyboardMarkup:
+        version = UI_CATALOGS.version
+        with self._lock:
+            if version != self._version:
+                self._items.clear()
+                self._version = version
+            markup = self._items.get(key)
+            if markup is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return markup
+            self.misses += 1
+        markup = InlineKeyboardMarkup(tuple(tuple(row) for row in build()))
+        with self._lock:
+            if self._version == version:
+                self._items[key] = markup
+                while len(self._items) > self.max_entries:
+                    self._items.popitem(last=False)
+        return markup
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._items), "hits": self.hits, "misses": self.misses}
+
+KEYBOARDS = KeyboardCache(_env_int("KEYBOARD_CACHE_SIZE", 512))
+
+def _grid(buttons: List[InlineKeyboardButton], per_row: int) -> List[List[InlineKeyboardButton]]:
+    return [buttons[i:i + per_row] for i in range(0, len(buttons), per_row)]
 
 def main_menu_kb(uid: int, state: Dict) -> InlineKeyboardMarkup:
-    kb = [
-        [InlineKeyboardButton(t(uid, "btn_ui_lang"), callback_data="choose_ui_lang")],
-        [InlineKeyboardButton(t(uid, "btn_target_lang"), callback_data="choose_lang")],
-        [InlineKeyboardButton(t(uid, "btn_font_size"), callback_data="choose_fontsize")],
-        [InlineKeyboardButton(t(uid, "btn_font_color"), callback_data="choose_fontcolor")],
-        
-        # הגדרות כתוביות מתקדמות
-        [InlineKeyboardButton("🔠 הגדרות כתוביות מתקדמות", callback_data="advanced_subtitle_settings")],
-        
-        [InlineKeyboardButton(t(uid, "btn_upload_video"), callback_data="upload_video")],
-        [InlineKeyboardButton(t(uid, "btn_logo"), callback_data="logo_start")],
-        [InlineKeyboardButton(t(uid, "btn_help"), callback_data="help")]
-    ]
-    return InlineKeyboardMarkup(kb)
+    with_logo = bool(state.get("subs_with_logo"))
+    def build():
+        return [
+            [InlineKeyboardButton(t(uid, "btn_ui_lang"), callback_data=cb("choose_ui_lang"))],
+            [InlineKeyboardButton(t(uid, "btn_target_lang"), callback_data=cb("choose_lang"))],
+            [InlineKeyboardButton(t(uid, "btn_font_size"), callback_data=cb("choose_fontsize"))],
+            [InlineKeyboardButton(t(uid, "btn_font_color"), callback_data=cb("choose_fontcolor"))],
+
+            # הגדרות כתוביות מתקדמות
+            [InlineKeyboardButton("🔠 הגדרות כתוביות מתקדמות", callback_data=cb("advanced_subtitle_settings"))],
+
+            [InlineKeyboardButton(t(uid, "btn_upload_video"), callback_data=cb("upload_video"))],
+            [InlineKeyboardButton(t(uid, "btn_logo"), callback_data=cb("logo_start"))],
+            [InlineKeyboardButton(
+                t(uid, "btn_subs_logo_on" if with_logo else "btn_subs_logo_off"),
+                callback_data=cb("toggle_subs_logo")
+            )],
+            [InlineKeyboardButton(t(uid, "btn_help"), callback_data=cb("help"))]
+        ]
+    return KEYBOARDS.get(("main", get_ui_lang(uid), with_logo), build)
 
 def lang_menu(uid: int, page: int = 0, per_page: int = 8) -> InlineKeyboardMarkup:
-    start = page * per_page
-    chunk = LANG_CHOICES[start:start+per_page]
-    rows = []
-    for name, code in chunk:
-        rows.append([InlineKeyboardButton(f"{name} ({code})", callback_data=f"set_lang:{code}:{page}")])
-    nav = []
-    if start > 0:
-        nav.append(InlineKeyboardButton("◀️", callback_data=f"lang_page:{page-1}"))
-    if start + per_page < len(LANG_CHOICES):
-        nav.append(InlineKeyboardButton("▶️", callback_data=f"lang_page:{page+1}"))
-    if nav:
-        rows.append(nav)
-    rows.append([InlineKeyboardButton(t(uid, "btn_back_main"), callback_data="back_main")])
-    return InlineKeyboardMarkup(rows)
+    def build():
+        start = page * per_page
+        chunk = LANG_CHOICES[start:start+per_page]
+        rows = []
+        for name, code in chunk:
+            rows.append([InlineKeyboardButton(f"{name} ({code})", callback_data=cb("set_lang", code, page))])
+        nav = []
+        if start > 0:
+            nav.append(InlineKeyboardButton("◀️", callback_data=cb("lang_page", page-1)))
+        if start + per_page < len(LANG_CHOICES):
+            nav.append(InlineKeyboardButton("▶️", callback_data=cb("lang_page", page+1)))
+        if nav:
+            rows.append(nav)
+        rows.append([InlineKeyboardButton(t(uid, "btn_back_main"), callback_data=cb("back_main"))])
+        return rows
+    return KEYBOARDS.get(("lang", get_ui_lang(uid), page, per_page), build)
+
+def _choice_menu(uid: int, route: str, buttons: List[Tuple[str, Any]], per_row: int) -> InlineKeyboardMarkup:
+    # תפריט בחירה סטטי: רשת כפתורים (תווית, ערך לנתיב) + חזרה לתפריט הראשי
+    def build():
+        rows = _grid([InlineKeyboardButton(label, callback_data=cb(route, value)) for label, value in buttons], per_row)
+        rows.append([InlineKeyboardButton(t(uid, "btn_back_main"), callback_data=cb("back_main"))])
+        return rows
+    return KEYBOARDS.get((route, get_ui_lang(uid)), build)
 
 def fontsize_menu(uid: int) -> InlineKeyboardMarkup:
-    rows = []
-    row = []
-    for i, sz in enumerate(FONT_SIZES, 1):
-        row.append(InlineKeyboardButton(str(sz), callback_data=f"set_size:{sz}"))
-        if i % 4 == 0:
-            rows.append(row); row = []
-    if row: rows.append(row)
-    rows.append([InlineKeyboardButton(t(uid, "btn_back_main"), callback_data="back_main")])
-    return InlineKeyboardMarkup(rows)
+    return _choice_menu(uid, "set_size", [(str(sz), sz) for sz in FONT_SIZES], 4)
 
 def fontcolor_menu(uid: int) -> InlineKeyboardMarkup:
-    rows = []
-    row = []
-    for i, (label, color) in enumerate(COLOR_CHOICES, 1):
-        row.append(InlineKeyboardButton(label, callback_data=f"set_color:{color}"))
-        if i % 4 == 0:
-            rows.append(row); row = []
-    if row: rows.append(row)
-    rows.append([InlineKeyboardButton(t(uid, "btn_back_main"), callback_data="back_main")])
-    return InlineKeyboardMarkup(rows)
+    return _choice_menu(uid, "set_color", COLOR_CHOICES, 4)
 
 def logo_pos_menu(uid: int) -> InlineKeyboardMarkup:
-    rows = []
-    row = []
-    for i, (label, pos_code) in enumerate(LOGO_POSITIONS, 1):
-        row.append(InlineKeyboardButton(label, callback_data=f"logo_setpos:{pos_code}"))
-        if i % 2 == 0:
-            rows.append(row); row = []
-    if row: rows.append(row)
-    rows.append([InlineKeyboardButton(t(uid, "btn_back_main"), callback_data="back_main")])
-    return InlineKeyboardMarkup(rows)
+    return _choice_menu(uid, "logo_setpos", LOGO_POSITIONS, 2)
 
 def logo_size_menu(uid: int) -> InlineKeyboardMarkup:
-    rows = []
-    row = []
-    for i, size in enumerate(LOGO_SIZE_CHOICES, 1):
-        row.append(InlineKeyboardButton(f"{size}%", callback_data=f"logo_setsize:{size}"))
-        if i % 4 == 0:  # 4 כפתורים בשורה
-            rows.append(row); row = []
-    if row: rows.append(row)
-    rows.append([InlineKeyboardButton(t(uid, "btn_back_main"), callback_data="back_main")])
-    return InlineKeyboardMarkup(rows)
+    return _choice_menu(uid, "logo_setsize", [(f"{size}%", size) for size in LOGO_SIZE_CHOICES], 4)
 
 def logo_opacity_menu(uid: int) -> InlineKeyboardMarkup:
-    rows = []
-    row = []
-    for i, p in enumerate(OPACITY_CHOICES, 1):
-        row.append(InlineKeyboardButton(f"{p}%", callback_data=f"logo_setopacity:{p}"))
-        if i % 4 == 0:  # 4 כפתורים בשורה במקום 3
-            rows.append(row); row = []
-    if row: rows.append(row)
-    rows.append([InlineKeyboardButton(t(uid, "btn_back_main"), callback_data="back_main")])
-    return InlineKeyboardMarkup(rows)
+    return _choice_menu(uid, "logo_setopacity", [(f"{p}%", p) for p in OPACITY_CHOICES], 4)
 
 def ui_lang_menu(uid: int) -> InlineKeyboardMarkup:
-    # מציג רק אנגלית ועברית כשפות ממשק זמינות
-    rows = []
-    ui_lang_choices = [("🇺🇸 English", "en"), ("🇮🇱 עברית", "he")]
-    for name, code in ui_lang_choices:
-        rows.append([InlineKeyboardButton(name, callback_data=f"set_ui_lang:{code}")])
-    rows.append([InlineKeyboardButton(t(uid, "btn_back_main"), callback_data="back_main")])
-    return InlineKeyboardMarkup(rows)
+    # אנגלית ועברית מובנות; שפות נוספות מוצגות רק כשיש להן קטלוג מתורגם מראש
+    def build():
+        rows = []
+        ui_lang_choices = [("🇺🇸 English", "en"), ("🇮🇱 עברית", "he")]
+        names = dict((code, name) for name, code in LANG_CHOICES)
+        for code in sorted(UI_CATALOGS.languages()):
+            if code not in ("en", "he"):
+                ui_lang_choices.append((names.get(code, code), code))
+        for name, code in ui_lang_choices:
+            rows.append([InlineKeyboardButton(name, callback_data=cb("set_ui_lang", code))])
+        rows.append([InlineKeyboardButton(t(uid, "btn_back_main"), callback_data=cb("back_main"))])
+        return rows
+    return KEYBOARDS.get(("ui_lang", get_ui_lang(uid)), build)
+
+def back_main_kb(uid: int) -> InlineKeyboardMarkup:
+    return KEYBOARDS.get(("back_main", get_ui_lang(uid)), lambda: [
+        [InlineKeyboardButton("⬅️ חזרה לתפריט הראשי", callback_data=cb("back_main"))]
+    ])
+
+# תפריטי הגדרות כתוביות מתקדמות (טקסט קבוע - נבנים פעם אחת)
+def advanced_subtitle_menu(uid: int) -> InlineKeyboardMarkup:
+    return KEYBOARDS.get(("advanced", get_ui_lang(uid)), lambda: [
+        [InlineKeyboardButton(t(uid, "btn_subtitle_position"), callback_data=cb("choose_subtitle_position"))],
+        [InlineKeyboardButton(t(uid, "btn_font_type"), callback_data=cb("choose_font_type"))],
+        [InlineKeyboardButton(t(uid, "btn_subtitle_outline"), callback_data=cb("choose_outline_size"))],
+        [InlineKeyboardButton(t(uid, "btn_subtitle_shadow"), callback_data=cb("choose_shadow_size"))],
+        [InlineKeyboardButton(t(uid, "btn_subtitle_style"), callback_data=cb("choose_text_style"))],
+        [InlineKeyboardButton(t(uid, "btn_background_color"), callback_data=cb("choose_background_color"))],
+        [InlineKeyboardButton(t(uid, "btn_back_main"), callback_data=cb("back_main"))]
+    ])
+
+def _advanced_back_row(uid: int) -> List[InlineKeyboardButton]:
+    return [InlineKeyboardButton(t(uid, "btn_subtitle_back"), callback_data=cb("advanced_subtitle_settings"))]
+
+def advanced_back_kb(uid: int) -> InlineKeyboardMarkup:
+    return KEYBOARDS.get(("advanced_back", get_ui_lang(uid)), lambda: [_advanced_back_row(uid)])
+
+def subtitle_position_menu(uid: int) -> InlineKeyboardMarkup:
+    positions = ("bottom", "top", "bottom-left", "bottom-right", "top-left", "top-right", "middle")
+    def build():
+        rows = [[InlineKeyboardButton(t(uid, "btn_subtitle_pos_" + pos.replace("-", "_")),
+                                      callback_data=cb("set_position", pos))] for pos in positions]
+        rows.append(_advanced_back_row(uid))
+        return rows
+    return KEYBOARDS.get(("subtitle_position", get_ui_lang(uid)), build)
+
+def font_type_menu(uid: int) -> InlineKeyboardMarkup:
+    def build():
+        rows = _grid([InlineKeyboardButton(font_name, callback_data=cb("set_font", font_key))
+                      for font_key, font_name in SUBTITLE_FONTS.items()], 2)
+        rows.append(_advanced_back_row(uid))
+        return rows
+    return KEYBOARDS.get(("font_type", get_ui_lang(uid)), build)
+
+def text_style_menu(uid: int) -> InlineKeyboardMarkup:
+    def build():
+        rows = [[InlineKeyboardButton(t(uid, f"btn_subtitle_style_{style}"), callback_data=cb("set_style", style))]
+                for style in ("normal", "bold", "italic", "bold_italic")]
+        rows.append(_advanced_back_row(uid))
+        return rows
+    return KEYBOARDS.get(("text_style", get_ui_lang(uid)), build)
+
+def background_color_menu(uid: int) -> InlineKeyboardMarkup:
+    def build():
+        rows = _grid([InlineKeyboardButton(label, callback_data=cb("set_bg_color", color))
+                      for label, color in COLOR_CHOICES], 3)
+        rows.append(_advanced_back_row(uid))
+        return rows
+    return KEYBOARDS.get(("background_color", get_ui_lang(uid)), build)
+
+def outline_menu(uid: int) -> InlineKeyboardMarkup:
+    def build():
+        rows = _grid([InlineKeyboardButton(t(uid, f"btn_subtitle_outline_{size}"), callback_data=cb("set_outline", size))
+                      for size in range(4)], 2)
+        rows.append(_advanced_back_row(uid))
+        return rows
+    return KEYBOARDS.get(("outline", get_ui_lang(uid)), build)
+
+def shadow_menu(uid: int) -> InlineKeyboardMarkup:
+    def build():
+        rows = _grid([InlineKeyboardButton(t(uid, f"btn_subtitle_shadow_{size}"), callback_data=cb("set_shadow", size))
+                      for size in range(4)], 2)
+        rows.append(_advanced_back_row(uid))
+        return rows
+    return KEYBOARDS.get(("shadow", get_ui_lang(uid)), build)
 
 # ------------- Handlers -------------
+@timed_handler
 def start(update: Update, context: CallbackContext):
     uid = update.effective_user.id
     st = get_user_state(uid)
     msg = t(uid, "start_message")
     update.message.reply_text(msg, reply_markup=main_menu_kb(uid, st))
 
+@timed_handler
 def help_cmd(update: Update, context: CallbackContext):
     uid = update.effective_user.id
     st = get_user_state(uid)
     update.message.reply_text(t(uid, "help_message"), reply_markup=main_menu_kb(uid, st))
 
-def cb_handler(update: Update, context: CallbackContext):
-    query = update.callback_query
-    uid = query.from_user.id
-    st = get_user_state(uid)
-    data = query.data or ""
-    LOG.info(f"Callback data: {data}")
-    # עונים פעם אחת בתחילת הטיפול כדי לסגור spinner
-    try:
-        query.answer(cache_time=0)
-    except Exception:
-        pass
-    except Exception:
-        pass
-
-    try:
-        if data == "choose_ui_lang":
-            LOG.info("Action: choose_ui_lang")
-            safe_edit(query, t(uid, "prompt_choose_ui_lang"), reply_markup=ui_lang_menu(uid))
-        elif data.startswith("set_ui_lang:"):
-            LOG.info("Action: set_ui_lang")
-            _, code = data.split(":")
-            if code in UI_STRINGS:
-                st["ui_lang"] = code
-            lang_name = next((name for name, lang_code in LANG_CHOICES if lang_code == st["ui_lang"]), st["ui_lang"])            
-            safe_edit(query, t(uid, "ui_lang_set_to", lang_name=lang_name), reply_markup=main_menu_kb(uid, st))
-        elif data == "choose_lang":
-            LOG.info("Action: choose_lang")
-            safe_edit(query, t(uid, "prompt_choose_target_lang"), reply_markup=lang_menu(uid, page=0))
-        elif data.startswith("lang_page:"):
-            LOG.info("Action: lang_page")
-            page = int(data.split(":")[1])
-            safe_edit(query, t(uid, "prompt_choose_target_lang"), reply_markup=lang_menu(uid, page=page))
-        elif data.startswith("set_lang:"):
-            LOG.info("Action: set_lang")
-            _, code, page = data.split(":")
-            st["target_lang"] = code
-            LOG.info(f"🎯 שפה נקבעה ל-{code}")
-            # מצא את שם השפה עם הדגל
-            lang_name = next((name for name, lang_code in LANG_CHOICES if lang_code == code), code)
-            safe_edit(query, t(uid, "target_lang_set_to", lang_name=lang_name), reply_markup=main_menu_kb(uid, st))
-        elif data == "choose_fontsize":
-            LOG.info("Action: choose_fontsize")
-            safe_edit(query, t(uid, "prompt_choose_font_size"), reply_markup=fontsize_menu(uid))
-        elif data.startswith("set_size:"):
-            LOG.info("Action: set_size")
-            size = int(data.split(":")[1])
-            if size in FONT_SIZES:
-                st["font_size"] = size
-            safe_edit(query, t(uid, "font_size_set", size=st['font_size']), reply_markup=main_menu_kb(uid, st))
-        elif data == "choose_fontcolor":
-            LOG.info("Action: choose_fontcolor")
-            safe_edit(query, t(uid, "prompt_choose_font_color"), reply_markup=fontcolor_menu(uid))
-        elif data.startswith("set_color:"):
-            LOG.info("Action: set_color")
-            color = data.split(":")[1]
-            if color in ASS_COLORS:
-                st["font_color"] = color
-            # מצא את שם הצבע עם האימוג'י
-            color_name = next((label for label, color_code in COLOR_CHOICES if color_code == color), color)
-            safe_edit(query, t(uid, "font_color_set", color_name=color_name), reply_markup=main_menu_kb(uid, st))
-        elif data == "upload_video":
-            LOG.info("Action: upload_video")
-            # בדיקה אם יש תהליך הטמעת לוגו פעיל
-            if is_logo_process_active(uid):
-                safe_edit(query, t(uid, "error_logo_process_in_progress"), reply_markup=main_menu_kb(uid, st))
-                return
-            st["expecting_video_for_subs"] = True
-            safe_edit(query, t(uid, "upload_video_prompt",
-                settings_title=t(uid, "settings_current_title"),
-                lang_label=t(uid, "settings_language"),
-                size_label=t(uid, "settings_font_size"),
-                color_label=t(uid, "settings_color"),
-                lang=next((name for name, code in LANG_CHOICES if code == st.get("target_lang", "en")), st.get("target_lang", "en")),
-                size=st.get("font_size", 16),
-                color=next((label for label, color in COLOR_CHOICES if color == st.get("font_color", "white")), st.get("font_color", "white"))
-            ), reply_markup=main_menu_kb(uid, st))
-        elif data == "logo_start":
-            LOG.info("Action: logo_start")
-            # בדיקה אם יש תהליך תרגום פעיל
-            if is_translation_process_active(uid):
-                safe_edit(query, t(uid, "error_translation_process_in_progress"), reply_markup=main_menu_kb(uid, st))
-                return
-            st["expecting_logo_image"] = True
-            st["logo_path"] = None
-            st["expecting_video_for_logo"] = False
-            # לא מחזירים לתפריט הראשי - מחכים להעלאת התמונה
-            safe_edit(query, t(uid, "prompt_logo_start"), reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("⬅️ חזרה לתפריט הראשי", callback_data="back_main")
-            ]]))
-        elif data == "advanced_subtitle_settings":
-            LOG.info("Action: advanced_subtitle_settings")
-            # מציג את תפריט הגדרות הכתוביות המתקדמות
-            advanced_subtitle_menu = InlineKeyboardMarkup([
-                [InlineKeyboardButton("📍 מיקום כתוביות", callback_data="choose_subtitle_position")],
-                [InlineKeyboardButton("🔠 סוג גופן", callback_data="choose_font_type")],
-                [InlineKeyboardButton("🖋️ עובי מתאר", callback_data="choose_outline_size")],
-                [InlineKeyboardButton("👥 גודל צל", callback_data="choose_shadow_size")],
-                [InlineKeyboardButton("🎭 סגנון טקסט", callback_data="choose_text_style")],
-                [InlineKeyboardButton("🎨 צבע רקע", callback_data="choose_background_color")],
-                [InlineKeyboardButton("⬅️ חזרה לתפריט הראשי", callback_data="back_main")]
-            ])
-            safe_edit(query, "הגדרות כתוביות מתקדמות:", reply_markup=advanced_subtitle_menu)
-        elif data == "choose_subtitle_position":
-            LOG.info("Action: choose_subtitle_position")
-            # תפריט בחירת מיקום כתוביות
-            position_menu = InlineKeyboardMarkup([
-                [InlineKeyboardButton("🔽 תחתית מסך (ברירת מחדל)", callback_data="set_position:bottom")],
-                [InlineKeyboardButton("🔼 ראש המסך", callback_data="set_position:top")],
-                [InlineKeyboardButton("↙️ פינה שמאלית תחתונה", callback_data="set_position:bottom-left")],
-                [InlineKeyboardButton("↘️ פינה ימנית תחתונה", callback_data="set_position:bottom-right")],
-                [InlineKeyboardButton("↖️ פינה שמאלית עליונה", callback_data="set_position:top-left")],
-                [InlineKeyboardButton("↗️ פינה ימנית עליונה", callback_data="set_position:top-right")],
-                [InlineKeyboardButton("⭐ מרכז המסך", callback_data="set_position:middle")],
-                [InlineKeyboardButton("⬅️ חזרה", callback_data="advanced_subtitle_settings")]
-            ])
-            safe_edit(query, "בחר מיקום לכתוביות:", reply_markup=position_menu)
-        elif data.startswith("set_position:"):
-            LOG.info("Action: set_position")
-            position = data.split(":")[1]
-            if position in SUBTITLE_POSITIONS:
-                st["subtitle_position"] = position
-                position_name = next((name for name, val in SUBTITLE_POSITIONS.items() if val == position), position)
-                safe_edit(query, f"✅ מיקום הכתוביות נקבע ל: {position}", 
-                         reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ חזרה", callback_data="advanced_subtitle_settings")]]))
-        elif data == "choose_font_type":
-            LOG.info("Action: choose_font_type")
-            # תפריט בחירת סוג גופן
-            font_menu_rows = []
-            for i, (font_key, font_name) in enumerate(SUBTITLE_FONTS.items()):
-                if i % 2 == 0:
-                    font_menu_rows.append([])
-                font_menu_rows[-1].append(InlineKeyboardButton(font_name, callback_data=f"set_font:{font_key}"))
-            font_menu_rows.append([InlineKeyboardButton("⬅️ חזרה", callback_data="advanced_subtitle_settings")])
-            safe_edit(query, "בחר סוג גופן:", reply_markup=InlineKeyboardMarkup(font_menu_rows))
-        elif data.startswith("set_font:"):
-            LOG.info("Action: set_font")
-            font_name = data.split(":")[1]
-            if font_name in SUBTITLE_FONTS:
-                st["font_name"] = font_name
-                safe_edit(query, f"✅ סוג גופן נקבע: {SUBTITLE_FONTS[font_name]}",
-                         reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ חזרה", callback_data="advanced_subtitle_settings")]]))
-        elif data == "choose_text_style":
-            LOG.info("Action: choose_text_style")
-            # תפריט בחירת סגנון טקסט (רגיל/מודגש/נטוי)
-            style_menu = InlineKeyboardMarkup([
-                [InlineKeyboardButton("רגיל", callback_data="set_style:normal")],
-                [InlineKeyboardButton("מודגש", callback_data="set_style:bold")],
-                [InlineKeyboardButton("נטוי", callback_data="set_style:italic")],
-                [InlineKeyboardButton("מודגש + נטוי", callback_data="set_style:bold_italic")],
-                [InlineKeyboardButton("⬅️ חזרה", callback_data="advanced_subtitle_settings")]
-            ])
-            safe_edit(query, "בחר סגנון טקסט:", reply_markup=style_menu)
-        elif data.startswith("set_style:"):
-            LOG.info("Action: set_style")
-            style = data.split(":")[1]
-            if style == "normal":
-                st["bold"] = False
-                st["italic"] = False
-                style_name = "רגיל"
-            elif style == "bold":
-                st["bold"] = True
-                st["italic"] = False
-                style_name = "מודגש"
-            elif style == "italic":
-                st["bold"] = False
-                st["italic"] = True
-                style_name = "נטוי"
-            elif style == "bold_italic":
-                st["bold"] = True
-                st["italic"] = True
-                style_name = "מודגש ונטוי"
-            safe_edit(query, f"✅ סגנון טקסט נקבע: {style_name}",
-                     reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ חזרה", callback_data="advanced_subtitle_settings")]]))
-        elif data == "choose_background_color":
-            LOG.info("Action: choose_background_color")
-            # תפריט בחירת צבע רקע לכתוביות
-            color_rows = []
-            for i, (label, color) in enumerate(COLOR_CHOICES, 1):
-                if i % 3 == 1:
-                    color_rows.append([])
-                color_rows[-1].append(InlineKeyboardButton(label, callback_data=f"set_bg_color:{color}"))
-            color_rows.append([InlineKeyboardButton("⬅️ חזרה", callback_data="advanced_subtitle_settings")])
-            safe_edit(query, "בחר צבע רקע לכתוביות:", reply_markup=InlineKeyboardMarkup(color_rows))
-        elif data.startswith("set_bg_color:"):
-            LOG.info("Action: set_bg_color")
-            color = data.split(":")[1]
-            if color in ASS_COLORS:
-                st["background_color"] = color
-                color_name = next((label for label, color_code in COLOR_CHOICES if color_code == color), color)
-                safe_edit(query, f"✅ צבע רקע נקבע: {color_name}",
-                         reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ חזרה", callback_data="advanced_subtitle_settings")]]))
-        elif data == "choose_outline_size":
-            LOG.info("Action: choose_outline_size")
-            # תפריט בחירת עובי מתאר
-            outline_menu = InlineKeyboardMarkup([
-                [InlineKeyboardButton("0 (ללא מתאר)", callback_data="set_outline:0"),
-                 InlineKeyboardButton("1 (ברירת מחדל)", callback_data="set_outline:1")],
-                [InlineKeyboardButton("2 (עבה)", callback_data="set_outline:2"),
-                 InlineKeyboardButton("3 (עבה מאוד)", callback_data="set_outline:3")],
-                [InlineKeyboardButton("⬅️ חזרה", callback_data="advanced_subtitle_settings")]
-            ])
-            safe_edit(query, "בחר עובי מתאר לכתוביות:", reply_markup=outline_menu)
-        elif data.startswith("set_outline:"):
-            LOG.info("Action: set_outline")
-            size = int(data.split(":")[1])
-            st["outline_size"] = size
-            safe_edit(query, f"✅ עובי מתאר נקבע: {size}",
-                     reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ חזרה", callback_data="advanced_subtitle_settings")]]))
-        elif data == "choose_shadow_size":
-            LOG.info("Action: choose_shadow_size")
-            # תפריט בחירת גודל צל
-            shadow_menu = InlineKeyboardMarkup([
-                [InlineKeyboardButton("0 (ללא צל)", callback_data="set_shadow:0"),
-                 InlineKeyboardButton("1 (ברירת מחדל)", callback_data="set_shadow:1")],
-                [InlineKeyboardButton("2 (צל בולט)", callback_data="set_shadow:2"),
-                 InlineKeyboardButton("3 (צל בולט מאוד)", callback_data="set_shadow:3")],
-                [InlineKeyboardButton("⬅️ חזרה", callback_data="advanced_subtitle_settings")]
-            ])
-            safe_edit(query, "בחר גודל צל לכתוביות:", reply_markup=shadow_menu)
-        elif data.startswith("set_shadow:"):
-            LOG.info("Action: set_shadow")
-            size = int(data.split(":")[1])
-            st["shadow_size"] = size
-            safe_edit(query, f"✅ גודל צל נקבע: {size}",
-                     reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ חזרה", callback_data="advanced_subtitle_settings")]]))
-        elif data == "help":
-            LOG.info("Action: help")
-            safe_edit(query, t(uid, "choose_from_menu"), reply_markup=main_menu_kb(uid, st))
-        elif data == "back_main":
-            LOG.info("Action: back_main")
-            safe_edit(query, t(uid, "prompt_back_main"), reply_markup=main_menu_kb(uid, st))
-        elif data.startswith("logo_setpos:"):
-            LOG.info("Action: logo_setpos")
-            pos = data.split(":")[1]
-            if pos in [p[1] for p in LOGO_POSITIONS]:
-                st["logo_position"] = pos
-            # מצא את שם המיקום
-            pos_name = next((label for label, pos_code in LOGO_POSITIONS if pos_code == pos), pos)
-            safe_edit(query, t(uid, "logo_pos_set", pos_name=pos_name), reply_markup=logo_size_menu(uid))
-        elif data.startswith("logo_setsize:"):
-            LOG.info("Action: logo_setsize")
-            size = int(data.split(":")[1])
-            if size in LOGO_SIZE_CHOICES:
-                st["logo_size_percent"] = size
-            # עכשיו נבחר שקיפות
-            safe_edit(query, t(uid, "logo_size_set", size=st['logo_size_percent']), reply_markup=logo_opacity_menu(uid))
-        elif data.startswith("logo_setopacity:"):
-            LOG.info("Action: logo_setopacity")
-            p = int(data.split(":")[1])
-            st["logo_opacity"] = max(0, min(100, p))
-            # עכשיו מחכים לווידאו
-            st["expecting_video_for_logo"] = True
-            safe_edit(query, t(uid, "logo_opacity_set", opacity=st['logo_opacity']), reply_markup=main_menu_kb(uid, st))
-        else:
-            query.answer()
-    except Unauthorized:
-        try:
-            safe_edit(query, "❌ שגיאת הרשאות בבוט (Unauthorized). בדקו את ה-Token.")
-        except Exception:
-            pass
-    except Exception as e:
-        LOG.exception("Callback error")
-        try:
-            safe_edit(query, f"ארעה שגיאה: {e}")
-        except Exception:
-            try:
-                query.message.reply_text(f"ארעה שגיאה: {e}")
-            except Exception:
-                pass
+# ------------- Callback routes -------------
+# כל נתיב: שם מלא (התקבל בעבר ב-callback_data), קוד קצר, וטיפוסי הארגומנטים
+@CALLBACKS.route("choose_ui_lang", "ul")
+def cb_choose_ui_lang(query, uid: int, st: Dict) -> None:
+    safe_edit(query, t(uid, "prompt_choose_ui_lang"), reply_markup=ui_lang_menu(uid))
+
+@CALLBACKS.route("set_ui_lang", "UL", str)
+def cb_set_ui_lang(query, uid: int, st: Dict, code: str) -> None:
+    if code in UI_STRINGS or code in UI_CATALOGS.languages():
+        st["ui_lang"] = code
+    lang_name = next((name for name, lang_code in LANG_CHOICES if lang_code == st["ui_lang"]), st["ui_lang"])
+    safe_edit(query, t(uid, "ui_lang_set_to", lang_name=lang_name), reply_markup=main_menu_kb(uid, st))
+
+@CALLBACKS.route("choose_lang", "l")
+def cb_choose_lang(query, uid: int, st: Dict) -> None:
+    safe_edit(query, t(uid, "prompt_choose_target_lang"), reply_markup=lang_menu(uid, page=0))
+
+@CALLBACKS.route("lang_page", "lp", int)
+def cb_lang_page(query, uid: int, st: Dict, page: int) -> None:
+    safe_edit(query, t(uid, "prompt_choose_target_lang"), reply_markup=lang_menu(uid, page=page))
+
+@CALLBACKS.route("set_lang", "L", str, int)
+def cb_set_lang(query, uid: int, st: Dict, code: str, page: int) -> None:
+    st["target_lang"] = code
+    LOG.info(f"🎯 שפה נקבעה ל-{code}")
+    # מצא את שם השפה עם הדגל
+    lang_name = next((name for name, lang_code in LANG_CHOICES if lang_code == code), code)
+    safe_edit(query, t(uid, "target_lang_set_to", lang_name=lang_name), reply_markup=main_menu_kb(uid, st))
+
+@CALLBACKS.route("choose_fontsize", "fs")
+def cb_choose_fontsize(query, uid: int, st: Dict) -> None:
+    safe_edit(query, t(uid, "prompt_choose_font_size"), reply_markup=fontsize_menu(uid))
+
+@CALLBACKS.route("set_size", "S", int)
+def cb_set_size(query, uid: int, st: Dict, size: int) -> None:
+    if size in FONT_SIZES:
+        st["font_size"] = size
+    safe_edit(query, t(uid, "font_size_set", size=st['font_size']), reply_markup=main_menu_kb(uid, st))
+
+@CALLBACKS.route("choose_fontcolor", "fc")
+def cb_choose_fontcolor(query, uid: int, st: Dict) -> None:
+    safe_edit(query, t(uid, "prompt_choose_font_color"), reply_markup=fontcolor_menu(uid))
+
+@CALLBACKS.route("set_color", "C", str)
+def cb_set_color(query, uid: int, st: Dict, color: str) -> None:
+    if color in ASS_COLORS:
+        st["font_color"] = color
+    # מצא את שם הצבע עם האימוג'י
+    color_name = next((label for label, color_code in COLOR_CHOICES if color_code == color), color)
+    safe_edit(query, t(uid, "font_color_set", color_name=color_name), reply_markup=main_menu_kb(uid, st))
+
+@CALLBACKS.route("upload_video", "v")
+def cb_upload_video(query, uid: int, st: Dict) -> None:
+    # בדיקה אם יש תהליך הטמעת לוגו פעיל
+    if is_logo_process_active(uid):
+        safe_edit(query, t(uid, "error_logo_process_in_progress"), reply_markup=main_menu_kb(uid, st))
+        return
+    st["expecting_video_for_subs"] = True
+    safe_edit(query, t(uid, "upload_video_prompt",
+        settings_title=t(uid, "settings_current_title"),
+        lang_label=t(uid, "settings_language"),
+        size_label=t(uid, "settings_font_size"),
+        color_label=t(uid, "settings_color"),
+        lang=next((name for name, code in LANG_CHOICES if code == st.get("target_lang", "en")), st.get("target_lang", "en")),
+        size=st.get("font_size", 16),
+        color=next((label for label, color in COLOR_CHOICES if color == st.get("font_color", "white")), st.get("font_color", "white"))
+    ), reply_markup=main_menu_kb(uid, st))
+
+@CALLBACKS.route("logo_start", "g")
+def cb_logo_start(query, uid: int, st: Dict) -> None:
+    # בדיקה אם יש תהליך תרגום פעיל
+    if is_translation_process_active(uid):
+        safe_edit(query, t(uid, "error_translation_process_in_progress"), reply_markup=main_menu_kb(uid, st))
+        return
+    st["expecting_logo_image"] = True
+    st["logo_path"] = None
+    st["expecting_video_for_logo"] = False
+    # לא מחזירים לתפריט הראשי - מחכים להעלאת התמונה
+    safe_edit(query, t(uid, "prompt_logo_start"), reply_markup=back_main_kb(uid))
+
+@CALLBACKS.route("toggle_subs_logo", "gt")
+def cb_toggle_subs_logo(query, uid: int, st: Dict) -> None:
+    if st.get("subs_with_logo"):
+        st["subs_with_logo"] = False
+        safe_edit(query, t(uid, "subs_logo_disabled"), reply_markup=main_menu_kb(uid, st))
+    elif st.get("logo_path") and os.path.exists(st["logo_path"]):
+        st["subs_with_logo"] = True
+        safe_edit(query, t(uid, "subs_logo_enabled"), reply_markup=main_menu_kb(uid, st))
+    else:
+        safe_edit(query, t(uid, "subs_logo_needs_logo"), reply_markup=main_menu_kb(uid, st))
+
+@CALLBACKS.route("advanced_subtitle_settings", "a")
+def cb_advanced_subtitle_settings(query, uid: int, st: Dict) -> None:
+    # מציג את תפריט הגדרות הכתוביות המתקדמות
+    safe_edit(query, "הגדרות כתוביות מתקדמות:", reply_markup=advanced_subtitle_menu(uid))
+
+@CALLBACKS.route("choose_subtitle_position", "ap")
+def cb_choose_subtitle_position(query, uid: int, st: Dict) -> None:
+    safe_edit(query, "בחר מיקום לכתוביות:", reply_markup=subtitle_position_menu(uid))
+
+@CALLBACKS.route("set_position", "P", str)
+def cb_set_position(query, uid: int, st: Dict, position: str) -> None:
+    if position in SUBTITLE_POSITIONS:
+        st["subtitle_position"] = position
+        safe_edit(query, f"✅ מיקום הכתוביות נקבע ל: {position}",
+                  reply_markup=advanced_back_kb(uid))
+
+@CALLBACKS.route("choose_font_type", "af")
+def cb_choose_font_type(query, uid: int, st: Dict) -> None:
+    safe_edit(query, "בחר סוג גופן:", reply_markup=font_type_menu(uid))
+
+@CALLBACKS.route("set_font", "F", str)
+def cb_set_font(query, uid: int, st: Dict, font_name: str) -> None:
+    if font_name in SUBTITLE_FONTS:
+        st["font_name"] = font_name
+        safe_edit(query, f"✅ סוג גופן נקבע: {SUBTITLE_FONTS[font_name]}",
+                  reply_markup=advanced_back_kb(uid))
+
+@CALLBACKS.route("choose_text_style", "as")
+def cb_choose_text_style(query, uid: int, st: Dict) -> None:
+    safe_edit(query, "בחר סגנון טקסט:", reply_markup=text_style_menu(uid))
+
+# סגנון -> (bold, italic, שם לתצוגה)
+TEXT_STYLES = {
+    "normal": (False, False, "רגיל"),
+    "bold": (True, False, "מודגש"),
+    "italic": (False, True, "נטוי"),
+    "bold_italic": (True, True, "מודגש ונטוי"),
+}
 
+@CALLBACKS.route("set_style", "ST", str)
+def cb_set_style(query, uid: int, st: Dict, style: str) -> None:
+    if style not in TEXT_STYLES:
+        return
+    st["bold"], st["italic"], style_name = TEXT_STYLES[style]
+    safe_edit(query, f"✅ סגנון טקסט נקבע: {style_name}",
+              reply_markup=advanced_back_kb(uid))
+
+@CALLBACKS.route("choose_background_color", "ab")
+def cb_choose_background_color(query, uid: int, st: Dict) -> None:
+    safe_edit(query, "בחר צבע רקע לכתוביות:", reply_markup=background_color_menu(uid))
+
+@CALLBACKS.route("set_bg_color", "B", str)
+def cb_set_bg_color(query, uid: int, st: Dict, color: str) -> None:
+    if color in ASS_COLORS:
+        st["background_color"] = color
+        color_name = next((label for label, color_code in COLOR_CHOICES if color_code == color), color)
+        safe_edit(query, f"✅ צבע רקע נקבע: {color_name}",
+                  reply_markup=advanced_back_kb(uid))
+
+@CALLBACKS.route("choose_outline_size", "ao")
+def cb_choose_outline_size(query, uid: int, st: Dict) -> None:
+    safe_edit(query, "בחר עובי מתאר לכתוביות:", reply_markup=outline_menu(uid))
+
+@CALLBACKS.route("set_outline", "O", int)
+def cb_set_outline(query, uid: int, st: Dict, size: int) -> None:
+    st["outline_size"] = size
+    safe_edit(query, f"✅ עובי מתאר נקבע: {size}",
+              reply_markup=advanced_back_kb(uid))
+
+@CALLBACKS.route("choose_shadow_size", "ah")
+def cb_choose_shadow_size(query, uid: int, st: Dict) -> None:
+    safe_edit(query, "בחר גודל צל לכתוביות:", reply_markup=shadow_menu(uid))
+
+@CALLBACKS.route("set_shadow", "H", int)
+def cb_set_shadow(query, uid: int, st: Dict, size: int) -> None:
+    st["shadow_size"] = size
+    safe_edit(query, f"✅ גודל צל נקבע: {size}",
+              reply_markup=advanced_back_kb(uid))
+
+@CALLBACKS.route("help", "h")
+def cb_help(query, uid: int, st: Dict) -> None:
+    safe_edit(query, t(uid, "choose_from_menu"), reply_markup=main_menu_kb(uid, st))
+
+@CALLBACKS.route("back_main", "m")
+def cb_back_main(query, uid: int, st: Dict) -> None:
+    safe_edit(query, t(uid, "prompt_back_main"), reply_markup=main_menu_kb(uid, st))
+
+@CALLBACKS.route("logo_setpos", "gp", str)
+def cb_logo_setpos(query, uid: int, st: Dict, pos: str) -> None:
+    if pos in [p[1] for p in LOGO_POSITIONS]:
+        st["logo_position"] = pos
+    # מצא את שם המיקום
+    pos_name = next((label for label, pos_code in LOGO_POSITIONS if pos_code == pos), pos)
+    safe_edit(query, t(uid, "logo_pos_set", pos_name=pos_name), reply_markup=logo_size_menu(uid))
+
+@CALLBACKS.route("logo_setsize", "gs", int)
+def cb_logo_setsize(query, uid: int, st: Dict, size: int) -> None:
+    if size in LOGO_SIZE_CHOICES:
+        st["logo_size_percent"] = size
+    # עכשיו נבחר שקיפות
+    safe_edit(query, t(uid, "logo_size_set", size=st['logo_size_percent']), reply_markup=logo_opacity_menu(uid))
+
+@CALLBACKS.route("logo_setopacity", "go", int)
+def cb_logo_setopacity(query, uid: int, st: Dict, p: int) -> None:
+    st["logo_opacity"] = max(0, min(100, p))
+    # עכשיו מחכים לווידאו
+    st["expecting_video_for_logo"] = True
+    safe_edit(query, t(uid, "logo_opacity_set", opacity=st['logo_opacity']), reply_markup=main_menu_kb(uid, st))
+
+@timed_handler
+def cb_handler(update: Update, context: CallbackContext) -> None:
+    CALLBACKS.dispatch(update, context)
+
+@timed_handler
 def handle_photo(update: Update, context: CallbackContext):
     uid = update.effective_user.id
     st = get_user_state(uid)
@@ -2024,47 +4670,44 @@ def simple_translate_fallback(texts: List[str], dest_lang: str) -> List[str]:
     LOG.info("🔄 משתמש בתרגום fallback פשוט")
     return [f"[{dest_lang.upper()}] {text}" for text in texts]
 
-def translate_text(text: str, dest_lang: str) -> str:
-    """
-    תרגום פשוט עם googletrans - מודל אחד בלבד
-    """
-    try:
-        from googletrans import Translator
-        translator = Translator()
-        
-        # ניקוי טקסט
-        text = text.strip()
-        if not text or len(text) < 2:
-            return text
-            
-        # תרגום
-        result = translator.translate(text, dest=dest_lang)
-        translated = result.text
-        
-        if translated and translated != text:
-            LOG.info(f"✅ תרגום מוצלח: {text[:30]}... -> {translated[:30]}...")
-            return translated
-        else:
-            return text
-            
+def translate_text(text: str, dest_lang: str) -> str:
+    """
+    תרגום טקסט בודד דרך מנוע התרגום המשותף; בכישלון מחזיר את המקור
+    """
+    text = text.strip()
+    if not text or len(text) < 2:
+        return text
+    try:
+        return TRANSLATION_ENGINE.translate_one(text, dest_lang) or text
     except Exception as e:
         LOG.error(f"שגיאה בתרגום: {e}")
         return text
 
-def parallel_translate_batch(texts: List[str], dest_lang: str) -> List[str]:
+def parallel_translate_batch(texts: List[str], dest_lang: str,
+                             failed_lines: Optional[List[int]] = None) -> List[str]:
     """
     תרגום מקבילי של אצוות טקסט
     מחזיר רשימת תרגומים בסדר מקביל לטקסט המקורי
+    failed_lines - אם נמסרה, מקבלת את האינדקסים של שורות שהתרגום שלהן נכשל (הוחזר המקור)
     """
     if not texts:
         return []
         
     result_translations = [""] * len(texts)
+    failed_indices = set()
     cached_indices = []  # מיקומים שנמצאו במטמון
     texts_to_translate = []  # טקסטים לתרגום
     indices_map = []  # מיפוי בין אינדקס מקורי לאינדקס בבקשה
+    pending: Dict[str, int] = {}  # טקסט -> האינדקס הראשון שלו בבקשה
+    duplicates = []  # (אינדקס, אינדקס המופע הראשון)
+    memory_hits = 0
     
-    # בדיקת מטמון ראשונית
+    # בדיקת מטמון ראשונית - שאילתה אחת לכל השורות
+    try:
+        cached_map = TRANSLATION_STORE.get_many([text.strip() for text in texts if len(text.strip()) >= 2], dest_lang)
+    except Exception as e:
+        LOG.warning(f"⚠️ קריאה ממטמון התרגומים נכשלה: {e}")
+        cached_map = {}
     for i, text in enumerate(texts):
         if not text.strip():
             result_translations[i] = text
@@ -2078,56 +4721,949 @@ def parallel_translate_batch(texts: List[str], dest_lang: str) -> List[str]:
             cached_indices.append(i)
             continue
             
-        cached = get_cached_translation(clean_text, dest_lang)
+        cached = cached_map.get(clean_text)
+        if not cached and clean_text not in pending:
+            # זיכרון תרגום - אותה שורה עם פיסוק/רישיות שונים, או כמעט זהה
+            memory_hit = TRANSLATION_MEMORY.lookup(clean_text, dest_lang)
+            if memory_hit:
+                cached = memory_hit[0]
+                memory_hits += 1
         if cached:
             result_translations[i] = cached
             cached_indices.append(i)
+        elif clean_text in pending:
+            # שורה שחוזרת בסרטון - מתורגמת פעם אחת
+            duplicates.append((i, pending[clean_text]))
         else:
+            pending[clean_text] = i
             texts_to_translate.append(clean_text)
             indices_map.append(i)
     
+    if memory_hits:
+        LOG.info(f"🧠 {memory_hits} שורות מזיכרון התרגום")
+
     # אם הכל מהמטמון - החזר מיד
     if not texts_to_translate:
         return result_translations
     
-    # הכנת תרגום באצוות קטנות ומקביליות
-    max_batch_size = 3  # הקטנת גודל האצווה להפחתת שגיאות
-    batches = []
-    
-    for i in range(0, len(texts_to_translate), max_batch_size):
-        batch = texts_to_translate[i:i+max_batch_size]
-        batches.append(batch)
-    
-    # תרגום עם googletrans
+    # תרגום מקבילי דרך המנוע (לקוח משותף אחד, שורות ארוזות לבקשות)
     try:
         LOG.info(f"🔄 מתחיל תרגום של {len(texts_to_translate)} טקסטים ל-{dest_lang}")
-        
-        # תרגום כל טקסט בנפרד
-        for i, text in enumerate(texts_to_translate):
-            original_idx = indices_map[i]
-            
-            # תרגום עם googletrans
-            translated = translate_text(text, dest_lang)
-            
+        started = time.time()
+        translations = TRANSLATION_ENGINE.translate_packed(texts_to_translate, dest_lang)
+
+        failed = 0
+        to_cache = []
+        for text, original_idx, translated in zip(texts_to_translate, indices_map, translations):
             if translated and translated != text:
                 result_translations[original_idx] = translated
-                cache_translation(text, dest_lang, translated)
-                LOG.info(f"✅ תרגום מוצלח: {text[:30]}... -> {translated[:30]}...")
+                to_cache.append((text, translated))
             else:
                 # אם התרגום נכשל - השאר את הטקסט המקורי
-                LOG.warning(f"⚠️ לא ניתן לתרגם: {text[:50]}...")
                 result_translations[original_idx] = text
-        
-        LOG.info(f"✅ תרגום הושלם: {len([t for t in result_translations if t])} מתוך {len(texts)} טקסטים")
+                if translated is None:
+                    failed += 1
+                    failed_indices.add(original_idx)
+        try:
+            TRANSLATION_STORE.put_many(to_cache, dest_lang)
+        except Exception as e:
+            LOG.warning(f"⚠️ שמירה למטמון התרגומים נכשלה: {e}")
+        TRANSLATION_MEMORY.add_many(to_cache, dest_lang)
+
+        LOG.info(f"✅ תרגום הושלם: {len(texts_to_translate) - failed} מתוך {len(texts_to_translate)} "
+                 f"טקסטים ב-{time.time() - started:.1f} שניות ({len(cached_indices)} מהמטמון)")
     
     except Exception as e:
         LOG.error(f"Error in parallel translation setup: {e}")
         # במקרה של כשל כללי - החזרת הטקסט המקורי
         for i, idx in enumerate(indices_map):
             result_translations[idx] = texts_to_translate[i]
-    
+        failed_indices.update(indices_map)
+
+    for i, first in duplicates:
+        result_translations[i] = result_translations[first]
+        if first in failed_indices:
+            failed_indices.add(i)
+
+    if failed_lines is not None:
+        failed_lines.extend(sorted(failed_indices))
     return result_translations
 
+# ------------- העלאת וידאו בזרימה מהדיסק -------------
+class MultipartFileStream:
+    """
+    גוף multipart/form-data שנקרא מהדיסק בחתיכות, עם אורך ידוע מראש.
+    InputFile של PTB 13 קורא את כל הקובץ לזיכרון; כאן רק חתיכה אחת בכל רגע.
+    """
+    def __init__(self, fields: Dict[str, str], file_field: Optional[str] = None,
+                 path: Optional[str] = None, content_type: str = "video/mp4", chunk_size: int = 256 * 1024):
+        boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        self.chunk_size = chunk_size
+        head = []
+        for name, value in fields.items():
+            head.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n')
+        if file_field and path:
+            filename = os.path.basename(path)
+            head.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; filename="{filename}"\r\n'
+                        f'Content-Type: {content_type}\r\n\r\n')
+        self._head = "".join(head).encode("utf-8")
+        self._tail = (b"\r\n" if file_field and path else b"") + f"--{boundary}--\r\n".encode("ascii")
+        self._path = path if file_field else None
+        self.file_size = os.path.getsize(path) if self._path else 0
+        self.length = len(self._head) + self.file_size + len(self._tail)
+        self.sent = 0
+        self._stage = 0  # 0=head, 1=file, 2=tail, 3=done
+        self._pos = 0
+        self._fh = None
+
+    def __len__(self) -> int:
+        return self.length
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self.chunk_size
+        while self._stage < 3:
+            if self._stage == 1:
+                if self._fh is None:
+                    self._fh = open(self._path, "rb")
+                chunk = self._fh.read(min(size, self.chunk_size))
+                if chunk:
+                    self.sent += len(chunk)
+                    return chunk
+                self._fh.close()
+                self._fh = None
+                self._stage, self._pos = 2, 0
+                continue
+            data = self._head if self._stage == 0 else self._tail
+            if self._pos < len(data):
+                chunk = data[self._pos:self._pos + size]
+                self._pos += len(chunk)
+                self.sent += len(chunk)
+                return chunk
+            self._stage, self._pos = (1 if self._path else 2) if self._stage == 0 else 3, 0
+        return b""
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+class UploadError(Exception):
+    def __init__(self, message: str, transient: bool = False, retry_after: float = 0.0):
+        super().__init__(message)
+        self.transient = transient
+        self.retry_after = retry_after
+
+class VideoUploader:
+    """
+    שליחת וידאו ל-Bot API כ-multipart בזרימה מהדיסק (http.client, בלי תלות חדשה).
+    - מספר העלאות במקביל חסום (Semaphore) כדי שרוחב הפס לא יתחלק לאינסוף
+    - ניסיון חוזר עם backoff מעריכי על 5xx, 429 (לפי retry_after) ושגיאות רשת לפני שהבקשה נשלחה במלואה.
+      sendVideo אינו אידמפוטנטי: כשל בזמן ההמתנה לתשובה (timeout, חיבור שנפל) אחרי שכל הגוף
+      נשלח לא חוזר על עצמו - אחרת הסרטון עלול להישלח פעמיים (retry_unconfirmed משנה זאת)
+    - מדדים: בתים, זמן ותפוקה לכל העלאה ומצטבר
+    במצב שרת מקומי (BOT_API_LOCAL) שולחים file:// לנתיב ואין העלאה בכלל.
+    """
+    def __init__(self, concurrency: int = 2, retries: int = 3, backoff: float = 2.0,
+                 chunk_size: int = 256 * 1024, timeout: float = 600.0, retry_unconfirmed: bool = False):
+        self._slots = threading.BoundedSemaphore(max(1, concurrency))
+        self.retry_unconfirmed = retry_unconfirmed
+        self.concurrency = max(1, concurrency)
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._stats = {"uploads": 0, "failures": 0, "retries": 0, "bytes": 0, "seconds": 0.0, "in_flight": 0}
+
+    def send_video(self, bot, chat_id: int, path: str, caption: Optional[str] = None,
+                   supports_streaming: bool = True, reply_markup=None) -> Dict[str, Any]:
+        """שליחת וידאו; מחזיר את ה-Message של Bot API כמילון (כולל video.file_id)"""
+        fields = {"chat_id": str(chat_id), "supports_streaming": "true" if supports_streaming else "false"}
+        if caption:
+            fields["caption"] = caption
+        if reply_markup is not None:
+            fields["reply_markup"] = reply_markup.to_json()
+        local = BOT_API_LOCAL and os.path.isabs(path)
+        if local:
+            fields["video"] = "file://" + path
+
+        url = f"{bot.base_url}/sendVideo"
+        for attempt in range(self.retries + 1):
+            stream = MultipartFileStream(fields, None if local else "video", None if local else path,
+                                         chunk_size=self.chunk_size)
+            with self._slots:
+                with self._lock:
+                    self._stats["in_flight"] += 1
+                started = time.time()
+                try:
+                    result = self._post(url, stream)
+                    elapsed = time.time() - started
+                    self._record(stream.file_size, elapsed)
+                    if stream.file_size:
+                        LOG.info(f"📤 הועלו {stream.file_size / MB:.1f}MB ב-{elapsed:.1f}s "
+                                 f"({stream.file_size / MB / max(elapsed, 1e-6):.1f}MB/s)")
+                    return result
+                except UploadError as e:
+                    error = e
+                finally:
+                    stream.close()
+                    with self._lock:
+                        self._stats["in_flight"] -= 1
+            if not error.transient or attempt >= self.retries:
+                with self._lock:
+                    self._stats["failures"] += 1
+                raise error
+            delay = max(error.retry_after, self.backoff * (2 ** attempt)) * random.uniform(1.0, 1.25)
+            with self._lock:
+                self._stats["retries"] += 1
+            LOG.warning(f"⚠️ העלאה נכשלה ({error}) - ניסיון {attempt + 2} בעוד {delay:.1f}s")
+            time.sleep(delay)
+
+    def _post(self, url: str, stream: MultipartFileStream) -> Dict[str, Any]:
+        parts = urlsplit(url)
+        conn_cls = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        conn = conn_cls(parts.hostname, parts.port, timeout=self.timeout, blocksize=self.chunk_size)
+        try:
+            try:
+                conn.request("POST", parts.path, body=stream, headers={
+                    "Content-Type": stream.content_type,
+                    "Content-Length": str(len(stream)),
+                })
+            except (OSError, http.client.HTTPException) as e:
+                # הגוף לא נשלח במלואו - השרת לא יכול היה לעבד את הבקשה
+                raise UploadError(f"send failed: {e}", transient=True)
+            try:
+                resp = conn.getresponse()
+                raw = resp.read()
+            except (OSError, http.client.HTTPException) as e:
+                # הבקשה נשלחה; ייתכן שהסרטון כבר בצ'אט
+                raise UploadError(f"no response after upload: {e}", transient=self.retry_unconfirmed)
+        finally:
+            conn.close()
+        try:
+            payload = json.loads(raw.decode("utf-8"))
+        except ValueError:
+            raise UploadError(f"HTTP {resp.status}: invalid response", transient=resp.status >= 500)
+        if resp.status == 200 and payload.get("ok"):
+            return payload["result"]
+        description = payload.get("description") or f"HTTP {resp.status}"
+        retry_after = float((payload.get("parameters") or {}).get("retry_after") or 0)
+        raise UploadError(description, transient=resp.status == 429 or resp.status >= 500, retry_after=retry_after)
+
+    def _record(self, size: int, elapsed: float) -> None:
+        with self._lock:
+            self._stats["uploads"] += 1
+            self._stats["bytes"] += size
+            self._stats["seconds"] += elapsed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            s = dict(self._stats)
+        s["avg_mb_per_sec"] = round(s["bytes"] / MB / s["seconds"], 2) if s["seconds"] else 0.0
+        s["seconds"] = round(s["seconds"], 1)
+        return s
+
+UPLOADER = VideoUploader(
+    concurrency=_env_int("UPLOAD_CONCURRENCY", 2),
+    retries=_env_int("UPLOAD_RETRIES", 3),
+    backoff=_env_float("UPLOAD_BACKOFF_SEC", 2.0),
+    timeout=_env_float("UPLOAD_TIMEOUT_SEC", 600.0),
+    retry_unconfirmed=_env_int("UPLOAD_RETRY_UNCONFIRMED", 0) > 0,
+)
+
+# ------------- מטמון פלטים (שליחה חוזרת לפי file_id) -------------
+OUTPUT_CACHE_DB = Path(os.getenv("OUTPUT_CACHE_DB_PATH") or Path(APP_DIR) / "outputs.db")
+
+class OutputCache:
+    """
+    file_id של סרטונים שכבר נשלחו, לפי (file_unique_id של הקלט, ההגדרות שמשפיעות על הפלט).
+    קליפ פופולרי שמועבר בין משתמשים נשלח שוב לפי file_id - בלי הורדה, תעתוק, קידוד או העלאה.
+    SQLite משותף בין מופעים (כמו מטמון התרגומים); פינוי לפי תפוגה ו-LRU על last_used_at.
+    """
+    EVICT_INTERVAL = 600
+    WRITE_RETRIES = 5
+
+    def __init__(self, db_path: Path, max_entries: int, ttl: int, busy_timeout_ms: int = 5000):
+        self.db_path = db_path
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.busy_timeout_ms = max(0, busy_timeout_ms)
+        self._conn = None
+        self._lock = threading.Lock()
+        self._last_evict = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def _db(self):
+        """חיבור ל-SQLite (נפתח בשימוש הראשון); נקרא תחת self._lock"""
+        if self._conn is None:
+            self._conn = _sqlite_connect(self.db_path, self.busy_timeout_ms)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS outputs ("
+                " key TEXT PRIMARY KEY,"
+                " kind TEXT NOT NULL,"
+                " file_id TEXT NOT NULL,"
+                " meta TEXT,"
+                " created_at REAL NOT NULL,"
+                " last_used_at REAL NOT NULL,"
+                " hits INTEGER NOT NULL DEFAULT 0)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_outputs_last_used ON outputs(last_used_at)")
+        return self._conn
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            row = self._db().execute(
+                "SELECT file_id, meta FROM outputs WHERE key = ? AND created_at > ?", (key, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            _sqlite_write(self._db(), "UPDATE outputs SET last_used_at = ?, hits = hits + 1 WHERE key = ?",
+                          [(now, key)], self.WRITE_RETRIES)
+        return {"file_id": row[0], "meta": json.loads(row[1] or "{}")}
+
+    def put(self, key: str, kind: str, file_id: str, meta: Optional[Dict[str, Any]] = None) -> None:
+        now = time.time()
+        with self._lock:
+            _sqlite_write(
+                self._db(),
+                "INSERT OR REPLACE INTO outputs (key, kind, file_id, meta, created_at, last_used_at, hits) "
+                "VALUES (?, ?, ?, ?, ?, ?, 0)",
+                [(key, kind, file_id, json.dumps(meta or {}, ensure_ascii=False), now, now)],
+                self.WRITE_RETRIES
+            )
+        if now - self._last_evict > self.EVICT_INTERVAL:
+            self.evict()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            _sqlite_write(self._db(), "DELETE FROM outputs WHERE key = ?", [(key,)], self.WRITE_RETRIES)
+
+    def evict(self) -> int:
+        """מחיקת רשומות שפג תוקפן, ואז הוותיקות בשימוש מעבר ל-max_entries"""
+        now = time.time()
+        with self._lock:
+            self._last_evict = now
+            db = self._db()
+            deleted = db.execute("DELETE FROM outputs WHERE created_at <= ?", (now - self.ttl,)).rowcount
+            extra = db.execute("SELECT COUNT(*) FROM outputs").fetchone()[0] - self.max_entries
+            if extra > 0:
+                deleted += db.execute(
+                    "DELETE FROM outputs WHERE key IN "
+                    "(SELECT key FROM outputs ORDER BY last_used_at ASC LIMIT ?)", (extra,)
+                ).rowcount
+        if deleted:
+            LOG.info(f"🧹 מטמון פלטים: פונו {deleted} רשומות")
+        return deleted
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries = self._db().execute("SELECT COUNT(*) FROM outputs").fetchone()[0]
+            return {"entries": entries, "hits": self.hits, "misses": self.misses}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+OUTPUT_CACHE = OutputCache(
+    OUTPUT_CACHE_DB,
+    _env_int("OUTPUT_CACHE_MAX_ENTRIES", 20000),
+    _env_int("OUTPUT_CACHE_TTL_DAYS", 180) * 24 * 3600,
+    _env_int("TRANSLATION_DB_BUSY_TIMEOUT_MS", 5000)
+)
+
+def _logo_fingerprint(st: Dict) -> Optional[str]:
+    """hash של תוכן הלוגו (נשמר במצב המשתמש כל עוד הנתיב לא השתנה)"""
+    path = st.get("logo_path")
+    if not path or not os.path.exists(path):
+        return None
+    if st.get("logo_hash_path") != path:
+        with open(path, "rb") as f:
+            st["logo_hash"] = hashlib.sha1(f.read()).hexdigest()
+        st["logo_hash_path"] = path
+    return st["logo_hash"]
+
+def output_cache_key(kind: str, file_unique_id: str, st: Dict) -> str:
+    """מפתח לפלט: הקלט + כל ההגדרות שמשפיעות על הסרטון שיוצא"""
+    logo = None
+    if kind == "logo" or st.get("subs_with_logo"):
+        logo = [_logo_fingerprint(st), st.get("logo_position", "TR"),
+                st.get("logo_size_percent", 20), int(st.get("logo_opacity", 70))]
+    parts = {"kind": kind, "input": file_unique_id, "logo": logo}
+    if kind == "translate":
+        parts["lang"] = st.get("target_lang", "en")
+        parts["style"] = SubtitleConfig.from_user_state(st).get_ass_style()
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+def _remember_output(ctx: Dict[str, Any], kind: str) -> None:
+    """
+    שמירת ה-file_id שטלגרם החזיר אחרי ההעלאה, לשליחה חוזרת.
+    רק פלט באיכות מלאה: קידוד מוקטן בעומס או תרגום עם שורות שנכשלו
+    היו נשלחים שוב לכל בקשה עתידית, גם כשהבוט פנוי.
+    """
+    file_id = ((ctx.get("sent") or {}).get("video") or {}).get("file_id")
+    if not file_id or not ctx.get("output_key"):
+        return
+    if (ctx.get("plan") or {}).get("degraded") or ctx.get("untranslated_lines"):
+        LOG.info(f"⏭️ פלט {kind} לא נשמר במטמון הפלטים (איכות מוקטנת או תרגום חלקי)")
+        return
+    try:
+        OUTPUT_CACHE.put(ctx["output_key"], kind, file_id, {"src_lang": ctx.get("src_lang")})
+    except Exception as e:
+        LOG.warning(f"⚠️ שמירה במטמון הפלטים נכשלה: {e}")
+
+# ------------- איחוד עבודות זהות -------------
+class FollowerDelivery:
+    """
+    שליחת התוצאה למשתמשים שהצטרפו לעבודה זהה. רץ במאגר חוטים משלו ולא על חוט
+    ההעלאה של העבודה המובילה, בקצב מוגבל (TokenBucket), ו-RetryAfter (429) של טלגרם
+    מכובד עם ניסיונות חוזרים. ניסיון חוזר רק כשהבקשה בוודאות לא התקבלה:
+    אחרי TimedOut ההודעה אולי כבר נשלחה, ולכן לא שולחים שוב.
+    """
+    def __init__(self, workers: int, rate: float, retries: int, backoff: float):
+        self.workers = max(1, workers)
+        self.limiter = TokenBucket(rate, max(1, int(rate)))
+        self.retries = max(0, retries)
+        self.backoff = max(0.0, backoff)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._stats = {"delivered": 0, "failed": 0, "retries": 0}
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="follower-delivery")
+            return self._executor
+
+    def deliver(self, followers: List[Dict[str, Any]], kind: str, file_id: Optional[str],
+                src_lang: Optional[str] = None, error_key: str = "error_processing_failed") -> None:
+        """file_id - הסרטון לכל המצטרפים; בלעדיו כל אחד מקבל את הודעת השגיאה error_key"""
+        for follower in followers:
+            self._pool().submit(self._deliver_one, follower, kind, file_id, src_lang, error_key)
+
+    def _call(self, fn: Callable, *args, **kwargs) -> Any:
+        for attempt in range(self.retries + 1):
+            self.limiter.acquire()
+            try:
+                return fn(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt == self.retries:
+                    raise
+                delay = float(e.retry_after)
+            except (BadRequest, TimedOut):
+                raise
+            except NetworkError:
+                if attempt == self.retries:
+                    raise
+                delay = self.backoff * (2 ** attempt)
+            with self._lock:
+                self._stats["retries"] += 1
+            time.sleep(delay)
+
+    def _deliver_one(self, follower: Dict[str, Any], kind: str, file_id: Optional[str],
+                     src_lang: Optional[str], error_key: str) -> None:
+        uid = follower["uid"]
+        try:
+            if file_id:
+                _send_output_by_file_id(follower["bot"], follower["message"], uid, follower["st"],
+                                        kind, file_id, src_lang, call=self._call)
+            else:
+                self._call(follower["message"].reply_text, t(uid, error_key))
+            ok = True
+        except Exception as e:
+            ok = False
+            LOG.error(f"❌ שליחה למשתמש {uid} שהצטרף לעבודה נכשלה: {e}")
+        with self._lock:
+            self._stats["delivered" if ok else "failed"] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+FOLLOWER_DELIVERY = FollowerDelivery(
+    workers=_env_int("FOLLOWER_DELIVERY_WORKERS", 4),
+    rate=_env_float("FOLLOWER_DELIVERY_RATE", 20.0),
+    retries=_env_int("FOLLOWER_DELIVERY_RETRIES", 5),
+    backoff=_env_float("FOLLOWER_DELIVERY_BACKOFF_SEC", 1.0),
+)
+
+class JobFlights:
+    """
+    העבודה שרצה לכל output_key. בקשה זהה (אותו קלט, אותן הגדרות) שמגיעה בזמן שהעבודה
+    רצה לא פותחת צינור שני: היא נרשמת כמצטרפת, בלי מקום בתור, ומקבלת את הסרטון
+    לפי file_id כשהעבודה המובילה מסתיימת (_release_followers).
+    מוביל שלא שחרר את המפתח תוך max_age מוחלף במוביל חדש; מי שחיכה לו מקבל on_expired.
+    """
+    def __init__(self, max_age: float, on_expired: Optional[Callable[[List[Dict[str, Any]]], None]] = None):
+        self.max_age = max_age
+        self.on_expired = on_expired
+        self._lock = threading.Lock()
+        self._followers: Dict[str, List[Dict[str, Any]]] = {}
+        self._started: Dict[str, float] = {}
+        self.coalesced = 0
+
+    def join(self, key: str, follower: Dict[str, Any]) -> bool:
+        """True - צורף לעבודה קיימת; False - אין עבודה כזו והקורא הופך למוביל"""
+        now = time.time()
+        expired: List[Dict[str, Any]] = []
+        with self._lock:
+            followers = self._followers.get(key)
+            if followers is not None and now - self._started[key] <= self.max_age:
+                followers.append(follower)
+                self.coalesced += 1
+                return True
+            expired = followers or []
+            self._followers[key] = []
+            self._started[key] = now
+        if expired:
+            LOG.warning(f"⚠️ עבודה מובילה לא הסתיימה תוך {self.max_age:.0f}s - {len(expired)} מצטרפים מקבלים הודעת שגיאה")
+            if self.on_expired:
+                self.on_expired(expired)
+        return False
+
+    def release(self, key: str) -> List[Dict[str, Any]]:
+        """סיום העבודה המובילה - מחזיר את המצטרפים ומשחרר את המפתח"""
+        with self._lock:
+            self._started.pop(key, None)
+            return self._followers.pop(key, [])
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"in_flight": len(self._followers), "coalesced": self.coalesced}
+
+JOB_FLIGHTS = JobFlights(
+    _env_int("JOB_FLIGHT_MAX_AGE_SEC", 3 * 3600),
+    on_expired=lambda followers: FOLLOWER_DELIVERY.deliver(followers, kind="", file_id=None)
+)
+
+# ------------- שלבי עבודות בצינור -------------
+def _job_on_error(job: PipelineJob, exc: Exception) -> None:
+    """הודעת שגיאה למשתמש כשעבודה נכשלת באחד השלבים"""
+    uid = job.ctx["uid"]
+    if job.ctx.get("error_key"):
+        # השלב שנכשל כבר קבע איזו הודעה מתאימה
+        job.ctx["message"].reply_text(t(uid, job.ctx["error_key"]))
+    # בדיקה אם זו שגיאת חיבור
+    elif "connection" in str(exc).lower() or "network" in str(exc).lower():
+        job.ctx["message"].reply_text(t(uid, "error_no_internet"))
+    else:
+        job.ctx["message"].reply_text(t(uid, "error_processing_failed"))
+
+def _plan_job(ctx: Dict[str, Any], with_stt: bool = True) -> None:
+    """החלטת מדיניות ה-SLO לעבודה לפי אורך הקליפ והעומס בתור הנוכחי"""
+    width, _ = ffprobe_get_video_size(ctx["local_video"])
+    ctx["duration"] = ffprobe_get_duration(ctx["local_video"])
+    ctx["plan"] = SLO_POLICY.plan(
+        ctx["duration"],
+        max(0, JOB_QUEUE.depth() - 1),  # בלי העבודה הנוכחית
+        width is not None and width >= 1280,
+        with_stt=with_stt
+    )
+
+def _job_step_download(job: PipelineJob) -> None:
+    """שלב הורדת הקובץ מטלגרם (רשת) - מחוץ לחוט ה-dispatcher"""
+    ctx = job.ctx
+    try:
+        tg_file = ctx["bot"].get_file(ctx["file_id"])
+    except Exception as e:
+        ctx["error_key"] = "error_file_too_large" if "too big" in str(e).lower() else "error_upload_failed"
+        raise
+    if BOT_API_LOCAL and tg_file.file_path and os.path.isabs(tg_file.file_path) and os.path.exists(tg_file.file_path):
+        # שרת מקומי: הקובץ כבר על הדיסק - קוראים ממנו ישירות בלי עותק.
+        # הקובץ שייך לשרת ה-Bot API ולכן לא נמחק בסוף העבודה.
+        TEMP_MANAGER.cleanup_file(ctx["local_video"])
+        ctx["local_video"] = tg_file.file_path
+        ctx["local_source"] = True
+        return
+    ctx["message"].reply_text(t(ctx["uid"], "downloading_video"))
+    try:
+        tg_file.download(custom_path=ctx["local_video"])
+    except Exception as e:
+        LOG.error(f"Error downloading file: {e}")
+        ctx["error_key"] = "error_upload_failed"
+        raise
+    # ניקוי זיכרון אחרי הורדה גדולה
+    TEMP_MANAGER.clear_memory()
+
+def _input_id(ctx: Dict[str, Any]) -> str:
+    """מזהה תוכן הקלט: file_unique_id של טלגרם, ובלעדיו hash של הקובץ"""
+    if not ctx.get("input_id"):
+        digest = hashlib.sha256()
+        with open(ctx["local_video"], "rb") as f:
+            for chunk in iter(lambda: f.read(MB), b""):
+                digest.update(chunk)
+        ctx["input_id"] = "sha256:" + digest.hexdigest()
+    return ctx["input_id"]
+
+def _stt_artifact_key(ctx: Dict[str, Any], model_size: Optional[str]) -> str:
+    return ArtifactCache.key("stt", input=_input_id(ctx), model=model_size,
+                             engine=SPEECH_SYSTEM.default_model_type)
+
+def _tr_artifact_key(ctx: Dict[str, Any]) -> str:
+    # לפי תוכן התעתוק עצמו - אותו תעתוק מכל גודל מודל מתורגם פעם אחת
+    transcript = hashlib.sha256(json.dumps(ctx["segs"], sort_keys=True).encode("utf-8")).hexdigest()
+    return ArtifactCache.key("tr", transcript=transcript, lang=ctx["st"].get("target_lang", "en"))
+
+def _store_artifact(store: Callable, *args) -> None:
+    """שמירה במטמון תוצרי הביניים - כישלון לא מפיל את העבודה"""
+    try:
+        store(*args)
+    except Exception as e:
+        LOG.warning(f"⚠️ שמירת תוצר ביניים נכשלה: {e}")
+
+def _reuse_transcript(job: PipelineJob) -> bool:
+    """
+    תעתוק קיים לאותו קלט (מהגודל שנבחר או מגודל גדול ממנו) - בלי חילוץ אודיו ו-Whisper.
+    אם גם התרגום לשפת היעד קיים, ממשיכים ישר לצריבה.
+    """
+    ctx = job.ctx
+    planned = ctx["plan"]["model_size"]
+    ladder = SLOPolicy.SIZE_LADDER
+    sizes = [planned] + (ladder[:ladder.index(planned)][::-1] if planned in ladder else [])
+    for size in sizes:
+        transcript = ARTIFACT_CACHE.get_json(_stt_artifact_key(ctx, size))
+        if transcript:
+            break
+    else:
+        return False
+    ctx["segs"], ctx["src_lang"] = transcript["segs"], transcript.get("lang")
+    segs_tr = ARTIFACT_CACHE.get_json(_tr_artifact_key(ctx))
+    if segs_tr is None:
+        LOG.info(f"♻️ תעתוק ({size}) מהמטמון - ממשיכים לתרגום")
+        job.skip_to("translate")
+        return True
+    _write_job_srt(ctx, segs_tr)
+    LOG.info("♻️ תעתוק ותרגום מהמטמון - ממשיכים לצריבה")
+    job.skip_to("encode")
+    return True
+
+def _tr_step_extract(job: PipelineJob) -> None:
+    """שלב חילוץ אודיו (CPU) + החלטת SLO לגודל המודל ולקידוד"""
+    ctx = job.ctx
+    _plan_job(ctx)
+    if _reuse_transcript(job):
+        return
+    wav_path = TEMP_MANAGER.create_temp_file("audio", ".wav")
+    ctx["wav_path"] = wav_path
+    wav_key = ArtifactCache.key("wav", input=_input_id(ctx))
+    if ARTIFACT_CACHE.fetch_file(wav_key, ".wav", wav_path):
+        LOG.info("♻️ אודיו מהמטמון")
+        return
+    # אותו קלט כבר בחילוץ בעבודה אחרת - מחכים לה ולוקחים עותק של הקובץ שלה
+    leader_wav = STAGE_FLIGHTS["extract"].do(wav_key, lambda: _extract_wav(ctx, wav_path, wav_key))
+    if leader_wav != wav_path:
+        try:
+            _link_or_copy(leader_wav, wav_path)
+        except OSError:
+            _extract_wav(ctx, wav_path, wav_key)
+
+def _extract_wav(ctx: Dict[str, Any], wav_path: str, wav_key: str) -> str:
+    try:
+        extract_audio_16k_mono(ctx["local_video"], wav_path)
+        # ניקוי זיכרון לאחר המרת אודיו (שיכולה להיות כבדה)
+        TEMP_MANAGER.clear_memory(True)
+    except Exception as e:
+        LOG.error(f"Audio extraction failed: {e}")
+        raise RuntimeError("Failed to extract audio from video")
+    _store_artifact(ARTIFACT_CACHE.put_file, wav_key, ".wav", wav_path)
+    return wav_path
+
+def _tr_step_stt(job: PipelineJob) -> None:
+    """שלב תעתוק (CPU)"""
+    ctx = job.ctx
+    if not MODEL_WARMUP.is_ready():
+        # הבוט רק עלה - מחכים לסיום החימום (גם כשל מסיים אותו) לפני שליחה לתהליכי התעתוק
+        MODEL_WARMUP.wait_ready(ModelWarmup.TIMEOUT_SEC)
+    ctx["message"].reply_text(t(ctx["uid"], "transcribing"))
+    model_size = ctx["plan"]["model_size"]
+    stt_key = _stt_artifact_key(ctx, model_size)
+
+    def transcribe():
+        started = time.time()
+        segs, lang = stt_whisper(ctx["wav_path"], model_size)
+        SLO_POLICY.observe_stt(model_size, ctx["duration"], time.time() - started)
+        if segs:
+            _store_artifact(ARTIFACT_CACHE.put_json, stt_key, {"segs": segs, "lang": lang})
+        return segs, lang
+
+    segs, lang = STAGE_FLIGHTS["stt"].do(stt_key, transcribe)
+    if not segs:
+        raise RuntimeError("No transcription results received.")
+    ctx["segs"] = segs
+    ctx["src_lang"] = lang
+
+def _tr_step_translate(job: PipelineJob) -> None:
+    """שלב תרגום (רשת) + כתיבת קובץ SRT"""
+    ctx = job.ctx
+    segs = ctx["segs"]
+    target_lang = ctx["st"].get("target_lang", "en")
+    tr_key = _tr_artifact_key(ctx)
+
+    def translate():
+        LOG.info(f"🎯 מתרגם ל-{target_lang} (שפה נבחרת: {target_lang})")
+        failed_lines: List[int] = []
+        translated_texts = parallel_translate_batch([seg["text"] for seg in segs], target_lang, failed_lines)
+
+        # שילוב התרגומים בתוך המקטעים
+        segs_tr = []
+        for i, seg in enumerate(segs):
+            translated_text = translated_texts[i] if i < len(translated_texts) else seg["text"]
+            segs_tr.append({**seg, "text": translated_text})
+        # שורות שנכשלו נשארו במקור - לא שומרים, כדי שבקשה הבאה תנסה לתרגם שוב (כמו to_cache)
+        if failed_lines:
+            LOG.warning(f"⚠️ {len(failed_lines)} שורות לא תורגמו - התרגום לא נשמר במטמון התוצרים")
+        else:
+            _store_artifact(ARTIFACT_CACHE.put_json, tr_key, segs_tr)
+        return segs_tr, len(failed_lines)
+
+    segs_tr = ARTIFACT_CACHE.get_json(tr_key)
+    if segs_tr is None:
+        segs_tr, ctx["untranslated_lines"] = STAGE_FLIGHTS["translate"].do(tr_key, translate)
+    _write_job_srt(ctx, segs_tr)
+
+def _write_job_srt(ctx: Dict[str, Any], segs_tr: List[Dict]) -> None:
+    srt_path = TEMP_MANAGER.create_temp_file("subs", ".srt")
+    ctx["srt_path"] = srt_path
+    try:
+        write_srt(segs_tr, srt_path)
+    except Exception as e:
+        LOG.error(f"Failed to write SRT: {e}")
+        raise RuntimeError("Failed to create subtitle file")
+
+def _tr_step_encode(job: PipelineJob) -> None:
+    """שלב צריבת כתוביות (CPU) - עם לוגו בקידוד אחד אם נבחר"""
+    ctx = job.ctx
+    st = ctx["st"]
+    out_video = TEMP_MANAGER.create_temp_file("out", ".mp4")
+    ctx["out_video"] = out_video
+    encode_profile = ctx["plan"]["encode_profile"]
+    started = time.time()
+    try:
+        # יצירת הגדרות כתוביות מותאמות אישית
+        subtitle_config = SubtitleConfig.from_user_state(st)
+        logo_path = st.get("logo_path")
+        if st.get("subs_with_logo") and logo_path and os.path.exists(logo_path):
+            # כתוביות + לוגו בגרף פילטרים אחד - קידוד יחיד
+            burn_subs_and_logo(
+                input_video=ctx["local_video"],
+                srt_path=ctx["srt_path"],
+                logo_png=logo_path,
+                output_video=out_video,
+                subtitle_config=subtitle_config,
+                position=st.get("logo_position", "TR"),
+                opacity_percent=int(st.get("logo_opacity", 70)),
+                scale_ratio=st.get("logo_size_percent", 20) / 100.0,
+                encode_profile=encode_profile
+            )
+        else:
+            burn_subs_from_srt(
+                input_video=ctx["local_video"],
+                srt_path=ctx["srt_path"],
+                output_video=out_video,
+                subtitle_config=subtitle_config,
+                encode_profile=encode_profile
+            )
+        SLO_POLICY.observe_encode(encode_profile["preset"], ctx["duration"], time.time() - started)
+        # ניקוי זיכרון לאחר פעולת קידוד כבדה
+        TEMP_MANAGER.clear_memory(True)
+    except Exception as e:
+        LOG.error(f"Failed to burn subtitles: {e}")
+        raise RuntimeError("Failed to burn subtitles to video")
+
+    if not os.path.exists(out_video):
+        raise RuntimeError("Output video file not created")
+
+def _translation_caption(uid: int, st: Dict, src_lang: Optional[str]) -> str:
+    target_lang = st.get("target_lang", "en")
+    target_lang_name = next((name for name, code in LANG_CHOICES if code == target_lang), target_lang)
+    color_name = next((label for label, color in COLOR_CHOICES if color == st.get("font_color", "white")), st.get("font_color", "white"))
+    return t(uid, "translated_done_caption",
+        lang_label=t(uid, "settings_language"),
+        size_label=t(uid, "settings_font_size"),
+        color_label=t(uid, "settings_color"),
+        lang=target_lang_name,
+        size=st.get("font_size", 16),
+        color=color_name,
+        src_lang=src_lang or 'unknown'
+    )
+
+def _tr_step_upload(job: PipelineJob) -> None:
+    """שלב שליחת הווידאו המתורגם (רשת)"""
+    ctx = job.ctx
+    uid, st, message = ctx["uid"], ctx["st"], ctx["message"]
+    out_video = ctx["out_video"]
+
+    size_bytes = os.path.getsize(out_video)
+    if size_bytes > MAX_UPLOAD_SIZE:
+        ctx["output_too_big"] = True
+        message.reply_text(t(uid, "output_too_big"))
+        return
+
+    ctx["sent"] = UPLOADER.send_video(
+        message.bot, message.chat_id, out_video, supports_streaming=True,
+        caption=_translation_caption(uid, st, ctx.get("src_lang"))
+    )
+    _remember_output(ctx, "translate")
+    # שליחת תפריט ראשי נפרד
+    message.reply_text(t(uid, "back_main_done"), reply_markup=main_menu_kb(uid, st))
+
+def _translation_job_finally(job: PipelineJob) -> None:
+    """ניקוי קבצים ושחרור מכסת המשתמש בסיום עבודת תרגום (הצלחה או כישלון)"""
+    ctx = job.ctx
+    try:
+        keys = ("wav_path", "srt_path", "out_video") if ctx.get("local_source") else ("local_video", "wav_path", "srt_path", "out_video")
+        cleanup_paths([ctx[k] for k in keys if ctx.get(k)])
+    except Exception:
+        pass
+    ctx["st"]["expecting_video_for_subs"] = False
+    _release_followers(job, "translate")
+    JOB_QUEUE.finish(ctx["queue_job_id"], ok=job.error is None)
+
+def _logo_step_encode(job: PipelineJob) -> None:
+    """שלב הטמעת לוגו (CPU)"""
+    ctx = job.ctx
+    st = ctx["st"]
+    output_video = TEMP_MANAGER.create_temp_file("logo", ".mp4")
+    ctx["out_video"] = output_video
+    _plan_job(ctx, with_stt=False)
+    encode_profile = ctx["plan"]["encode_profile"]
+    started = time.time()
+    try:
+        overlay_logo(
+            input_video=ctx["local_video"],
+            logo_png=st["logo_path"],
+            output_video=output_video,
+            position=st.get("logo_position", "TR"),
+            opacity_percent=int(st.get("logo_opacity", 70)),
+            scale_ratio=st.get("logo_size_percent", 20) / 100.0,
+            encode_profile=encode_profile
+        )
+        SLO_POLICY.observe_encode(encode_profile["preset"], ctx["duration"], time.time() - started)
+        # ניקוי זיכרון לאחר פעולת הטמעה כבדה
+        TEMP_MANAGER.clear_memory(True)
+    except Exception as e:
+        LOG.error(f"Failed to overlay logo: {e}")
+        raise RuntimeError("Failed to overlay logo on video")
+
+    if not os.path.exists(output_video):
+        raise RuntimeError("Output video with logo not created")
+
+def _logo_caption(uid: int, st: Dict) -> str:
+    pos_name = next((label for label, pos_code in LOGO_POSITIONS if pos_code == st.get("logo_position", "TR")), st.get("logo_position", "TR"))
+    return t(uid, "logo_done_caption",
+        pos_name=pos_name,
+        size=st.get("logo_size_percent", 20),
+        opacity=st.get("logo_opacity", 70)
+    )
+
+def _logo_step_upload(job: PipelineJob) -> None:
+    """שלב שליחת הווידאו עם הלוגו (רשת)"""
+    ctx = job.ctx
+    uid, st, message = ctx["uid"], ctx["st"], ctx["message"]
+    ctx["sent"] = UPLOADER.send_video(
+        message.bot, message.chat_id, ctx["out_video"], supports_streaming=True,
+        caption=_logo_caption(uid, st)
+    )
+    _remember_output(ctx, "logo")
+    # שליחת תפריט ראשי נפרד
+    message.reply_text(t(uid, "back_main_done"), reply_markup=main_menu_kb(uid, st))
+
+def _logo_job_finally(job: PipelineJob) -> None:
+    """ניקוי קבצים בסיום עבודת לוגו"""
+    ctx = job.ctx
+    try:
+        keys = ("out_video",) if ctx.get("local_source") else ("local_video", "out_video")
+        cleanup_paths([ctx[k] for k in keys if ctx.get(k)])
+    except Exception:
+        pass
+    _release_followers(job, "logo")
+    JOB_QUEUE.finish(ctx["queue_job_id"], ok=job.error is None)
+
+TRANSLATION_JOB_STEPS = [
+    ("download", _job_step_download),
+    ("extract", _tr_step_extract),
+    ("stt", _tr_step_stt),
+    ("translate", _tr_step_translate),
+    ("encode", _tr_step_encode),
+    ("upload", _tr_step_upload),
+]
+
+LOGO_JOB_STEPS = [
+    ("download", _job_step_download),
+    ("encode", _logo_step_encode),
+    ("upload", _logo_step_upload),
+]
+
+def _send_cached_output(bot, message, uid: int, st: Dict, kind: str, key: str) -> bool:
+    """שליחת פלט קיים מהמטמון לפי file_id. False אם אין פגיעה או שה-file_id כבר לא תקף"""
+    try:
+        hit = OUTPUT_CACHE.get(key)
+    except Exception as e:
+        LOG.warning(f"⚠️ קריאה ממטמון הפלטים נכשלה: {e}")
+        return False
+    if not hit:
+        return False
+    try:
+        _send_output_by_file_id(bot, message, uid, st, kind, hit["file_id"], hit["meta"].get("src_lang"))
+    except BadRequest as e:
+        LOG.warning(f"⚠️ file_id מהמטמון נדחה ({e}) - מעבדים מחדש")
+        OUTPUT_CACHE.delete(key)
+        return False
+    except Exception as e:
+        LOG.warning(f"⚠️ שליחה מהמטמון נכשלה ({e}) - מעבדים מחדש")
+        return False
+    LOG.info(f"♻️ פלט {kind} נשלח מהמטמון לפי file_id")
+    return True
+
+def _send_output_by_file_id(bot, message, uid: int, st: Dict, kind: str, file_id: str, src_lang: Optional[str],
+                            call: Optional[Callable] = None) -> None:
+    """
+    שליחת סרטון שכבר נמצא בטלגרם (לפי file_id) עם הכיתוב והתפריט של המשתמש.
+    call - עוטף כל קריאת API בנפרד (ניסיונות חוזרים במסירה למצטרפים).
+    """
+    call = call or (lambda fn, *args, **kwargs: fn(*args, **kwargs))
+    caption = _translation_caption(uid, st, src_lang) if kind == "translate" else _logo_caption(uid, st)
+    call(bot.send_video, message.chat_id, video=file_id, caption=caption, supports_streaming=True)
+    if kind == "translate":
+        st["expecting_video_for_subs"] = False
+    else:
+        st["expecting_video_for_logo"] = False
+    call(message.reply_text, t(uid, "back_main_done"), reply_markup=main_menu_kb(uid, st))
+
+def _release_followers(job: Optional[PipelineJob], kind: str, key: Optional[str] = None,
+                       error_key: str = "error_processing_failed") -> None:
+    """
+    סיום עבודה מובילה: כל מי שהצטרף אליה מקבל את אותו file_id, או את אותה הודעת שגיאה.
+    job=None - העבודה לא נכנסה לתור בכלל (key ו-error_key קובעים מה נשלח).
+    המסירה עצמה ב-FOLLOWER_DELIVERY, כדי לא לעכב את חוט השלב.
+    """
+    file_id = src_lang = None
+    if job is not None:
+        ctx = job.ctx
+        key = ctx.get("output_key")
+        sent = ctx.get("sent") or {}
+        # טלגרם עשוי להחזיר את הסרטון כ-document או animation
+        media = sent.get("video") or sent.get("document") or sent.get("animation") or {}
+        file_id = media.get("file_id")
+        src_lang = ctx.get("src_lang")
+        if job.error is not None:
+            error_key = ctx.get("error_key") or "error_processing_failed"
+        elif ctx.get("output_too_big"):
+            error_key = "output_too_big"
+    if not key:
+        return
+    followers = JOB_FLIGHTS.release(key)
+    if followers:
+        FOLLOWER_DELIVERY.deliver(followers, kind, file_id, src_lang, error_key)
+
+@timed_handler
 def handle_document_or_video(update: Update, context: CallbackContext):
     uid = update.effective_user.id
     st = get_user_state(uid)
@@ -2159,6 +5695,7 @@ def handle_document_or_video(update: Update, context: CallbackContext):
                 update.message.reply_text(t(uid, "error_upload_failed"))
             return
 
+        try:
             # המרה ל-PNG אם צריך
             from PIL import Image
             if ext.lower() != ".png":
@@ -2178,8 +5715,9 @@ def handle_document_or_video(update: Update, context: CallbackContext):
             return
 
     # --- סרטון עבור אחד מהמצבים ---
-    # קבע מקור: video או document (וידאו)
-    tg_file = None
+    # קבע מקור: video או document (וידאו). get_file וההורדה עצמה רצים
+    # בשלב download של הצינור - כאן רק בודקים ורושמים בתור.
+    file_id = None
     filename = None
     size = None
     if vid:
@@ -2187,17 +5725,9 @@ def handle_document_or_video(update: Update, context: CallbackContext):
         if vid.file_size and vid.file_size > MAX_FILE_SIZE:
             update.message.reply_text(t(uid, "error_file_too_large"))
             return
-            
-        try:
-            tg_file = context.bot.get_file(vid.file_id)
-            filename = f"video_{uuid.uuid4().hex}.mp4"
-            size = vid.file_size
-        except Exception as e:
-            if "too big" in str(e).lower():
-                update.message.reply_text(t(uid, "error_file_too_large"))
-            else:
-                update.message.reply_text(t(uid, "error_upload_failed"))
-            return
+        file_id = vid.file_id
+        filename = f"video_{uuid.uuid4().hex}.mp4"
+        size = vid.file_size
     elif doc:
         # בדיקת גודל מוקדמת
         if doc.file_size and doc.file_size > MAX_FILE_SIZE:
@@ -2205,16 +5735,9 @@ def handle_document_or_video(update: Update, context: CallbackContext):
             return
             
         if (doc.mime_type or "").startswith("video/") or (os.path.splitext(doc.file_name or "")[1].lower() in ALLOWED_VIDEO_EXT):
-            try:
-                tg_file = context.bot.get_file(doc.file_id)
-                filename = doc.file_name or f"video_{uuid.uuid4().hex}.mp4"
-                size = doc.file_size
-            except Exception as e:
-                if "too big" in str(e).lower():
-                    update.message.reply_text(t(uid, "error_file_too_large"))
-                else:
-                    update.message.reply_text(t(uid, "error_upload_failed"))
-                return
+            file_id = doc.file_id
+            filename = doc.file_name or f"video_{uuid.uuid4().hex}.mp4"
+            size = doc.file_size
         else:
             update.message.reply_text(t(uid, "error_unsupported_file_type"))
             return
@@ -2231,241 +5754,102 @@ def handle_document_or_video(update: Update, context: CallbackContext):
         update.message.reply_text(t(uid, "error_file_too_large"))
         return
 
-    # הורדה עם מנהל קבצים זמניים
-    local_video = TEMP_MANAGER.create_temp_file("in", Path(filename).suffix.lower())
-    try:
-        update.message.reply_text(t(uid, "downloading_video"))
-        tg_file.download(custom_path=local_video)
-        # ניקוי זיכרון אחרי הורדה גדולה
-        TEMP_MANAGER.clear_memory()
-    except Exception as e:
-        LOG.error(f"Error downloading file: {e}")
-        update.message.reply_text(t(uid, "error_upload_failed"))
-        TEMP_MANAGER.cleanup_file(local_video)
-        return
-
-    # --- מצב לוגו ---
+    # קביעת סוג העבודה לפני ההורדה - לא מורידים קבצים שלא נוכל לעבד
     if st.get("expecting_video_for_logo"):
         if not st.get("logo_path"):
             update.message.reply_text(t(uid, "error_invalid_file"))
             return
-            
-        # מעבר לעיבוד במאגר התהליכים המקבילי
-        def process_logo_video():
-            output_video = None
-            try:
-                pos_name = next((label for label, pos_code in LOGO_POSITIONS if pos_code == st.get("logo_position", "TR")), st.get("logo_position", "TR"))
-                logo_size_percent = st.get("logo_size_percent", 20)
-                scale_ratio = logo_size_percent / 100.0
-                output_video = TEMP_MANAGER.create_temp_file("logo", ".mp4")
-                
-                # הטמעת הלוגו בווידאו
-                try:
-                    overlay_logo(
-                        input_video=local_video,
-                        logo_png=st["logo_path"],
-                        output_video=output_video,
-                        position=st.get("logo_position", "TR"),
-                        opacity_percent=int(st.get("logo_opacity", 70)),
-                        scale_ratio=scale_ratio
-                    )
-                    # ניקוי זיכרון לאחר פעולת הטמעה כבדה
-                    TEMP_MANAGER.clear_memory(True)
-                except Exception as e:
-                    LOG.error(f"Failed to overlay logo: {e}")
-                    if output_video:
-                        TEMP_MANAGER.cleanup_file(output_video)
-                    raise RuntimeError("Failed to overlay logo on video")
-                    
-                if not os.path.exists(output_video):
-                    raise RuntimeError("Output video with logo not created")
-                    
-                # שליחת הווידאו עם הלוגו
-                with open(output_video, "rb") as f:
-                    update.message.reply_video(
-                        video=f,
-                        supports_streaming=True,
-                        caption=t(uid, "logo_done_caption",
-                            pos_name=pos_name,
-                            size=st.get("logo_size_percent", 20),
-                            opacity=st.get("logo_opacity", 70)
-                        )
-                    )
-                # שליחת תפריט ראשי נפרד
-                update.message.reply_text(t(uid, "back_main_done"), reply_markup=main_menu_kb(uid, st))
-                
-                return True
-            except Exception as e:
-                LOG.error(f"Error in logo processing: {e}")
-                if "connection" in str(e).lower() or "network" in str(e).lower():
-                    update.message.reply_text(t(uid, "error_no_internet"))
-                else:
-                    update.message.reply_text(t(uid, "error_processing_failed"))
-                return False
-            finally:
-                try:
-                    if output_video:
-                        cleanup_paths([local_video, output_video])
-                    else:
-                        cleanup_paths([local_video])
-                except Exception:
-                    pass
-        
-        # התחלת העיבוד והודעה ראשונית
-        pos_name = next((label for label, pos_code in LOGO_POSITIONS if pos_code == st.get("logo_position", "TR")), st.get("logo_position", "TR"))
-        update.message.reply_text(t(uid, "logo_processing_start", 
-                                   pos_name=pos_name, 
-                                   size=st.get('logo_size_percent', 20), 
-                                   opacity=st.get('logo_opacity', 70)))
-        
-        # ביצוע העיבוד במאגר התהליכים
-        EXECUTOR.submit(process_logo_video)
-        st["expecting_video_for_logo"] = False
+        kind = "logo"
+    elif st.get("expecting_video_for_subs"):
+        kind = "translate"
+    else:
+        update.message.reply_text(t(uid, "error_invalid_file"))
         return
 
-    # --- מצב תרגום וכתוביות ---
-    if not st.get("expecting_video_for_subs"):
-        update.message.reply_text(t(uid, "error_invalid_file"))
-        cleanup_paths([local_video])
+    # אותו קלט עם אותן הגדרות כבר עובד ונשלח - שליחה חוזרת לפי file_id, בלי תור ובלי עיבוד
+    media = vid or doc
+    output_key = output_cache_key(kind, media.file_unique_id, st) if getattr(media, "file_unique_id", None) else None
+    if output_key and _send_cached_output(context.bot, update.message, uid, st, kind, output_key):
+        return
+    # אותו קלט עם אותן הגדרות כבר בעיבוד - מצטרפים לעבודה הקיימת במקום לפתוח צינור שני
+    if output_key and JOB_FLIGHTS.join(output_key, {"uid": uid, "st": st, "message": update.message, "bot": context.bot}):
+        LOG.info(f"🔗 משתמש {uid} הצטרף לעבודת {kind} זהה שכבר רצה")
+        update.message.reply_text(t(uid, "job_joined"))
         return
 
-    # הגבלת עומס: עד 2 במקביל למשתמש
-    if not inc_jobs(uid):
-        update.message.reply_text(t(uid, "error_processing_failed"))
-        cleanup_paths([local_video])
+    # בקרת קבלה: רישום בתור לפני ההורדה; במצב עומס דוחים מיד
+    queue_job_id, position, reject_reason = JOB_QUEUE.admit(
+        uid, update.effective_chat.id, kind,
+        priority=JOB_PRIORITIES.get(kind, 1),
+        payload={"ui_lang": get_ui_lang(uid), "file_name": filename, "size": size}
+    )
+    if queue_job_id is None:
+        if reject_reason == JobQueue.REJECT_USER_LIMIT:
+            update.message.reply_text(t(uid, "queue_user_limit", limit=JOB_QUEUE.per_user_limit))
+        else:
+            update.message.reply_text(t(uid, "queue_full"))
+        _release_followers(None, kind, output_key, error_key="queue_full")
         return
 
-    # תהליך תרגום וכתוביות במאגר התהליכים המקבילי
-    def process_translation_video():
-        try:
-            # הודעת התחלה
+    local_video = None
+    try:
+        # ההורדה עצמה היא השלב הראשון בצינור (מאגר download חסום)
+        local_video = TEMP_MANAGER.create_temp_file("in", Path(filename).suffix.lower())
+        ctx = {"uid": uid, "st": st, "message": update.message, "bot": context.bot, "file_id": file_id,
+               "local_video": local_video, "queue_job_id": queue_job_id, "output_key": output_key,
+               "input_id": getattr(media, "file_unique_id", None)}
+
+        # --- מצב לוגו ---
+        if kind == "logo":
+            # התחלת העיבוד והודעה ראשונית
+            pos_name = next((label for label, pos_code in LOGO_POSITIONS if pos_code == st.get("logo_position", "TR")), st.get("logo_position", "TR"))
+            update.message.reply_text(t(uid, "logo_processing_start", 
+                                       pos_name=pos_name, 
+                                       size=st.get('logo_size_percent', 20), 
+                                       opacity=st.get('logo_opacity', 70)))
+
+            # קידוד והעלאה דרך הצינור המדורג
+            job = PipelineJob("logo", LOGO_JOB_STEPS, ctx=ctx,
+                              on_error=_job_on_error, on_finally=_logo_job_finally)
+            st["expecting_video_for_logo"] = False
+
+        # --- מצב תרגום וכתוביות ---
+        else:
+            # הודעות על התחלת העיבוד
             target_lang_name = next((name for name, code in LANG_CHOICES if code == st.get("target_lang", "en")), st.get("target_lang", "en"))
             color_name = next((label for label, color in COLOR_CHOICES if color == st.get("font_color", "white")), st.get("font_color", "white"))
-            
-            # חילוץ אודיו עם מנהל הקבצים הזמניים
-            wav_path = TEMP_MANAGER.create_temp_file("audio", ".wav")
-            try:
-                extract_audio_16k_mono(local_video, wav_path)
-                # ניקוי זיכרון לאחר המרת אודיו (שיכולה להיות כבדה)
-                TEMP_MANAGER.clear_memory(True)
-            except Exception as e:
-                LOG.error(f"Audio extraction failed: {e}")
-                TEMP_MANAGER.cleanup_file(wav_path)
-                raise RuntimeError("Failed to extract audio from video")
-
-            # תעתיק (transcription)
-            segs, lang = stt_whisper(wav_path)
-            if not segs:
-                raise RuntimeError("No transcription results received.")
-
-            # תרגום לשפת היעד
-            # משתמש במנגנון תרגום המקבילי החדש עם תמיכה באצוות
-            all_texts = [seg["text"] for seg in segs]
-            target_lang = st.get("target_lang", "en")
-            LOG.info(f"🎯 מתרגם ל-{target_lang} (שפה נבחרת: {target_lang})")
-            translated_texts = parallel_translate_batch(all_texts, target_lang)
-            
-            # שילוב התרגומים בתוך המקטעים
-            segs_tr = []
-            for i, seg in enumerate(segs):
-                translated_text = translated_texts[i] if i < len(translated_texts) else seg["text"]
-                segs_tr.append({**seg, "text": translated_text})
-
-            # יצירת קובץ SRT עם מנהל הקבצים הזמניים
-            srt_path = TEMP_MANAGER.create_temp_file("subs", ".srt")
-            try:
-                write_srt(segs_tr, srt_path)
-            except Exception as e:
-                LOG.error(f"Failed to write SRT: {e}")
-                TEMP_MANAGER.cleanup_file(srt_path)
-                raise RuntimeError("Failed to create subtitle file")
-
-            # צריבת כתוביות
-            out_video = TEMP_MANAGER.create_temp_file("out", ".mp4")
-            try:
-                # יצירת הגדרות כתוביות מותאמות אישית
-                subtitle_config = SubtitleConfig.from_user_state(st)
-                burn_subs_from_srt(
-                    input_video=local_video,
-                    srt_path=srt_path,
-                    output_video=out_video,
-                    subtitle_config=subtitle_config
-                )
-                # ניקוי זיכרון לאחר פעולת קידוד כבדה
-                TEMP_MANAGER.clear_memory(True)
-            except Exception as e:
-                LOG.error(f"Failed to burn subtitles: {e}")
-                TEMP_MANAGER.cleanup_file(out_video)
-                raise RuntimeError("Failed to burn subtitles to video")
-
-            # שליחת הווידאו המתורגם
-            if not os.path.exists(out_video):
-                raise RuntimeError("Output video file not created")
-                
-            size_bytes = os.path.getsize(out_video)
-            if size_bytes > MAX_FILE_SIZE:
-                update.message.reply_text(t(uid, "error_file_too_large"))
-            else:
-                with open(out_video, "rb") as f:
-                    update.message.reply_video(
-                        video=f, supports_streaming=True,
-                        caption=t(uid, "translated_done_caption",
-                            lang_label=t(uid, "settings_language"),
-                            size_label=t(uid, "settings_font_size"),
-                            color_label=t(uid, "settings_color"),
-                            lang=target_lang_name,
-                            size=st.get("font_size", 16),
-                            color=color_name,
-                            src_lang=lang or 'unknown'
-                        )
-                    )
-                # שליחת תפריט ראשי נפרד
-                update.message.reply_text(t(uid, "back_main_done"), reply_markup=main_menu_kb(uid, st))
-                
-            return True
-        except Exception as e:
-            LOG.error(f"Error processing video: {e}")
-            # בדיקה אם זו שגיאת חיבור
-            if "connection" in str(e).lower() or "network" in str(e).lower():
-                update.message.reply_text(t(uid, "error_no_internet"))
-            else:
-                update.message.reply_text(t(uid, "error_processing_failed"))
-            return False
-        finally:
-            try:
-                cleanup_paths([local_video, wav_path, srt_path, out_video])
-            except Exception:
-                pass
-            st["expecting_video_for_subs"] = False
-            dec_jobs(uid)
-
-    # הודעות על התחלת העיבוד
-    target_lang_name = next((name for name, code in LANG_CHOICES if code == st.get("target_lang", "en")), st.get("target_lang", "en"))
-    color_name = next((label for label, color in COLOR_CHOICES if color == st.get("font_color", "white")), st.get("font_color", "white"))
-    update.message.reply_text(t(uid, "processing_start",
-        lang_label=t(uid, "settings_language"),
-        size_label=t(uid, "settings_font_size"),
-        color_label=t(uid, "settings_color"),
-        lang=target_lang_name,
-        size=st.get('font_size', 16),
-        color=color_name
-    ))
-    update.message.reply_text(t(uid, "convert_audio"))
-    
-    # הפעלת העיבוד דרך מאגר התהליכים
-    def processing_workflow():
-        # עדכון סטטוס
-        update.message.reply_text(t(uid, "transcribing"))
-        # ביצוע העיבוד העיקרי (משלב תעתוק והלאה)
-        result = process_translation_video()
-        if not result:
-            # נוקה כבר בתהליך הפנימי
-            pass
-    
-    # הפעלת התהליך המלא במאגר התהליכים
-    EXECUTOR.submit(processing_workflow)
+            update.message.reply_text(t(uid, "processing_start",
+                lang_label=t(uid, "settings_language"),
+                size_label=t(uid, "settings_font_size"),
+                color_label=t(uid, "settings_color"),
+                lang=target_lang_name,
+                size=st.get('font_size', 16),
+                color=color_name
+            ))
+            update.message.reply_text(t(uid, "convert_audio"))
+
+            # חילוץ → תעתוק → תרגום → צריבה → העלאה, כל שלב במאגר משלו
+            job = PipelineJob("translate", TRANSLATION_JOB_STEPS, ctx=ctx,
+                              on_error=_job_on_error, on_finally=_translation_job_finally)
+
+        if position > 0:
+            update.message.reply_text(t(uid, "queue_position", position=position))
+        if kind == "translate" and not MODEL_WARMUP.is_ready():
+            # הבוט רק עלה - העבודה תחכה בתור לסיום טעינת המודלים
+            update.message.reply_text(t(uid, "models_warming", eta=MODEL_WARMUP.eta_seconds()))
+
+        # התור ישלוף את העבודה לצינור כשיתפנה מקום
+        JOB_QUEUE.attach(queue_job_id, lambda: PIPELINE.submit(job), on_fail=lambda e: PIPELINE.abort(job, e))
+    except Exception:
+        # כשל לפני שהעבודה צורפה לתור - משחררים את המקום שלה, אחרת הוא נספר במכסת המשתמש עד הפעלה מחדש
+        JOB_QUEUE.cancel(queue_job_id)
+        if local_video:
+            TEMP_MANAGER.cleanup_file(local_video)
+        _release_followers(None, kind, output_key)
+        raise
 
 # ------------- פקודות -------------
+@timed_handler
 def help_button_entry(update: Update, context: CallbackContext):
     uid = update.effective_user.id
     st = get_user_state(uid)
@@ -2527,17 +5911,148 @@ def run_smoke_tests():
     # 3) בדיקה קלה לפונקציות שלא דורשות טלגרם/FFmpeg (ככל האפשר)
     try:
         # תרגום קצר (יתכן ויכשל עקב חיבור/חסימות – לא מפיל את התהליך)
-        _ = translate_text([{"start":0.0,"end":1.2,"text":"hello world"}], "he")
-        LOG.info("ℹ️ smoke: translate_text רצה.")
+        _ = translate_segments([{"start":0.0,"end":1.2,"text":"hello world"}], "he")
+        LOG.info("ℹ️ smoke: translate_segments רצה.")
     except Exception as e:
-        LOG.warning(f"⚠️ smoke translate_text נכשלת (לא קריטי): {e}")
+        LOG.warning(f"⚠️ smoke translate_segments נכשלת (לא קריטי): {e}")
+
+# -----------------------------
+# מצב webhook (חלופה ל-long polling)
+# -----------------------------
+WEBHOOK_SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+def webhook_config() -> Dict[str, Any]:
+    """
+    הגדרות webhook ממשתני סביבה. המצב פעיל כש-BOT_MODE=webhook או כשיש WEBHOOK_URL.
+    בלי WEBHOOK_URL (בדיקה מקומית, בלי סוד) מאזינים רק ל-127.0.0.1 כברירת מחדל.
+    """
+    url = (os.getenv("WEBHOOK_URL") or "").rstrip("/")
+    path = "/" + (os.getenv("WEBHOOK_PATH") or "telegram").strip("/")
+    return {
+        "enabled": (os.getenv("BOT_MODE") or "").lower() == "webhook" or bool(url),
+        "url": url + path if url else "",  # ריק = לא רושמים מול טלגרם (בדיקה מקומית)
+        "listen": os.getenv("WEBHOOK_LISTEN") or ("0.0.0.0" if url else "127.0.0.1"),
+        "port": _env_int("WEBHOOK_PORT", 8443),
+        "path": path,
+        "secret": os.getenv("WEBHOOK_SECRET") or "",
+        "cert": os.getenv("WEBHOOK_CERT") or "",
+        "key": os.getenv("WEBHOOK_KEY") or "",
+        "max_connections": _env_int("WEBHOOK_MAX_CONNECTIONS", 40),
+    }
+
+def create_webhook_app(update_queue: "queue.Queue", bot, path: str, secret: str = "") -> Any:
+    """
+    אפליקציית Flask שמקבלת עדכונים מטלגרם ומכניסה אותם לתור ה-dispatcher.
+    הבקשה חוזרת מיד אחרי ההכנסה לתור - העיבוד עצמו רץ בחוטי ה-dispatcher
+    (handlers עם run_async), כך שטלגרם יכול לשלוח עדכונים במקביל.
+    לבדיקה מקומית: POST של JSON של Update שהוקלט אל הנתיב, עם כותרת הסוד.
+    """
+    from flask import Flask, request, jsonify, abort
+
+    app = Flask("video_bot_webhook")
+    stats = {"received": 0, "rejected": 0}
+    stats_lock = threading.Lock()
+
+    def _count(key: str) -> None:
+        with stats_lock:
+            stats[key] += 1
+
+    @app.route(path, methods=["POST"])
+    def receive():
+        if secret and not hmac.compare_digest(request.headers.get(WEBHOOK_SECRET_HEADER, ""), secret):
+            _count("rejected")
+            abort(403)
+        data = request.get_json(force=True, silent=True)
+        update = Update.de_json(data, bot) if isinstance(data, dict) else None
+        if update is None:
+            _count("rejected")
+            abort(400)
+        update_queue.put(update)
+        _count("received")
+        return "", 200
+
+    @app.route("/healthz", methods=["GET"])
+    def health():
+        with stats_lock:
+            body = dict(stats)
+        body["queued_updates"] = update_queue.qsize()
+        body["jobs"] = JOB_QUEUE.depth()
+        return jsonify(body)
+
+    return app
+
+def run_webhook(updater, cfg: Dict[str, Any]) -> None:
+    """הפעלת ה-dispatcher ושרת HTTP מקומי שמזין אותו, ורישום ה-webhook מול טלגרם."""
+    try:
+        from werkzeug.serving import make_server
+        import flask  # noqa: F401
+    except ImportError:
+        LOG.error("❌ מצב webhook דורש Flask (pip install flask).")
+        raise SystemExit(1)
+
+    secret = cfg["secret"]
+    if cfg["url"] and not secret:
+        # בלי סוד כל אחד יכול להזריק עדכונים - מייצרים אחד לכל הפעלה
+        secret = uuid.uuid4().hex
+    if not secret and cfg["listen"] not in ("127.0.0.1", "localhost", "::1"):
+        LOG.warning(f"⚠️ webhook בלי WEBHOOK_SECRET מאזין ל-{cfg['listen']} - כל מי שמגיע לפורט יכול להזריק עדכונים")
+    dp = updater.dispatcher
+    app = create_webhook_app(dp.update_queue, updater.bot, cfg["path"], secret)
+
+    ssl_context = (cfg["cert"], cfg["key"]) if cfg["cert"] and cfg["key"] else None
+    server = make_server(cfg["listen"], cfg["port"], app, threaded=True, ssl_context=ssl_context)
+
+    dispatcher_thread = threading.Thread(target=dp.start, name="dispatcher", daemon=True)
+    dispatcher_thread.start()
+
+    if cfg["url"]:
+        # תעודה עצמית נשלחת לטלגרם; secret_token עובר ב-api_kwargs (לא קיים בחתימה של PTB 13)
+        cert_file = open(cfg["cert"], "rb") if ssl_context else None
+        try:
+            updater.bot.set_webhook(
+                url=cfg["url"],
+                certificate=cert_file,
+                max_connections=cfg["max_connections"],
+                allowed_updates=["message", "callback_query"],
+                api_kwargs={"secret_token": secret},
+            )
+        finally:
+            if cert_file:
+                cert_file.close()
+        LOG.info(f"🔗 webhook נרשם: {cfg['url']}")
+    else:
+        LOG.info("ℹ️ WEBHOOK_URL לא הוגדר - השרת מאזין מקומית בלבד (ללא רישום מול טלגרם)")
+
+    # SIGTERM (כמו ב-updater.idle) - עוצרים את השרת בצורה מסודרת
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown, daemon=True).start())
+
+    LOG.info(f"🚀 הבוט עלה במצב webhook על {cfg['listen']}:{cfg['port']}{cfg['path']}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        LOG.info("🛑 עוצר את שרת ה-webhook...")
+        server.server_close()
+        dp.stop()
 
 # -----------------------------
 # main
 # -----------------------------
 def main():
+    # בניית קטלוגי ממשק מראש: --build-ui-catalogs [he,fr,...]
+    if "--build-ui-catalogs" in sys.argv:
+        i = sys.argv.index("--build-ui-catalogs")
+        arg = sys.argv[i + 1] if i + 1 < len(sys.argv) else ""
+        langs = [code.strip() for code in arg.split(",") if code.strip()]
+        raise SystemExit(0 if build_ui_catalogs(langs or None) else 1)
+
     run_smoke_tests()
 
+    PIPELINE.start()
+    JOB_QUEUE.start()
+    MODEL_WARMUP.start()  # טעינת המודלים ברקע בזמן שהבוט מתחיל להאזין
+
     # ניקוי קבצים זמניים ישנים בהפעלה
     try:
         count = TEMP_MANAGER.cleanup_old_files()
@@ -2546,19 +6061,18 @@ def main():
     except Exception as e:
         LOG.warning(f"⚠️ שגיאה בניקוי קבצים ישנים: {e}")
 
-    # טעינת מטמון התרגומים אם קיים
-    if CACHE_FILE.exists():
-        load_translation_cache()
+    # פתיחת מטמון התרגומים (וייבוא הקובץ הישן אם קיים)
+    load_translation_cache()
+    load_ui_catalogs()
     
-    # רישום שמירת המטמון בסגירה תקינה
+    # סגירת המטמון בסגירה תקינה - אין מה לשמור, כל תרגום נכתב מיד
     @atexit.register
     def save_cache_at_exit():
         try:
-            if translation_cache:
-                LOG.info("שומר מטמון תרגומים לפני סגירה...")
-                save_translation_cache()
+            save_translation_cache()
+            OUTPUT_CACHE.close()
         except Exception as e:
-            LOG.error(f"שגיאה בשמירת מטמון בעת יציאה: {e}")
+            LOG.error(f"שגיאה בסגירת מטמון בעת יציאה: {e}")
 
     # מצב בדיקות בלבד (ללא העלאת הבוט)
     if os.getenv("DRY_RUN_SMOKE"):
@@ -2573,7 +6087,11 @@ def main():
 
     # אתחול הבוט
     try:
-        updater = Updater(token=token, use_context=True)
+        # חוטי ה-dispatcher מריצים את ה-handlers (run_async) - הם חוסמים רק על קריאות Bot API קצרות
+        updater = Updater(
+            token=token, use_context=True, workers=_env_int("BOT_HANDLER_WORKERS", 8),
+            base_url=BOT_API_BASE_URL, base_file_url=BOT_API_BASE_FILE_URL
+        )
     except Unauthorized:
         LOG.error("❌ Unauthorized – בדקו את ה-Token ב-BotFather.")
         raise SystemExit(1)
@@ -2581,29 +6099,52 @@ def main():
         LOG.error(f"❌ כשל באתחול Updater: {e}")
         raise SystemExit(1)
 
+    if BOT_API_BASE_URL:
+        LOG.info(f"🏠 שרת Bot API: {BOT_API_BASE_URL} (local={BOT_API_LOCAL}, "
+                 f"קלט עד {MAX_FILE_SIZE // MB}MB, פלט עד {MAX_UPLOAD_SIZE // MB}MB)")
+
     dp = updater.dispatcher
 
-    dp.add_handler(CommandHandler("start", start))
-    dp.add_handler(CommandHandler("help", help_cmd))
+    # כל ה-handlers רצים מחוץ לחוט ה-dispatcher, כך שמשתמש איטי לא מעכב אחרים;
+    # הורדות וידאו ועיבוד כבד עוברים לצינור המדורג
+    dp.add_handler(CommandHandler("start", start, run_async=True))
+    dp.add_handler(CommandHandler("help", help_cmd, run_async=True))
 
-    dp.add_handler(CallbackQueryHandler(cb_handler))
+    dp.add_handler(CallbackQueryHandler(cb_handler, run_async=True))
 
     # תמונות (לוגו)
-    dp.add_handler(MessageHandler(Filters.photo, handle_photo))
+    dp.add_handler(MessageHandler(Filters.photo, handle_photo, run_async=True))
 
     # מסמכים/וידאו
-    dp.add_handler(MessageHandler(Filters.document | Filters.video, handle_document_or_video))
+    dp.add_handler(MessageHandler(Filters.document | Filters.video, handle_document_or_video, run_async=True))
 
     # עזרה מהירה
-    dp.add_handler(MessageHandler(Filters.text & Filters.regex(r"^/menu$"), help_button_entry))
+    dp.add_handler(MessageHandler(Filters.text & Filters.regex(r"^/menu$"), help_button_entry, run_async=True))
     
     # Error handler גלובלי
     dp.add_error_handler(error_handler)
 
+    # הודעה למשתמשים שעבודותיהם נקטעו בהפעלה הקודמת
+    for job in JOB_QUEUE.interrupted:
+        if not job.get("chat_id"):
+            continue
+        lang = job["payload"].get("ui_lang", "en")
+        try:
+            updater.bot.send_message(job["chat_id"], UI_STRINGS.get(lang, UI_STRINGS["en"]).get(
+                "job_interrupted", UI_STRINGS["en"]["job_interrupted"]))
+        except Exception as e:
+            LOG.warning(f"⚠️ לא ניתן להודיע על עבודה שנקטעה {job['id']}: {e}")
+
+    webhook = webhook_config()
+    if webhook["enabled"]:
+        run_webhook(updater, webhook)
+        return
+
     LOG.info("🚀 הבוט עלה. מאזין לעדכונים...")
     updater.start_polling()
     updater.idle()
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # תהליכי תעתוק בקובץ הרצה ארוז (pyinstaller)
     main()